@@ -1,45 +1,171 @@
 #!/usr/bin/env python3
-from fastapi import FastAPI, HTTPException, UploadFile, File
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from fastapi.concurrency import run_in_threadpool
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from collections import OrderedDict
+import asyncio
+import hashlib
+import io
+import threading
 import json
 import os
-import subprocess
-import shutil
-from datetime import datetime
+import uuid
+from datetime import date
+from cache_extraction import ehf_par_empreinte
+from jobs_ehf import creer_job, executer_job, job_actif, jobs_a_reprendre, lire_job
+from simple_pdf_extract import date_limite_charge
+from stockage_ehf import (bien_correspond, chemin_stockage, compter_charges, evenements_lot, historique_disponible, index_filtres_disponible,
+                          iter_charges, iter_proprietaires, lire_documents, page_charges, page_proprietaires)
+from proprietes_ehf import chaines_proprietaires, proprietaire_a_date
+from index_ehf import rechercher_bien, rechercher_proprietaire
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from metriques_ehf import DUREES_EXTRACTION, DUREES_REQUETES, MesureRequetesHTTP, Registre, valeurs_instantanees
 
-app = FastAPI(title="EHF Analyzer API", version="1.0.0")
+# Nombre d'analyses d'uploads exécutées en parallèle
+UPLOAD_WORKERS = int(os.environ.get("EHF_UPLOAD_WORKERS", "2"))
+executeur_analyses = ProcessPoolExecutor(max_workers=UPLOAD_WORKERS)
 
-def charger_donnees_ehf(ehf_name: str):
-    """Charge les données d'un EHF"""
+# Métriques exposées sur GET /metrics (en mémoire de ce processus, remises à zéro au redémarrage)
+metriques = Registre()
+requetes_http = metriques.compteur("ehf_requetes_http_total", "Requêtes HTTP par route, méthode et statut")
+durees_http = metriques.histogramme("ehf_requetes_http_duree_secondes", "Durée des requêtes HTTP par route et méthode", DUREES_REQUETES)
+uploads_en_cours = metriques.jauge("ehf_uploads_en_cours", "Uploads en cours de réception")
+analyses_en_cours = metriques.jauge("ehf_analyses_en_cours", "Analyses d'uploads en file ou en cours dans le pool")
+analyses_terminees = metriques.compteur("ehf_analyses_total", "Analyses d'uploads terminées par résultat")
+durees_extraction = metriques.histogramme("ehf_extraction_duree_secondes", "Durée d'analyse d'un upload", DUREES_EXTRACTION)
+pages_traitees = metriques.compteur("ehf_pages_traitees_total", "Pages de PDF analysées par les jobs d'upload")
+# Lectures qui ne passent pas par le cache des données (ses hits/misses ne les voient pas)
+lectures_stockage = metriques.compteur("ehf_lectures_stockage_total", "Lectures servies directement par le stockage SQLite, hors cache des données")
+
+def _job_termine(ehf_name: str, future):
+    """Fin d'un job (thread du pool) : invalider le cache de l'EHF et compter le résultat"""
+    cache_donnees.invalider(ehf_name)
+    analyses_en_cours.dec()
     try:
-        with open(f"formalites_json/{ehf_name}/{ehf_name}_par_proprietaire.json", 'r') as f:
-            proprietaires = json.load(f)
-        with open(f"formalites_json/{ehf_name}/{ehf_name}_charges_actives.json", 'r') as f:
-            charges_data = json.load(f)
-        return proprietaires, charges_data
-    except FileNotFoundError:
-        raise HTTPException(status_code=404, detail=f"EHF {ehf_name} non trouvé")
+        resume = future.result()
+    except Exception:
+        analyses_terminees.inc(resultat='erreur')
+        return
+    analyses_terminees.inc(resultat='termine' if resume['sauvegarde'] else 'sans_formalite')
+    durees_extraction.observer(resume['duree_s'])
+    pages_traitees.inc(resume['nb_pages'])
 
-def est_charge_expiree(charge):
-    """Vérifie si une charge est expirée"""
-    aujourd_hui = datetime.now()
-    toutes_dates = []
-    
-    for sf in charge.get('sous_formalites', []):
-        toutes_dates.extend(sf.get('dates_exigibilite', []))
-        toutes_dates.extend(sf.get('dates_effet', []))
+def soumettre_job(job_id: str, file_path: str):
+    """Place un job dans le pool : au plus UPLOAD_WORKERS analyses tournent en même temps"""
+    ehf_name = os.path.splitext(os.path.basename(file_path))[0]
+    future = executeur_analyses.submit(executer_job, job_id, file_path)
+    analyses_en_cours.inc()
+    future.add_done_callback(lambda future: _job_termine(ehf_name, future))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Relancer les jobs interrompus par le dernier arrêt
+    for job in jobs_a_reprendre():
+        soumettre_job(job['id'], job['fichier'])
+    yield
+    executeur_analyses.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(title="EHF Analyzer API", version="1.0.0", lifespan=lifespan)
+app.add_middleware(MesureRequetesHTTP, requetes=requetes_http, durees=durees_http)
+
+class CacheDonneesEHF:
+    """
+    Cache LRU des données d'EHF déjà parsées, borné en taille (taille des fichiers JSON)
+    et invalidé quand la date de modification ou la taille d'un fichier change
+    """
+    def __init__(self, taille_max: int):
+        self.taille_max = taille_max
+        self.taille = 0
+        self.hits = 0
+        self.misses = 0
+        self._entrees = OrderedDict()  # ehf_name -> (signature, donnees, taille)
+        self._verrou = threading.Lock()
+
+    def obtenir(self, ehf_name: str, fichiers, charger):
+        """Retourne les données en cache si les fichiers n'ont pas changé, sinon les recharge"""
+        stats = [os.stat(fichier) for fichier in fichiers]
+        signature = tuple((stat.st_mtime_ns, stat.st_size) for stat in stats)
+        with self._verrou:
+            entree = self._entrees.get(ehf_name)
+            if entree and entree[0] == signature:
+                self._entrees.move_to_end(ehf_name)
+                self.hits += 1
+                return entree[1]
+            self.misses += 1
+        
+        donnees = charger()
+        taille = sum(stat.st_size for stat in stats)
+        with self._verrou:
+            self._retirer(ehf_name)
+            if taille <= self.taille_max:
+                self._entrees[ehf_name] = (signature, donnees, taille)
+                self.taille += taille
+                while self.taille > self.taille_max:
+                    self._retirer(next(iter(self._entrees)))
+        return donnees
+
+    def _retirer(self, ehf_name: str):
+        if entree := self._entrees.pop(ehf_name, None):
+            self.taille -= entree[2]
+
+    def invalider(self, ehf_name: str = None):
+        """Oublie un EHF (ou tout le cache), par exemple après sa réécriture par l'extracteur"""
+        with self._verrou:
+            if ehf_name is None:
+                self._entrees.clear()
+                self.taille = 0
+            else:
+                self._retirer(ehf_name)
+
+    def statistiques(self):
+        with self._verrou:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "ratio_hits": round(self.hits / total, 4) if total else None,
+                "nb_ehf": len(self._entrees),
+                "taille_octets": self.taille,
+                "taille_max_octets": self.taille_max
+            }
+
+cache_donnees = CacheDonneesEHF(int(os.environ.get("EHF_CACHE_DONNEES_MO", "256")) * 1024 * 1024)
+
+def charger_donnees_ehf(ehf_name: str):
+    """Charge les données d'un EHF (servies depuis le cache tant que les fichiers sont inchangés)"""
+    fichier_stockage = chemin_stockage(ehf_name)
+    fichier_proprietaires = f"formalites_json/{ehf_name}/{ehf_name}_par_proprietaire.json"
+    fichier_charges = f"formalites_json/{ehf_name}/{ehf_name}_charges_actives.json"
+    # Stockage compact s'il existe, sinon les fichiers JSON (export ou anciennes extractions)
+    fichiers = [fichier_stockage] if os.path.exists(fichier_stockage) else [fichier_proprietaires, fichier_charges]
     
-    if not toutes_dates:
-        return False
+    def charger():
+        if fichiers == [fichier_stockage]:
+            proprietaires, charges_data = lire_documents(ehf_name, 'proprietaires_biens', 'charges')
+        else:
+            with open(fichier_proprietaires, 'r') as f:
+                proprietaires = json.load(f)
+            with open(fichier_charges, 'r') as f:
+                charges_data = json.load(f)
+        # Données extraites avant le précalcul des dates limites : les calculer une fois au chargement
+        for charge in charges_data.get('charges_actives', []):
+            if 'date_limite' not in charge:
+                charge['date_limite'] = date_limite_charge(charge.get('sous_formalites', []))
+        return proprietaires, charges_data
     
     try:
-        for date_str in toutes_dates:
-            if datetime.strptime(date_str, '%d/%m/%Y') > aujourd_hui:
-                return False
-        return True
-    except:
-        return False
+        return cache_donnees.obtenir(ehf_name, fichiers, charger)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"EHF {ehf_name} non trouvé")
+
+def est_charge_expiree(charge, aujourd_hui: str = None):
+    """Vérifie si une charge est expirée : sa date limite (ISO, précalculée à l'extraction) est passée"""
+    date_limite = charge.get('date_limite')
+    return date_limite is not None and date_limite <= (aujourd_hui or date.today().isoformat())
 
 @app.get("/", response_class=HTMLResponse)
 def root():
@@ -47,97 +173,451 @@ def root():
     with open("templates/index.html", "r", encoding="utf-8") as f:
         return f.read()
 
+# Champs des biens sur lesquels /proprietaires peut filtrer
+FILTRES_BIENS = ('commune', 'lot', 'volume', 'type_droit')
+
+def projeter(element: dict, champs):
+    """
+    Ne garde que les champs demandés ; 'biens.lot' garde seulement le lot de chaque bien.
+    Sans champs (None), l'élément est retourné tel quel.
+    """
+    if not champs:
+        return element
+    resultat = {}
+    for champ in champs:
+        cle, _, sous_champ = champ.partition('.')
+        if cle not in element:
+            continue
+        valeur = element[cle]
+        if sous_champ and isinstance(valeur, list):
+            deja = resultat.get(cle) or [{} for _ in valeur]
+            resultat[cle] = [dict(d, **({sous_champ: v[sous_champ]} if sous_champ in v else {})) for d, v in zip(deja, valeur)]
+        elif sous_champ and isinstance(valeur, dict):
+            resultat.setdefault(cle, {}).update({sous_champ: valeur[sous_champ]} if sous_champ in valeur else {})
+        else:
+            resultat[cle] = valeur
+    return resultat
+
+def _champs(fields: str = None):
+    return [champ.strip() for champ in fields.split(',') if champ.strip()] if fields else None
+
+def _curseur(cursor: str = None) -> int:
+    """Le curseur est l'index (base 1) du dernier élément de la page précédente"""
+    if cursor is None:
+        return 0
+    if not cursor.isdigit():
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+    return int(cursor)
+
+def _paginer(elements, limit: int = None):
+    """Coupe une liste de (idx, élément) lue avec limit + 1 : retourne la page et le curseur suivant"""
+    if limit is None or len(elements) <= limit:
+        return elements, None
+    return elements[:limit], str(elements[limit - 1][0])
+
+# ehf_name -> (signature du fichier de stockage, index de filtrage présent) : une seule ouverture SQLite par version du stockage
+_index_filtres = {}
+
+def _stockage_indexe(ehf_name: str) -> bool:
+    try:
+        stat = os.stat(chemin_stockage(ehf_name))
+    except FileNotFoundError:
+        return False
+    signature = (stat.st_mtime_ns, stat.st_size)
+    connu = _index_filtres.get(ehf_name)
+    if connu is None or connu[0] != signature:
+        connu = _index_filtres[ehf_name] = (signature, index_filtres_disponible(ehf_name))
+    return connu[1]
+
 @app.get("/proprietaires/{ehf_name}")
-def get_proprietaires(ehf_name: str):
-    """Retourne les propriétaires actuels d'un EHF"""
-    proprietaires, _ = charger_donnees_ehf(ehf_name)
+def get_proprietaires(ehf_name: str, limit: int = Query(None, ge=1, le=1000), cursor: str = None, fields: str = None,
+                      commune: str = None, lot: str = None, volume: str = None, type_droit: str = None):
+    """
+    Retourne les propriétaires actuels d'un EHF.
+    Options : pagination (limit, cursor), projection (fields=proprietaire,biens.lot)
+    et filtres sur les biens (commune, lot, volume, type_droit) ; seuls les biens correspondants sont retournés.
+    """
+    filtres = {champ: valeur for champ, valeur in zip(FILTRES_BIENS, (commune, lot, volume, type_droit)) if valeur is not None}
+    apres = _curseur(cursor)
+    
+    # Sans filtre ni pagination (appel de l'interface), réponse complète servie par le cache des données
+    if (filtres or limit is not None or cursor is not None) and _stockage_indexe(ehf_name):
+        # Filtrage et pagination par SQLite : seules les lignes de la page sont décompressées
+        lectures_stockage.inc(lecture='proprietaires')
+        lus = page_proprietaires(ehf_name, filtres, apres, None if limit is None else limit + 1)
+        elements = [(idx, (proprietaire, data)) for idx, proprietaire, data in lus]
+    else:
+        proprietaires, _ = charger_donnees_ehf(ehf_name)
+        elements = [(idx, item) for idx, item in enumerate(proprietaires.items(), 1)
+                    if idx > apres and (not filtres or any(bien_correspond(b, filtres) for b in item[1]['biens']))]
+        if limit is not None:
+            elements = elements[:limit + 1]
+    page, next_cursor = _paginer(elements, limit)
     
+    champs = _champs(fields)
     result = []
-    for proprietaire, data in proprietaires.items():
+    for _, (proprietaire, data) in page:
         biens = []
         for bien in data['biens']:
+            if filtres and not bien_correspond(bien, filtres):
+                continue
             biens.append({
                 "commune": bien['commune'],
                 "adresse": bien['adresse'],
                 "lot": bien['lot'],
                 "volume": bien['volume']
             })
-        result.append({
+        result.append(projeter({
             "proprietaire": proprietaire,
             "biens": biens
-        })
+        }, champs))
     
-    return {"ehf": ehf_name, "proprietaires": result}
+    reponse = {"ehf": ehf_name, "proprietaires": result}
+    if limit is not None or cursor is not None:
+        reponse["next_cursor"] = next_cursor
+    return reponse
 
 @app.get("/charges/{ehf_name}")
-def get_charges(ehf_name: str):
-    """Retourne les charges actives et expirées d'un EHF"""
-    _, charges_data = charger_donnees_ehf(ehf_name)
+def get_charges(ehf_name: str, limit: int = Query(None, ge=1, le=1000), cursor: str = None, fields: str = None,
+                statut: str = Query(None, pattern="^(active|expiree)$")):
+    """
+    Retourne les charges actives et expirées d'un EHF.
+    Options : pagination (limit, cursor), projection (fields=titre) et filtre statut=active|expiree ;
+    le résumé compte toujours toutes les charges de l'EHF.
+    """
+    aujourd_hui = date.today().isoformat()
+    apres = _curseur(cursor)
     
-    charges_actives = charges_data.get('charges_actives', [])
+    if (statut is not None or limit is not None or cursor is not None) and _stockage_indexe(ehf_name):
+        # Statut filtré par SQLite sur la date limite indexée
+        lectures_stockage.inc(lecture='charges')
+        elements = page_charges(ehf_name, aujourd_hui, statut, apres, None if limit is None else limit + 1)
+        resume = compter_charges(ehf_name, aujourd_hui)
+    else:
+        _, charges_data = charger_donnees_ehf(ehf_name)
+        charges_actives = charges_data.get('charges_actives', [])
+        nb_expirees = sum(1 for charge in charges_actives if est_charge_expiree(charge, aujourd_hui))
+        resume = {"nb_actives": len(charges_actives) - nb_expirees, "nb_expirees": nb_expirees}
+        elements = [(idx, charge) for idx, charge in enumerate(charges_actives, 1)
+                    if idx > apres and (statut is None or est_charge_expiree(charge, aujourd_hui) == (statut == 'expiree'))]
+        if limit is not None:
+            elements = elements[:limit + 1]
+    page, next_cursor = _paginer(elements, limit)
+    
+    champs = _champs(fields)
     charges_vraiment_actives = []
     charges_expirees = []
     
-    for charge in charges_actives:
-        charge_info = {
+    for _, charge in page:
+        charge_info = projeter({
             "titre": charge['titre'],
             "pages": f"{charge['page_debut']}-{charge['page_fin']}"
-        }
+        }, champs)
         
-        if est_charge_expiree(charge):
+        if est_charge_expiree(charge, aujourd_hui):
             charges_expirees.append(charge_info)
         else:
             charges_vraiment_actives.append(charge_info)
     
-    return {
+    reponse = {
         "ehf": ehf_name,
         "charges_actives": charges_vraiment_actives,
         "charges_expirees": charges_expirees,
-        "resume": {
-            "nb_actives": len(charges_vraiment_actives),
-            "nb_expirees": len(charges_expirees)
-        }
+        "resume": resume
     }
+    if limit is not None or cursor is not None:
+        reponse["next_cursor"] = next_cursor
+    return reponse
 
-@app.post("/upload")
-async def upload_ehf(file: UploadFile = File(...)):
-    """Upload et analyse d'un nouveau fichier EHF"""
+def _ndjson(lignes):
+    for ligne in lignes:
+        yield json.dumps(ligne, ensure_ascii=False) + "\n"
+
+@app.get("/proprietaires/{ehf_name}/stream")
+def stream_proprietaires(ehf_name: str):
+    """Envoie les propriétaires d'un EHF un par un (NDJSON), lus au fil de l'eau depuis le stockage"""
+    if os.path.exists(chemin_stockage(ehf_name)):
+        lectures_stockage.inc(lecture='proprietaires_stream')
+        proprietaires = iter_proprietaires(ehf_name)
+    else:
+        proprietaires = iter(charger_donnees_ehf(ehf_name)[0].items())
     
-    # Vérifier le type de fichier
-    if not file.filename.endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="Seuls les fichiers PDF sont acceptés")
+    lignes = ({
+        "proprietaire": proprietaire,
+        "biens": [{"commune": b['commune'], "adresse": b['adresse'], "lot": b['lot'], "volume": b['volume']} for b in data['biens']]
+    } for proprietaire, data in proprietaires)
+    return StreamingResponse(_ndjson(lignes), media_type="application/x-ndjson")
+
+@app.get("/charges/{ehf_name}/stream")
+def stream_charges(ehf_name: str):
+    """Envoie les charges non radiées d'un EHF une par une (NDJSON), puis une ligne de résumé"""
+    if os.path.exists(chemin_stockage(ehf_name)):
+        lectures_stockage.inc(lecture='charges_stream')
+        charges = (charge for liste, charge in iter_charges(ehf_name) if liste == 'charges_actives')
+    else:
+        charges = iter(charger_donnees_ehf(ehf_name)[1].get('charges_actives', []))
+    aujourd_hui = date.today().isoformat()
     
-    # Générer un nom unique pour l'EHF
-    import time
-    timestamp = int(time.time())
-    ehf_name = f"EHF_UPLOAD_{timestamp}"
+    def lignes():
+        resume = {"nb_actives": 0, "nb_expirees": 0}
+        for charge in charges:
+            if 'date_limite' not in charge:
+                charge['date_limite'] = date_limite_charge(charge.get('sous_formalites', []))
+            expiree = est_charge_expiree(charge, aujourd_hui)
+            resume["nb_expirees" if expiree else "nb_actives"] += 1
+            yield {
+                "titre": charge['titre'],
+                "pages": f"{charge['page_debut']}-{charge['page_fin']}",
+                "statut": "expiree" if expiree else "active"
+            }
+        yield {"resume": resume}
+    return StreamingResponse(_ndjson(lignes()), media_type="application/x-ndjson")
+
+@app.get("/historique/{ehf_name}")
+def get_historique(ehf_name: str, lot: str = None, volume: str = None, a_la_date: date = Query(None, alias="date")):
+    """
+    Propriétaire d'un lot à une date donnée (aujourd'hui par défaut), pour chaque immeuble de l'EHF
+    portant ce lot, avec la chaîne complète des actes. Sans lot : immeubles sans lot spécifique.
+    """
+    if not os.path.exists(chemin_stockage(ehf_name)):
+        raise HTTPException(status_code=404, detail=f"EHF {ehf_name} non trouvé")
+    if not historique_disponible(ehf_name):
+        raise HTTPException(status_code=404, detail=f"Historique absent pour {ehf_name} : relancer simple_pdf_extract.py --rebuild-derived {ehf_name}")
+    date_iso = (a_la_date or date.today()).isoformat()
+    lectures_stockage.inc(lecture='historique')
     
-    try:
-        # Sauvegarder le fichier uploadé
-        os.makedirs("EHFs", exist_ok=True)
-        file_path = f"EHFs/{ehf_name}.pdf"
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Lancer l'analyse avec simple_pdf_extract.py
-        result = subprocess.run([
-            "python", "simple_pdf_extract.py", file_path
-        ], capture_output=True, text=True)
-        
-        # Supprimer le fichier uploadé après analyse
+    def acte(evenement):
+        return {champ: evenement.get(champ) for champ in ('proprietaire', 'date_naissance', 'numero_identite', 'type_droit', 'volume', 'date_acte', 'formalite_pages')}
+    
+    resultats = []
+    for chaine in chaines_proprietaires(evenements_lot(ehf_name, lot, volume)).values():
+        proprietaire = proprietaire_a_date(chaine, date_iso)
+        resultats.append({
+            "commune": chaine[0][1]['commune'],
+            "adresse": chaine[0][1]['adresse'],
+            "proprietaire": acte(proprietaire) if proprietaire else None,
+            "historique": [acte(evenement) for _, evenement in chaine]
+        })
+    return {"ehf": ehf_name, "lot": lot, "volume": volume, "date": date_iso, "resultats": resultats}
+
+@app.get("/search/proprietaire")
+def search_proprietaire(nom: str = Query(..., min_length=2), limit: int = Query(100, ge=1, le=1000)):
+    """Recherche un propriétaire (début du nom) dans tous les EHF indexés"""
+    resultats = rechercher_proprietaire(nom, limit)
+    return {"nom": nom, "nb_resultats": len(resultats), "resultats": resultats}
+
+@app.get("/search/bien")
+def search_bien(commune: str = None, lot: str = None, volume: str = None, limit: int = Query(100, ge=1, le=1000)):
+    """Retourne les propriétaires actuels d'un bien (commune, lot, volume) dans tous les EHF indexés"""
+    if commune is None and lot is None and volume is None:
+        raise HTTPException(status_code=400, detail="Préciser au moins commune, lot ou volume")
+    resultats = rechercher_bien(commune, lot, volume, limit)
+    return {"commune": commune, "lot": lot, "volume": volume, "nb_resultats": len(resultats), "resultats": resultats}
+
+@app.get("/stats/cache")
+def get_stats_cache():
+    """Compteurs du cache des données EHF"""
+    return cache_donnees.statistiques()
+
+def _metriques_cache() -> list:
+    stats = cache_donnees.statistiques()
+    return valeurs_instantanees({
+        "ehf_cache_donnees_hits_total": ("counter", "Lectures servies par le cache des données EHF", stats['hits']),
+        "ehf_cache_donnees_misses_total": ("counter", "Lectures ayant rechargé les fichiers d'un EHF", stats['misses']),
+        "ehf_cache_donnees_ratio_hits": ("gauge", "Part des lectures servies par le cache des données EHF", stats['ratio_hits']),
+        "ehf_cache_donnees_taille_octets": ("gauge", "Taille des données EHF en cache", stats['taille_octets']),
+        "ehf_cache_donnees_nb_ehf": ("gauge", "Nombre d'EHF en cache", stats['nb_ehf']),
+    })
+
+metriques.collecteurs.append(_metriques_cache)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Métriques au format texte Prometheus"""
+    return PlainTextResponse(metriques.exposer(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Uploads : taille maximale, part gardée en mémoire avant de passer sur disque, taille des blocs lus
+UPLOAD_TAILLE_MAX = int(os.environ.get("EHF_UPLOAD_TAILLE_MAX_MO", "200")) * 1024 * 1024
+UPLOAD_SPOOL = int(os.environ.get("EHF_UPLOAD_SPOOL_MO", "16")) * 1024 * 1024
+# Tolérance sur la taille du corps multipart (délimiteurs, en-têtes des parties, petits champs)
+MARGE_MULTIPART = 64 * 1024
+
+def upload_trop_volumineux() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Fichier trop volumineux (maximum {UPLOAD_TAILLE_MAX // (1024 * 1024)} Mo)")
+
+class TamponUpload:
+    """
+    Reçoit un upload bloc par bloc en calculant son SHA-256 : en mémoire jusqu'à UPLOAD_SPOOL,
+    puis dans un fichier temporaire de EHFs/ qui devient le PDF du job par simple renommage (aucune recopie)
+    """
+    def __init__(self, dossier: str = "EHFs"):
+        self.dossier, self.sha, self.taille = dossier, hashlib.sha256(), 0
+        self.memoire, self.fichier, self.temporaire = io.BytesIO(), None, None
+
+    def ecrire(self, bloc: bytes):
+        self.taille += len(bloc)
+        if self.taille > UPLOAD_TAILLE_MAX: raise upload_trop_volumineux()
+        self.sha.update(bloc)
+        if self.fichier is None and self.taille > UPLOAD_SPOOL:
+            self.fichier = self._ouvrir_temporaire()
+            self.fichier.write(self.memoire.getbuffer())
+            self.memoire = None
+        (self.fichier or self.memoire).write(bloc)
+
+    def _ouvrir_temporaire(self):
+        # Même dossier que le PDF final : le renommage ne recopie pas les données
+        os.makedirs(self.dossier, exist_ok=True)
+        self.temporaire = os.path.join(self.dossier, f".upload_{uuid.uuid4().hex}.tmp")
+        return open(self.temporaire, "wb")
+
+    @property
+    def empreinte(self) -> str:
+        return self.sha.hexdigest()
+
+    def publier(self, chemin: str):
+        """Place le contenu reçu à `chemin` : renommage du fichier temporaire, ou unique écriture du tampon mémoire"""
+        if self.fichier is None:
+            with self._ouvrir_temporaire() as f: f.write(self.memoire.getbuffer())
+        else:
+            self.fichier.close()
+        os.replace(self.temporaire, chemin)
+        self.fichier = self.temporaire = self.memoire = None
+
+    def abandonner(self):
+        if self.fichier is not None: self.fichier.close()
+        if self.temporaire and os.path.exists(self.temporaire): os.remove(self.temporaire)
+        self.fichier = self.temporaire = self.memoire = None
+
+class LectureUpload:
+    """
+    Lit le corps multipart/form-data d'un upload au fil de l'eau (python-multipart, sans UploadFile ni
+    fichier temporaire de Starlette) : les données du champ `file` vont directement dans le TamponUpload,
+    les autres champs sont ignorés. Nom de fichier et taille sont vérifiés dès leur lecture.
+    """
+    def __init__(self, tampon: TamponUpload, champ: str = "file"):
+        self.tampon, self.champ = tampon, champ.encode()
+        self.nom_fichier = None    # nom du fichier du champ `file` une fois ses en-têtes lus
+        self.recus = 0             # octets du corps reçus
+        self._dans_fichier, self._blocs = False, []
+        self._disposition = self._nom_en_tete = self._valeur_en_tete = b""
+
+    def _debut_partie(self):
+        self._dans_fichier, self._disposition = False, b""
+
+    def _nom(self, data: bytes, start: int, end: int): self._nom_en_tete += data[start:end]
+
+    def _valeur(self, data: bytes, start: int, end: int): self._valeur_en_tete += data[start:end]
+
+    def _fin_en_tete(self):
+        if self._nom_en_tete.lower() == b"content-disposition": self._disposition = self._valeur_en_tete
+        self._nom_en_tete = self._valeur_en_tete = b""
+
+    def _fin_en_tetes(self):
+        _, options = parse_options_header(self._disposition)
+        if options.get(b"name") != self.champ or b"filename" not in options or self.nom_fichier is not None: return
+        self.nom_fichier = options[b"filename"].decode("utf-8", errors="replace")
+        if not self.nom_fichier.endswith('.pdf'):
+            raise HTTPException(status_code=400, detail="Seuls les fichiers PDF sont acceptés")
+        self._dans_fichier = True
+
+    def _donnees(self, data: bytes, start: int, end: int):
+        if self._dans_fichier: self._blocs.append(data[start:end])
+
+    async def lire(self, request: Request):
+        type_contenu, parametres = parse_options_header(request.headers.get("content-type", ""))
+        if type_contenu != b"multipart/form-data" or b"boundary" not in parametres:
+            raise HTTPException(status_code=422, detail="Corps multipart/form-data attendu avec un champ 'file'")
+        parser = MultipartParser(parametres[b"boundary"], {
+            "on_part_begin": self._debut_partie, "on_header_field": self._nom, "on_header_value": self._valeur,
+            "on_header_end": self._fin_en_tete, "on_headers_finished": self._fin_en_tetes, "on_part_data": self._donnees
+        })
         try:
-            os.remove(file_path)
-        except:
-            pass  # Ignorer les erreurs de suppression
+            async for morceau in request.stream():
+                self.recus += len(morceau)
+                if self.recus > UPLOAD_TAILLE_MAX + MARGE_MULTIPART: raise upload_trop_volumineux()
+                parser.write(morceau)
+                if not self._blocs: continue
+                bloc = b"".join(self._blocs)
+                self._blocs.clear()
+                # Écriture sur disque (au-delà de UPLOAD_SPOOL) hors de la boucle d'événements
+                if self.tampon.fichier is None and self.tampon.taille + len(bloc) <= UPLOAD_SPOOL: self.tampon.ecrire(bloc)
+                else: await run_in_threadpool(self.tampon.ecrire, bloc)
+            parser.finalize()
+        except FormParserError as e:
+            raise HTTPException(status_code=400, detail=f"Corps multipart invalide: {e}")
+        if self.nom_fichier is None:
+            raise HTTPException(status_code=422, detail="Champ 'file' (fichier PDF) manquant")
+
+# Sérialise la vérification des doublons et la création des jobs entre uploads simultanés
+verrou_uploads = asyncio.Lock()
+
+# Corps documenté dans /docs (lu par LectureUpload, sans paramètre déclaré)
+_CORPS_UPLOAD = {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+    "type": "object", "required": ["file"], "properties": {"file": {"type": "string", "format": "binary"}}}}}}}
+
+@app.post("/upload", openapi_extra=_CORPS_UPLOAD)
+async def upload_ehf(request: Request):
+    """Upload et analyse d'un nouveau fichier EHF"""
+    
+    # Taille annoncée : refuser avant de lire le corps
+    longueur = request.headers.get("content-length", "")
+    if longueur.isdigit() and int(longueur) > UPLOAD_TAILLE_MAX + MARGE_MULTIPART:
+        raise upload_trop_volumineux()
+    
+    tampon = TamponUpload()
+    uploads_en_cours.inc()
+    try:
+        # Lire le corps au fil de l'eau : type, empreinte et taille maximale vérifiés pendant la réception
+        await LectureUpload(tampon).lire(request)
         
-        if result.returncode != 0:
-            raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse: {result.stderr}")
+        async with verrou_uploads:
+            # Document déjà analysé : retourner l'analyse existante sans rien écrire
+            if ehf_existant := ehf_par_empreinte(tampon.empreinte):
+                return {"message": "Fichier déjà analysé", "statut": "termine", "ehf_name": ehf_existant}
+            
+            # Nom déterminé par le contenu : un même PDF envoyé deux fois rejoint l'analyse en cours
+            ehf_name = f"EHF_UPLOAD_{tampon.empreinte[:16]}"
+            if job := job_actif(ehf_name):
+                return {"message": "Analyse déjà en file d'attente", "statut": job['statut'], "job_id": job['id'], "ehf_name": ehf_name}
+            
+            # Mettre l'analyse en file : le PDF est supprimé par le job une fois analysé
+            file_path = f"EHFs/{ehf_name}.pdf"
+            await run_in_threadpool(tampon.publier, file_path)
+            job_id = creer_job(file_path, ehf_name)
+            soumettre_job(job_id, file_path)
         
-        return {"message": "Fichier analysé avec succès", "ehf_name": ehf_name}
+        return {"message": "Analyse en file d'attente", "statut": "en_attente", "job_id": job_id, "ehf_name": ehf_name}
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors du traitement: {str(e)}")
+    finally:
+        tampon.abandonner()
+        uploads_en_cours.dec()
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Retourne l'état et la progression d'une analyse en file"""
+    job = lire_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} non trouvé")
+    
+    resultat = None
+    if job['statut'] == 'termine':
+        resultat = {
+            "proprietaires": f"/proprietaires/{job['ehf_name']}",
+            "charges": f"/charges/{job['ehf_name']}"
+        }
+    
+    return {
+        "job_id": job_id,
+        "statut": job['statut'],
+        "ehf_name": job['ehf_name'],
+        "progression": {"pages_traitees": job['pages_traitees'], "pages_totales": job['pages_totales']},
+        "resultat": resultat,
+        "message": job['message']
+    }
 
 if __name__ == "__main__":
     import uvicorn
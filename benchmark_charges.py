@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark du découpage des charges en sous-formalités : decouper_sous_formalites()
+contre l'ancienne boucle (une recherche de la formalité suivante et trois balayages par zone),
+sur des textes de charge générés avec de plus en plus de sous-formalités.
+"""
+import random, re, sys, time
+from simple_pdf_extract import decouper_sous_formalites
+
+def decouper_reference(texte_complet: str):
+    """Ancienne implémentation, quadratique en nombre de sous-formalités"""
+    sous_formalites = []
+    for match in re.finditer(r'Formalité\s+(\d+)[^:]*:([^\\n]+)', texte_complet, re.IGNORECASE):
+        start_pos = match.end()
+        next_match = re.search(r'Formalité\s+\d+', texte_complet[start_pos:], re.IGNORECASE)
+        end_pos = start_pos + next_match.start() if next_match else len(texte_complet)
+        zone_formalite = texte_complet[start_pos:end_pos]
+        sous_formalites.append({
+            'numero': match.group(1),
+            'description': match.group(2).strip(),
+            'dates_exigibilite': [m.group(1) for m in re.finditer(r'date d\'extrême exigibilité\s*:\s*(\d{2}/\d{2}/\d{4})', zone_formalite, re.IGNORECASE)],
+            'dates_effet': [m.group(1) for m in re.finditer(r'date d\'extrême effet\s*:\s*(\d{2}/\d{2}/\d{4})', zone_formalite, re.IGNORECASE)],
+            'montants': [{'type': 'principal', 'montant': m.group(1).strip()} for m in re.finditer(r'montant\s+principal\s*:\s*([\d\s,\.]+)\s*eur', zone_formalite, re.IGNORECASE)]
+        })
+    return sous_formalites
+
+def texte_charge(nb_sous_formalites: int, graine: int = 0) -> str:
+    """Texte de charge synthétique au format des relevés (dates, montants, lignes parasites)"""
+    aleatoire = random.Random(graine)
+    lignes = ["Relevé des formalités - Charge", "HYPOTHEQUE CONVENTIONNELLE PAGE 12 À PAGE 40"]
+    for numero in range(1, nb_sous_formalites + 1):
+        lignes.append(f"Formalité {numero} - Dépôt n° {aleatoire.randint(1, 9999)} : {aleatoire.choice(['Hypothèque conventionnelle', 'Privilège de prêteur de deniers', 'Prorogation', 'Radiation partielle'])}")
+        for _ in range(aleatoire.randint(0, 3)):
+            jour, mois, annee = aleatoire.randint(1, 28), aleatoire.randint(1, 12), aleatoire.randint(1990, 2060)
+            lignes.append(f"Date d'extrême {aleatoire.choice(['exigibilité', 'effet'])} : {jour:02d}/{mois:02d}/{annee}")
+        if aleatoire.random() < 0.7:
+            lignes.append(f"Montant principal : {aleatoire.randint(1000, 900000):,} EUR".replace(',', ' '))
+        lignes.append("Créancier : BANQUE POPULAIRE - Débiteur : voir annexe")
+    return "\n".join(lignes)
+
+def chronometrer(fonction, texte: str, repetitions: int) -> float:
+    debut = time.perf_counter()
+    for _ in range(repetitions): fonction(texte)
+    return (time.perf_counter() - debut) / repetitions
+
+def main():
+    identique = True
+    for nb in (10, 100, 500, 2000):
+        texte = texte_charge(nb, graine=nb)
+        attendu, obtenu = decouper_reference(texte), decouper_sous_formalites(texte)
+        identique = identique and attendu == obtenu
+        repetitions = max(1, 2000 // nb)
+        ancien, nouveau = chronometrer(decouper_reference, texte, repetitions), chronometrer(decouper_sous_formalites, texte, repetitions)
+        print(f"📄 {nb:5d} sous-formalités ({len(texte) // 1024} Ko) : ancien {ancien * 1000:8.2f} ms, nouveau {nouveau * 1000:7.2f} ms (x{ancien / max(nouveau, 1e-9):.1f})"
+              + ("" if attendu == obtenu else " ❌ résultats différents"))
+    print("✅ Sous-formalités identiques" if identique else "❌ Sous-formalités différentes")
+    return 0 if identique else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Benchmark et non-régression du pipeline d'extraction sur EHFs/*.pdf et EHFs/t2/*.pdf.
+Chaque document est traité sans cache dans un processus neuf (mémoire maximale propre au document) :
+pipeline complet (traiter_ehf avec rapport d'instrumentation) puis chaque étape seule.
+
+    python benchmark_pipeline.py --enregistrer   # fixe la référence et les sorties JSON de référence
+    python benchmark_pipeline.py                 # compare à la référence, code 1 en cas de régression
+
+Les mesures dépendent de la machine (benchmark_reference.json reste local) ; les sorties JSON non :
+leurs empreintes SHA-256 sont versionnées dans benchmark_golden.json et vérifiées même sans référence de mesures.
+
+Une mesure régresse si elle dépasse la référence de plus de --seuil (25 % par défaut) et d'au moins
+--plancher secondes (ou --plancher-mo Mo pour la mémoire), ce qui ignore le bruit des étapes de quelques ms.
+"""
+import argparse, glob, hashlib, json, multiprocessing, os, platform, shutil, sys, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List
+
+REFERENCE = "benchmark_reference.json"
+GOLDEN_DIR = "benchmark_golden"
+GOLDEN_EMPREINTES = "benchmark_golden.json"
+
+def _etapes_isolees(spe, pdf_path: str, ehf_name: str) -> Dict[str, float]:
+    """Durée de chaque étape exécutée seule : extractions sur un document ouvert à froid, étapes dérivées sur les formalités extraites"""
+    durees = {}
+    def chronometrer(nom, fonction, *args):
+        debut = time.perf_counter(); resultat = fonction(*args); durees[nom] = round(time.perf_counter() - debut, 4)
+        return resultat
+    with spe.DocumentEHF(pdf_path, cache=False) as document: immeubles_flux = chronometrer('extraire_immeubles_flux', spe.extraire_immeubles_flux, document)
+    with spe.DocumentEHF(pdf_path, cache=False) as document: formalites_pages = chronometrer('get_formalites_pages', spe.get_formalites_pages, document)
+    with spe.DocumentEHF(pdf_path, cache=False) as document: formalites = chronometrer('get_formalites_completes', spe.get_formalites_completes, document, formalites_pages)
+    publications = [f for f in formalites if f['categorie'].lower() == 'publication']
+    chronometrer('extraire_proprietaires_publication', lambda: [spe.extraire_proprietaires_publication(f) for f in publications])
+    chronometrer('determiner_proprietaires_actuels', spe.determiner_proprietaires_actuels, formalites)
+    chronometrer('extraire_charges_actives', spe.extraire_charges_actives, formalites)
+    if formalites: chronometrer('sauvegarder_formalites_json', spe.sauvegarder_formalites_json, formalites, ehf_name, immeubles_flux, None, True)
+    return durees
+
+def mesurer_document(pdf_path: str, dossier: str, etapes: bool = True) -> Dict:
+    """Exécuté dans un processus neuf : tout est écrit dans `dossier` (sorties, index, rapport)"""
+    os.chdir(dossier)
+    os.environ.update({'EHF_CACHE': '0', 'EHF_CACHE_DIR': os.path.join(dossier, 'cache_extraction'), 'EHF_EXPORT_JSON': '1'})
+    import simple_pdf_extract as spe
+    debut = time.perf_counter()
+    resume = spe.traiter_ehf(pdf_path, cache=False, export_json=True, rapport=True)
+    duree = time.perf_counter() - debut
+    with open(resume['rapport'], 'r', encoding='utf-8') as f: rapport = json.load(f)
+    mesures = {
+        'nb_pages': resume['nb_pages'],
+        'nb_formalites': resume.get('nb_formalites', 0),
+        'duree_s': round(duree, 3),
+        'pages_par_s': round(resume['nb_pages'] / max(duree, 1e-9), 2),
+        'rss_max_mo': rapport['rss_max_processus_mo'],
+        'etapes': {nom: mesure['duree_s'] for nom, mesure in rapport['etapes'].items()}
+    }
+    if etapes:
+        # Les écritures des étapes seules ne remplacent pas les sorties du pipeline complet
+        os.makedirs("etapes"); os.chdir("etapes")
+        mesures['etapes_isolees'] = _etapes_isolees(spe, pdf_path, resume['ehf_name'])
+    return mesures
+
+def sorties_json(dossier: str, ehf_name: str) -> Dict[str, object]:
+    """Fichiers JSON exportés d'un EHF (nom -> contenu)"""
+    chemin = os.path.join(dossier, ehf_name)
+    if not os.path.isdir(chemin): return {}
+    sorties = {}
+    for nom in sorted(os.listdir(chemin)):
+        if nom.endswith('.json'):
+            with open(os.path.join(chemin, nom), 'r', encoding='utf-8') as f: sorties[nom] = json.load(f)
+    return sorties
+
+def empreintes_sorties(sorties: Dict[str, object]) -> Dict[str, str]:
+    """SHA-256 du contenu JSON de chaque fichier exporté (clés triées : indépendant de la mise en forme)"""
+    return {nom: hashlib.sha256(json.dumps(contenu, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest() for nom, contenu in sorties.items()}
+
+def comparer_sorties(obtenues: Dict, attendues: Dict) -> List[str]:
+    differences = [f"{nom} absent" for nom in attendues if nom not in obtenues]
+    differences += [f"{nom} en trop" for nom in obtenues if nom not in attendues]
+    differences += [f"{nom} modifié" for nom in obtenues if nom in attendues and obtenues[nom] != attendues[nom]]
+    return differences
+
+def _metriques(mesures: Dict):
+    """(nom de la mesure, valeur, mémoire ?) d'un document"""
+    yield 'duree_s', mesures['duree_s'], False
+    if mesures.get('rss_max_mo') is not None: yield 'rss_max_mo', mesures['rss_max_mo'], True
+    for groupe in ('etapes', 'etapes_isolees'):
+        for nom, valeur in mesures.get(groupe, {}).items(): yield f"{groupe}.{nom}", valeur, False
+
+def comparer(documents: Dict, reference: Dict, seuil: float, plancher: float, plancher_mo: float) -> List[str]:
+    """Régressions par rapport à la référence (mesures absentes de la référence ignorées)"""
+    regressions = []
+    for nom, mesures in documents.items():
+        attendues = {metrique: valeur for metrique, valeur, _ in _metriques(reference['documents'].get(nom, {'duree_s': None}))}
+        for metrique, valeur, memoire in _metriques(mesures):
+            if (valeur_ref := attendues.get(metrique)) is None: continue
+            if valeur > valeur_ref * (1 + seuil) and valeur - valeur_ref > (plancher_mo if memoire else plancher):
+                regressions.append(f"{nom} {metrique} : {valeur_ref} → {valeur} (+{(valeur / max(valeur_ref, 1e-9) - 1) * 100:.0f} %)")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark et non-régression du pipeline d'extraction des EHF")
+    parser.add_argument('fichiers', nargs='*', help="PDF à mesurer (par défaut : EHFs/*.pdf et EHFs/t2/*.pdf)")
+    parser.add_argument('--enregistrer', action='store_true', help=f"Enregistrer ce run comme référence ({REFERENCE}, {GOLDEN_DIR}/)")
+    parser.add_argument('--reference', default=REFERENCE, help="Fichier de référence des mesures")
+    parser.add_argument('--golden', default=GOLDEN_DIR, help="Dossier des sorties JSON de référence (copie locale pour les inspecter)")
+    parser.add_argument('--empreintes', default=GOLDEN_EMPREINTES, help="Empreintes versionnées des sorties JSON de référence")
+    parser.add_argument('--seuil', type=float, default=0.25, help="Régression tolérée (fraction de la référence)")
+    parser.add_argument('--plancher', type=float, default=0.05, help="Écart minimal en secondes pour signaler une régression de durée")
+    parser.add_argument('--plancher-mo', type=float, default=20.0, help="Écart minimal en Mo pour signaler une régression de mémoire")
+    parser.add_argument('--sans-etapes', action='store_true', help="Ne pas mesurer chaque étape seule (run deux à trois fois plus court)")
+    args = parser.parse_args()
+
+    fichiers = args.fichiers or sorted(glob.glob(os.path.join("EHFs", "*.pdf"))) + sorted(glob.glob(os.path.join("EHFs", "t2", "*.pdf")))
+    if not fichiers:
+        print("❌ Aucun PDF trouvé dans EHFs/")
+        return 1
+    reference, empreintes = None, {}
+    if os.path.exists(args.empreintes):
+        # Un enregistrement limité à quelques PDF garde les empreintes des autres
+        with open(args.empreintes, 'r', encoding='utf-8') as f: empreintes = json.load(f)
+    elif not args.enregistrer:
+        print(f"❌ Empreintes {args.empreintes} absentes : lancer d'abord avec --enregistrer")
+        return 1
+    if not args.enregistrer:
+        if os.path.exists(args.reference):
+            with open(args.reference, 'r', encoding='utf-8') as f: reference = json.load(f)
+        else:
+            print(f"⚠️  Référence de mesures {args.reference} absente (propre à la machine) : seules les sorties JSON sont vérifiées")
+
+    travail = tempfile.mkdtemp(prefix="benchmark_ehf_")
+    documents, sorties_modifiees = {}, {}
+    try:
+        for pdf_path in fichiers:
+            nom = os.path.splitext(os.path.basename(pdf_path))[0]
+            dossier = os.path.join(travail, str(len(documents)))
+            os.makedirs(dossier)
+            # Un processus neuf par document : mémoire maximale et imports non partagés entre documents
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                mesures = pool.submit(mesurer_document, os.path.abspath(pdf_path), dossier, not args.sans_etapes).result()
+            documents[nom] = mesures
+            sorties = sorties_json(os.path.join(dossier, "formalites_json"), nom)
+            if args.enregistrer:
+                empreintes[nom] = empreintes_sorties(sorties)
+                shutil.rmtree(os.path.join(args.golden, nom), ignore_errors=True)
+                if sorties: shutil.copytree(os.path.join(dossier, "formalites_json", nom), os.path.join(args.golden, nom), ignore=shutil.ignore_patterns('*.sqlite'))
+            elif nom not in empreintes:
+                sorties_modifiees[nom] = [f"absent de {args.empreintes}"]
+            elif differences := comparer_sorties(empreintes_sorties(sorties), empreintes[nom]):
+                sorties_modifiees[nom] = differences
+            print(f"📄 {nom} ({mesures['nb_pages']} pages, {mesures['nb_formalites']} formalités) : {mesures['duree_s']:.2f}s, "
+                  f"{mesures['pages_par_s']:.1f} pages/s, {mesures['rss_max_mo']} Mo" + (" ❌ sorties JSON modifiées" if nom in sorties_modifiees else ""))
+    finally:
+        shutil.rmtree(travail, ignore_errors=True)
+
+    nb_pages, duree = sum(m['nb_pages'] for m in documents.values()), sum(m['duree_s'] for m in documents.values())
+    total = {'nb_pages': nb_pages, 'duree_s': round(duree, 3), 'pages_par_s': round(nb_pages / max(duree, 1e-9), 2),
+             'rss_max_mo': max((m['rss_max_mo'] for m in documents.values() if m['rss_max_mo'] is not None), default=None)}
+    print(f"\n⏱️  {len(documents)} documents, {nb_pages} pages : {duree:.1f}s, {total['pages_par_s']:.1f} pages/s, mémoire max {total['rss_max_mo']} Mo")
+    for groupe, titre in (('etapes', "dans le pipeline"), ('etapes_isolees', "seules")):
+        cumul = {}
+        for mesures in documents.values():
+            for etape, valeur in mesures.get(groupe, {}).items(): cumul[etape] = cumul.get(etape, 0.0) + valeur
+        if cumul: print(f"   Étapes {titre} : " + ", ".join(f"{etape} {valeur:.2f}s" for etape, valeur in cumul.items()))
+
+    if args.enregistrer:
+        with open(args.reference, 'w', encoding='utf-8') as f:
+            json.dump({'date': datetime.now().isoformat(timespec='seconds'), 'machine': platform.node(), 'python': platform.python_version(),
+                       'total': total, 'documents': documents}, f, ensure_ascii=False, indent=2)
+        with open(args.empreintes, 'w', encoding='utf-8') as f: json.dump(empreintes, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"💾 Référence enregistrée : {args.reference}, empreintes des sorties dans {args.empreintes}, sorties JSON dans {args.golden}/")
+        return 0
+
+    regressions = [] if reference is None else comparer(dict(documents, _total=total), dict(reference, documents=dict(reference['documents'], _total=reference['total'])), args.seuil, args.plancher, args.plancher_mo)
+    for regression in regressions: print(f"🐢 {regression}")
+    for nom, differences in sorties_modifiees.items(): print(f"❌ {nom} : {', '.join(differences)}")
+    if regressions or sorties_modifiees:
+        print(f"❌ {len(regressions)} régression(s) au-delà de {args.seuil * 100:.0f} %, {len(sorties_modifiees)} document(s) aux sorties modifiées")
+        return 1
+    print((f"✅ Aucune régression au-delà de {args.seuil * 100:.0f} % (référence du {reference['date']}), " if reference else "✅ ") + "sorties JSON identiques")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
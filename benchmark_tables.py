@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Benchmark de l'extraction des tables : page.extract_tables() contre extraire_tables()
+sur les PDF de EHFs/, avec vérification que les tables obtenues sont identiques.
+Les objets de chaque page sont lus avant les mesures : seul le travail de recherche
+et de lecture des tables est chronométré.
+"""
+import glob, os, sys, time
+import pdfplumber
+from simple_pdf_extract import extraire_tables
+
+def mesurer(pdf_path: str):
+    duree_pdfplumber = duree_extraire = 0.0
+    differences = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page_num, page in enumerate(pdf.pages, 1):
+            # Chaque mesure part d'une page relue (objets en cache, bords et tables recalculés)
+            page.objects
+            debut = time.perf_counter(); attendu = page.extract_tables() or []; duree_pdfplumber += time.perf_counter() - debut
+            page.flush_cache(); page.objects
+            debut = time.perf_counter(); obtenu = extraire_tables(page); duree_extraire += time.perf_counter() - debut
+            if obtenu != attendu: differences.append(page_num)
+            page.flush_cache()
+        return len(pdf.pages), duree_pdfplumber, duree_extraire, differences
+
+def main():
+    dossier = sys.argv[1] if len(sys.argv) > 1 else "EHFs"
+    fichiers = sorted(glob.glob(os.path.join(dossier, "*.pdf")))
+    if not fichiers:
+        print(f"❌ Aucun PDF trouvé dans {dossier}")
+        return 1
+
+    total_pages, total_pdfplumber, total_extraire, identique = 0, 0.0, 0.0, True
+    for pdf_path in fichiers:
+        nb_pages, duree_pdfplumber, duree_extraire, differences = mesurer(pdf_path)
+        total_pages += nb_pages; total_pdfplumber += duree_pdfplumber; total_extraire += duree_extraire
+        identique = identique and not differences
+        print(f"📄 {os.path.basename(pdf_path)} ({nb_pages} pages) : extract_tables {duree_pdfplumber:.2f}s, extraire_tables {duree_extraire:.2f}s"
+              + (f" ❌ tables différentes pages {differences}" if differences else ""))
+
+    print(f"\n⏱️  {total_pages} pages : extract_tables {total_pdfplumber:.2f}s, extraire_tables {total_extraire:.2f}s "
+          f"(x{total_pdfplumber / max(total_extraire, 1e-9):.1f})")
+    print("✅ Tables identiques" if identique else "❌ Tables différentes")
+    return 0 if identique else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Cache disque des extractions pdfplumber, indexé par l'empreinte SHA-256 du PDF : une base SQLite par PDF,
+une ligne par page (pré-scan et contenu compressés séparément), lisible et complétée page par page
+"""
+import hashlib, json, os, sqlite3, zlib
+from contextlib import closing
+from typing import Dict, Optional
+
+CACHE_DIR = os.environ.get("EHF_CACHE_DIR", "cache_extraction")
+TAILLE_MAX = int(os.environ.get("EHF_CACHE_TAILLE_MAX_MO", "512")) * 1024 * 1024
+EMPREINTES_DIR = os.path.join("formalites_json", "_empreintes")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS document (nb_pages INTEGER);
+CREATE TABLE IF NOT EXISTS pages (page_num INTEGER PRIMARY KEY, prescan BLOB, contenu BLOB);
+"""
+# Clés d'une page gardées avec le pré-scan ; le contenu (texte, tables) est lu à part
+CHAMPS_CONTENU = ('texte', 'tables')
+
+def empreinte_pdf(pdf_path: str) -> str:
+    """Calcule le SHA-256 du contenu d'un PDF"""
+    sha = hashlib.sha256()
+    with open(pdf_path, 'rb') as f:
+        for bloc in iter(lambda: f.read(1024 * 1024), b''): sha.update(bloc)
+    return sha.hexdigest()
+
+def _chemin(empreinte: str, version: str) -> str:
+    return os.path.join(CACHE_DIR, f"{empreinte}_{version}.sqlite")
+
+def _compresser(valeur: Dict) -> Optional[bytes]:
+    return zlib.compress(json.dumps(valeur, ensure_ascii=False, separators=(',', ':')).encode('utf-8')) if valeur else None
+
+def _decompresser(blob: Optional[bytes]) -> Dict:
+    return json.loads(zlib.decompress(blob).decode('utf-8')) if blob else {}
+
+class CachePages:
+    """
+    Entrée du cache d'un PDF ouverte pour la durée de son analyse : le pré-scan et le contenu de chaque page
+    se lisent à la demande et les pages s'écrivent au fil de l'eau (mode flux), sans charger tout le document
+    """
+    def __init__(self, empreinte: str, version: str):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.chemin = _chemin(empreinte, version)
+        self.connexion = sqlite3.connect(self.chemin)
+        self.connexion.executescript(SCHEMA)
+        ligne = self.connexion.execute("SELECT nb_pages FROM document").fetchone()
+        self.nb_pages = ligne[0] if ligne else None
+        # Pages dont le texte et les tables sont en cache, sans les lire
+        self.contenus = {page_num for (page_num,) in self.connexion.execute("SELECT page_num FROM pages WHERE contenu IS NOT NULL")}
+        # Marquer l'entrée comme récemment utilisée pour l'éviction LRU
+        try: os.utime(self.chemin)
+        except OSError: pass
+
+    def prescan(self, page_num: int) -> Dict:
+        """Pré-scan et signature d'une page ({} si absente)"""
+        ligne = self.connexion.execute("SELECT prescan FROM pages WHERE page_num = ?", (page_num,)).fetchone()
+        return _decompresser(ligne[0]) if ligne else {}
+
+    def contenu(self, page_num: int) -> Dict:
+        """Texte et tables d'une page ({} si absents)"""
+        ligne = self.connexion.execute("SELECT contenu FROM pages WHERE page_num = ?", (page_num,)).fetchone()
+        return _decompresser(ligne[0]) if ligne else {}
+
+    def pages(self) -> Dict[int, Dict]:
+        return {page_num: {**_decompresser(prescan), **_decompresser(contenu)} for page_num, prescan, contenu in self.connexion.execute("SELECT page_num, prescan, contenu FROM pages")}
+
+    def ecrire(self, nb_pages: Optional[int], pages: Dict[int, Dict]):
+        """Ajoute ou complète des pages (un contenu absent ne remplace pas celui déjà en cache)"""
+        with self.connexion:
+            if nb_pages is not None:
+                self.connexion.execute("DELETE FROM document")
+                self.connexion.execute("INSERT INTO document VALUES (?)", (nb_pages,))
+            self.connexion.executemany(
+                "INSERT INTO pages VALUES (?, ?, ?) ON CONFLICT (page_num) DO UPDATE SET prescan = coalesce(excluded.prescan, prescan), contenu = coalesce(excluded.contenu, contenu)",
+                ((page_num, _compresser({cle: valeur for cle, valeur in page.items() if cle not in CHAMPS_CONTENU}), _compresser({cle: page[cle] for cle in CHAMPS_CONTENU if cle in page}))
+                 for page_num, page in pages.items()))
+        self.contenus.update(page_num for page_num, page in pages.items() if any(cle in page for cle in CHAMPS_CONTENU))
+
+    def close(self):
+        self.connexion.close()
+        evincer()
+
+def charger(empreinte: str, version: str) -> Optional[Dict]:
+    """
+    Retourne {'nb_pages': ..., 'pages': {numéro: {'texte': ..., 'tables': ...}}} ou None si absent
+    """
+    if not os.path.exists(_chemin(empreinte, version)): return None
+    try:
+        with closing(CachePages(empreinte, version)) as cache: entree = {'nb_pages': cache.nb_pages, 'pages': cache.pages()}
+    except (sqlite3.Error, ValueError, zlib.error): return None
+    return entree if entree['nb_pages'] is not None else None
+
+def enregistrer(empreinte: str, version: str, nb_pages: int, pages: Dict[int, Dict]):
+    """Écrit (en une transaction) les pages extraites d'un PDF puis applique la limite de taille du cache"""
+    with closing(CachePages(empreinte, version)) as cache: cache.ecrire(nb_pages, pages)
+
+def evincer(taille_max: int = TAILLE_MAX):
+    """Supprime les entrées les moins récemment utilisées jusqu'à repasser sous la taille maximale"""
+    entrees = []
+    for nom in os.listdir(CACHE_DIR):
+        # Les entrées .json.gz de l'ancien format (un fichier JSON par PDF) ne sont plus lues mais comptent jusqu'à leur éviction
+        if nom.endswith(('.sqlite', '.json.gz')):
+            try: stat = os.stat(os.path.join(CACHE_DIR, nom))
+            except OSError: continue
+            entrees.append((stat.st_mtime, stat.st_size, nom))
+    total = sum(taille for _, taille, _ in entrees)
+    for _, taille, nom in sorted(entrees):
+        if total <= taille_max: break
+        try: os.remove(os.path.join(CACHE_DIR, nom))
+        except OSError: pass
+        total -= taille
+
+def enregistrer_empreinte(empreinte: str, ehf_name: str):
+    """Associe l'empreinte d'un PDF au nom de l'analyse produite dans formalites_json/"""
+    os.makedirs(EMPREINTES_DIR, exist_ok=True)
+    with open(os.path.join(EMPREINTES_DIR, empreinte), 'w', encoding='utf-8') as f: f.write(ehf_name)
+
+def ehf_par_empreinte(empreinte: str) -> Optional[str]:
+    """Retourne le nom de l'analyse existante pour ce PDF, si ses résultats sont toujours présents"""
+    try:
+        with open(os.path.join(EMPREINTES_DIR, empreinte), 'r', encoding='utf-8') as f: ehf_name = f.read().strip()
+    except OSError: return None
+    return ehf_name if os.path.isdir(os.path.join("formalites_json", ehf_name)) else None
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Index SQLite transverse à tous les EHF : propriétaires, biens et charges,
+pour répondre aux recherches sans relire les données de chaque EHF
+"""
+import json, os, sqlite3
+from contextlib import closing
+from typing import Dict, List
+
+INDEX_DB = os.environ.get("EHF_INDEX_DB", os.path.join("formalites_json", "index.sqlite"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS proprietaires (
+    id INTEGER PRIMARY KEY,
+    ehf TEXT NOT NULL,
+    nom TEXT NOT NULL COLLATE NOCASE,
+    date_naissance TEXT,
+    numero_identite TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_proprietaires_nom ON proprietaires (nom);
+CREATE INDEX IF NOT EXISTS idx_proprietaires_numero ON proprietaires (numero_identite);
+CREATE INDEX IF NOT EXISTS idx_proprietaires_ehf ON proprietaires (ehf);
+
+CREATE TABLE IF NOT EXISTS biens (
+    id INTEGER PRIMARY KEY,
+    ehf TEXT NOT NULL,
+    proprietaire_id INTEGER NOT NULL REFERENCES proprietaires (id),
+    commune TEXT COLLATE NOCASE,
+    adresse TEXT,
+    lot TEXT,
+    volume TEXT,
+    type_droit TEXT,
+    date_acte TEXT,
+    formalite_pages TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_biens_commune_lot ON biens (commune, lot, volume);
+CREATE INDEX IF NOT EXISTS idx_biens_lot ON biens (lot, volume);
+CREATE INDEX IF NOT EXISTS idx_biens_proprietaire ON biens (proprietaire_id);
+CREATE INDEX IF NOT EXISTS idx_biens_ehf ON biens (ehf);
+
+CREATE TABLE IF NOT EXISTS charges (
+    id INTEGER PRIMARY KEY,
+    ehf TEXT NOT NULL,
+    titre TEXT,
+    page_debut INTEGER,
+    page_fin INTEGER,
+    statut TEXT,
+    date_limite TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_charges_ehf ON charges (ehf);
+"""
+
+# Bases (chemins absolus) dont le schéma a déjà été créé par ce processus
+_bases_pretes = set()
+
+def _connexion() -> sqlite3.Connection:
+    connexion = sqlite3.connect(INDEX_DB, timeout=30)
+    connexion.row_factory = sqlite3.Row
+    return connexion
+
+def _connexion_ecriture() -> sqlite3.Connection:
+    """Connexion d'écriture : schéma et mode WAL créés au premier index écrit par ce processus"""
+    if (base := os.path.abspath(INDEX_DB)) in _bases_pretes: return _connexion()
+    os.makedirs(os.path.dirname(INDEX_DB) or ".", exist_ok=True)
+    connexion = _connexion()
+    connexion.execute("PRAGMA journal_mode=WAL")
+    connexion.executescript(SCHEMA)
+    _bases_pretes.add(base)
+    return connexion
+
+def indexer_ehf(ehf_name: str, proprietaires_biens: Dict, charges_data: Dict):
+    """Remplace les entrées d'un EHF dans l'index (une seule transaction)"""
+    with closing(_connexion_ecriture()) as connexion, connexion:
+        connexion.execute("DELETE FROM biens WHERE ehf = ?", (ehf_name,))
+        connexion.execute("DELETE FROM proprietaires WHERE ehf = ?", (ehf_name,))
+        connexion.execute("DELETE FROM charges WHERE ehf = ?", (ehf_name,))
+        for nom, data in proprietaires_biens.items():
+            proprietaire_id = connexion.execute("INSERT INTO proprietaires (ehf, nom, date_naissance, numero_identite) VALUES (?, ?, ?, ?)",
+                                                (ehf_name, nom, data.get('date_naissance'), data.get('numero_identite'))).lastrowid
+            connexion.executemany("INSERT INTO biens (ehf, proprietaire_id, commune, adresse, lot, volume, type_droit, date_acte, formalite_pages) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                  [(ehf_name, proprietaire_id, b.get('commune'), b.get('adresse'), b.get('lot'), b.get('volume'), b.get('type_droit'), b.get('date_acte'), b.get('formalite_pages')) for b in data.get('biens', [])])
+        connexion.executemany("INSERT INTO charges (ehf, titre, page_debut, page_fin, statut, date_limite) VALUES (?, ?, ?, ?, ?, ?)",
+                              [(ehf_name, c.get('titre'), c.get('page_debut'), c.get('page_fin'), c.get('statut'), c.get('date_limite'))
+                               for c in charges_data.get('charges_actives', []) + charges_data.get('charges_radiees', [])])
+
+def rechercher_proprietaire(nom: str, limite: int = 100) -> List[Dict]:
+    """Propriétaires dont le nom commence par `nom` (insensible à la casse), avec leurs biens, tous EHF confondus"""
+    motif = nom.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    # Aucun EHF encore indexé
+    if not os.path.exists(INDEX_DB): return []
+    with closing(_connexion()) as connexion:
+        proprietaires = connexion.execute("SELECT * FROM proprietaires WHERE nom LIKE ? ESCAPE '\\' ORDER BY nom, ehf LIMIT ?", (motif, limite)).fetchall()
+        resultats = []
+        for p in proprietaires:
+            biens = connexion.execute("SELECT commune, adresse, lot, volume, type_droit, date_acte FROM biens WHERE proprietaire_id = ? ORDER BY id", (p['id'],)).fetchall()
+            resultats.append({
+                "ehf": p['ehf'],
+                "proprietaire": p['nom'],
+                "date_naissance": p['date_naissance'],
+                "numero_identite": p['numero_identite'],
+                "biens": [dict(b) for b in biens]
+            })
+    return resultats
+
+def rechercher_bien(commune: str = None, lot: str = None, volume: str = None, limite: int = 100) -> List[Dict]:
+    """Propriétaires actuels des biens correspondant aux critères fournis, tous EHF confondus"""
+    criteres = [(colonne, valeur) for colonne, valeur in (('b.commune', commune), ('b.lot', lot), ('b.volume', volume)) if valeur is not None]
+    where = ' AND '.join(f"{colonne} = ?" for colonne, _ in criteres) or '1'
+    if not os.path.exists(INDEX_DB): return []
+    with closing(_connexion()) as connexion:
+        rows = connexion.execute(f"""SELECT b.ehf, b.commune, b.adresse, b.lot, b.volume, b.type_droit, b.date_acte, b.formalite_pages,
+                                            p.nom AS proprietaire, p.date_naissance, p.numero_identite
+                                     FROM biens b JOIN proprietaires p ON p.id = b.proprietaire_id
+                                     WHERE {where} ORDER BY b.ehf, b.commune, b.adresse, b.id LIMIT ?""",
+                                 (*(valeur for _, valeur in criteres), limite)).fetchall()
+    return [dict(row) for row in rows]
+
+def reindexer_tout():
+    """Reconstruit l'index à partir de toutes les données présentes dans formalites_json/"""
+    from stockage_ehf import chemin_stockage, lire_documents
+
+    nb = 0
+    for ehf_name in sorted(os.listdir("formalites_json")):
+        if os.path.exists(chemin_stockage(ehf_name)):
+            proprietaires_biens, charges_data = lire_documents(ehf_name, 'proprietaires_biens', 'charges')
+        elif os.path.exists(fichier := os.path.join("formalites_json", ehf_name, f"{ehf_name}_par_proprietaire.json")):
+            with open(fichier, 'r', encoding='utf-8') as f: proprietaires_biens = json.load(f)
+            with open(os.path.join("formalites_json", ehf_name, f"{ehf_name}_charges_actives.json"), 'r', encoding='utf-8') as f: charges_data = json.load(f)
+        else:
+            continue
+        indexer_ehf(ehf_name, proprietaires_biens or {}, charges_data or {})
+        nb += 1
+    return nb
+
+if __name__ == "__main__":
+    print(f"🔎 {reindexer_tout()} EHF indexés dans {INDEX_DB}")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Instrumentation optionnelle du pipeline d'extraction (EHF_RAPPORT=1 ou --rapport) :
+durée et mémoire maximale par étape, durées par page, compteurs, et un rapport JSON par document
+dans formalites_json/_rapports/. Inactive, elle se réduit à un test par appel d'étape.
+"""
+import functools, json, os, sys, time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional
+try: import resource
+except ImportError: resource = None  # Windows : pas de mesure de la mémoire
+
+ACTIF = os.environ.get('EHF_RAPPORT', '0') == '1'
+RAPPORTS_DIR = os.path.join("formalites_json", "_rapports")
+
+# Unité de ru_maxrss : octets sous macOS, kilo-octets sous Linux et les BSD
+_OCTETS_RU_MAXRSS = 1 if sys.platform == 'darwin' else 1024
+
+# Rapport du document en cours de traitement dans ce processus
+_rapport = None
+
+def rss_max_processus_mo() -> Optional[float]:
+    """
+    Pic de mémoire résidente du processus depuis son démarrage, ou de ses processus de pool terminés (Mo).
+    C'est un maximum sur toute la vie du processus, pas la mémoire d'une étape.
+    """
+    if resource is None: return None
+    return round(max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * _OCTETS_RU_MAXRSS / 1024 / 1024, 1)
+
+class RapportDocument:
+    """Mesures collectées pendant le traitement d'un document"""
+    def __init__(self, ehf_name: str, fichier: Optional[str] = None):
+        self.ehf_name, self.fichier = ehf_name, fichier
+        self.debut, self.debut_horloge = time.perf_counter(), datetime.now().isoformat(timespec='seconds')
+        self.etapes = {}    # nom -> {'appels', 'duree_s', 'hausse_rss_max_mo', 'rss_max_processus_mo'}
+        self.pages = {}     # numéro -> {'texte_s', 'tables_s', 'entete_s', 'nb_tables'}
+        self.compteurs = {}
+
+    def etape(self, nom: str, duree: float, rss_avant: Optional[float] = None):
+        """Cumule un appel d'étape ; rss_avant : pic du processus au début de l'appel"""
+        mesure = self.etapes.setdefault(nom, {'appels': 0, 'duree_s': 0.0})
+        mesure['appels'] += 1
+        mesure['duree_s'] += duree
+        mesure['rss_max_processus_mo'] = rss_apres = rss_max_processus_mo()
+        if rss_apres is not None and rss_avant is not None:
+            # Hausse du pic due à cette étape : nulle si elle est restée sous le pic d'une étape antérieure
+            mesure['hausse_rss_max_mo'] = round(mesure.get('hausse_rss_max_mo', 0.0) + rss_apres - rss_avant, 1)
+
+    def page(self, page_num: int, mesure: str, duree: float, **infos):
+        self.pages.setdefault(page_num, {}).update({f"{mesure}_s": round(duree, 4), **infos})
+
+    def compter(self, **compteurs):
+        self.compteurs.update(compteurs)
+
+    def en_dict(self) -> Dict:
+        duree_pages = {n: sum(v for k, v in mesures.items() if k.endswith('_s')) for n, mesures in self.pages.items()}
+        return {
+            'document': self.ehf_name,
+            'fichier': self.fichier,
+            'debut': self.debut_horloge,
+            'duree_totale_s': round(time.perf_counter() - self.debut, 3),
+            'rss_max_processus_mo': rss_max_processus_mo(),
+            'compteurs': self.compteurs,
+            'etapes': {nom: dict(mesure, duree_s=round(mesure['duree_s'], 4)) for nom, mesure in self.etapes.items()},
+            'pages_lentes': [{'page': n, 'duree_s': round(duree, 4)} for n, duree in sorted(duree_pages.items(), key=lambda item: -item[1])[:5]],
+            'pages': {str(n): self.pages[n] for n in sorted(self.pages)}
+        }
+
+    def ecrire(self) -> str:
+        os.makedirs(RAPPORTS_DIR, exist_ok=True)
+        chemin = os.path.join(RAPPORTS_DIR, f"{self.ehf_name}.json")
+        with open(chemin, 'w', encoding='utf-8') as f: json.dump(self.en_dict(), f, ensure_ascii=False, indent=2)
+        return chemin
+
+@contextmanager
+def rapport_document(ehf_name: str, fichier: Optional[str] = None, actif: bool = None):
+    """Active la collecte pour un document et écrit son rapport à la fin (rien si l'instrumentation est inactive)"""
+    global _rapport
+    if not (ACTIF if actif is None else actif):
+        yield None
+        return
+    precedent, _rapport = _rapport, RapportDocument(ehf_name, fichier)
+    try:
+        yield _rapport
+    finally:
+        rapport, _rapport = _rapport, precedent
+        try: rapport.chemin = rapport.ecrire()
+        except OSError as e: print(f"⚠️  Rapport non écrit pour {ehf_name}: {e}")
+
+def rapport_courant() -> Optional[RapportDocument]:
+    return _rapport
+
+def etape(fonction):
+    """Décorateur : mesure chaque appel d'une étape du pipeline lorsqu'un rapport est actif"""
+    @functools.wraps(fonction)
+    def enveloppe(*args, **kwargs):
+        rapport = _rapport
+        if rapport is None: return fonction(*args, **kwargs)
+        rss_avant, debut = rss_max_processus_mo(), time.perf_counter()
+        try: return fonction(*args, **kwargs)
+        finally: rapport.etape(fonction.__name__, time.perf_counter() - debut, rss_avant)
+    return enveloppe
+
+def mesurer_page(page_num: int, mesure: str, debut: float, **infos):
+    """Durée d'une mesure de page (texte, tables, entete) commencée à `debut` (perf_counter)"""
+    if _rapport is not None: _rapport.page(page_num, mesure, time.perf_counter() - debut, **infos)
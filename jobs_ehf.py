@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+File locale des analyses d'uploads, persistée dans SQLite pour survivre aux redémarrages
+"""
+import os, sqlite3, time, uuid
+from contextlib import closing
+from datetime import datetime
+from typing import Dict, List, Optional
+
+JOBS_DB = os.environ.get("EHF_JOBS_DB", os.path.join("formalites_json", "jobs.sqlite"))
+
+# Bases (chemins absolus) dont le schéma a déjà été créé par ce processus
+_bases_pretes = set()
+
+def _connexion() -> sqlite3.Connection:
+    """Connexion à la file des jobs (à fermer par l'appelant), schéma et mode WAL créés une fois par processus"""
+    if (base := os.path.abspath(JOBS_DB)) not in _bases_pretes: os.makedirs(os.path.dirname(JOBS_DB) or ".", exist_ok=True)
+    connexion = sqlite3.connect(JOBS_DB, timeout=30)
+    connexion.row_factory = sqlite3.Row
+    if base in _bases_pretes: return connexion
+    connexion.execute("PRAGMA journal_mode=WAL")
+    connexion.execute("""CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        statut TEXT NOT NULL,
+        fichier TEXT NOT NULL,
+        ehf_name TEXT NOT NULL,
+        pages_traitees INTEGER NOT NULL DEFAULT 0,
+        pages_totales INTEGER,
+        message TEXT,
+        cree_le TEXT NOT NULL,
+        maj_le TEXT NOT NULL
+    )""")
+    _bases_pretes.add(base)
+    return connexion
+
+def creer_job(fichier: str, ehf_name: str) -> str:
+    """Enregistre un nouveau job en attente et retourne son identifiant"""
+    job_id = uuid.uuid4().hex
+    maintenant = datetime.now().isoformat(timespec='seconds')
+    with closing(_connexion()) as connexion, connexion:
+        connexion.execute("INSERT INTO jobs (id, statut, fichier, ehf_name, cree_le, maj_le) VALUES (?, 'en_attente', ?, ?, ?, ?)",
+                          (job_id, fichier, ehf_name, maintenant, maintenant))
+    return job_id
+
+def _maj(connexion: sqlite3.Connection, job_id: str, **champs):
+    champs['maj_le'] = datetime.now().isoformat(timespec='seconds')
+    with connexion:
+        connexion.execute(f"UPDATE jobs SET {', '.join(f'{nom} = ?' for nom in champs)} WHERE id = ?", (*champs.values(), job_id))
+
+def maj_job(job_id: str, **champs):
+    """Met à jour les champs d'un job (statut, pages_traitees, pages_totales, message)"""
+    with closing(_connexion()) as connexion: _maj(connexion, job_id, **champs)
+
+class ProgressionJob:
+    """
+    Publie la progression d'un job sur la connexion ouverte pour toute son analyse,
+    seulement quand le pourcentage de pages traitées change (au plus ~100 écritures par job)
+    """
+    def __init__(self, connexion: sqlite3.Connection, job_id: str):
+        self.connexion, self.job_id, self._pourcentage = connexion, job_id, None
+
+    def __call__(self, faites: int, totales: int):
+        pourcentage = faites * 100 // totales if totales else 0
+        if pourcentage == self._pourcentage: return
+        self._pourcentage = pourcentage
+        _maj(self.connexion, self.job_id, pages_traitees=faites, pages_totales=totales)
+
+def lire_job(job_id: str) -> Optional[Dict]:
+    with closing(_connexion()) as connexion, connexion:
+        row = connexion.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return dict(row) if row else None
+
+def job_actif(ehf_name: str) -> Optional[Dict]:
+    """Job en attente ou en cours pour cette analyse, s'il y en a un"""
+    with closing(_connexion()) as connexion, connexion:
+        row = connexion.execute("SELECT * FROM jobs WHERE ehf_name = ? AND statut IN ('en_attente', 'en_cours') ORDER BY cree_le LIMIT 1", (ehf_name,)).fetchone()
+    return dict(row) if row else None
+
+def jobs_a_reprendre() -> List[Dict]:
+    """
+    Jobs interrompus par un arrêt de l'API : remis en attente si leur PDF est toujours là,
+    en erreur sinon
+    """
+    with closing(_connexion()) as connexion, connexion:
+        jobs = [dict(row) for row in connexion.execute("SELECT * FROM jobs WHERE statut IN ('en_attente', 'en_cours') ORDER BY cree_le")]
+    a_reprendre = []
+    for job in jobs:
+        if os.path.exists(job['fichier']):
+            maj_job(job['id'], statut='en_attente', pages_traitees=0)
+            a_reprendre.append(job)
+        else:
+            maj_job(job['id'], statut='erreur', message="Fichier source perdu lors d'un redémarrage")
+    return a_reprendre
+
+def executer_job(job_id: str, pdf_path: str) -> Dict:
+    """
+    Analyse le PDF d'un job (exécuté dans un processus du pool) en publiant sa progression
+    """
+    from simple_pdf_extract import traiter_ehf
+
+    # Une seule connexion pour tout le job, progression comprise
+    with closing(_connexion()) as connexion:
+        _maj(connexion, job_id, statut='en_cours')
+        debut = time.perf_counter()
+        try:
+            resume = traiter_ehf(pdf_path, progression=ProgressionJob(connexion, job_id))
+            resume['duree_s'] = round(time.perf_counter() - debut, 3)
+            if resume['sauvegarde']:
+                _maj(connexion, job_id, statut='termine', pages_traitees=resume['nb_pages'], pages_totales=resume['nb_pages'])
+            else:
+                _maj(connexion, job_id, statut='erreur', message="Aucune formalité trouvée dans le fichier")
+            return resume
+        except Exception as e:
+            _maj(connexion, job_id, statut='erreur', message=f"Erreur lors de l'analyse: {e}")
+            raise
+        finally:
+            try: os.remove(pdf_path)
+            except OSError: pass
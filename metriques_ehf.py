@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Métriques de l'API au format texte Prometheus (GET /metrics), sans dépendance ni service externe :
+compteurs, jauges et histogrammes gardés en mémoire du processus de l'API. Une mesure coûte
+une prise de verrou et quelques opérations de dictionnaire, elle peut rester active en production.
+"""
+import threading, time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Bornes des histogrammes (secondes)
+DUREES_REQUETES = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DUREES_EXTRACTION = (1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+def _echapper(valeur) -> str:
+    return str(valeur).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _etiquettes(cle: Tuple, **supplementaires) -> str:
+    paires = list(cle) + list(supplementaires.items())
+    return '{' + ','.join(f'{nom}="{_echapper(valeur)}"' for nom, valeur in paires) + '}' if paires else ''
+
+def _nombre(valeur: float) -> str:
+    return repr(float(valeur)) if isinstance(valeur, float) and not valeur.is_integer() else str(int(valeur))
+
+class Metrique:
+    type_metrique = 'untyped'
+
+    def __init__(self, registre: 'Registre', nom: str, aide: str):
+        self.nom, self.aide, self._verrou = nom, aide, registre.verrou
+        self._valeurs = {}  # étiquettes triées -> valeur
+        registre.metriques.append(self)
+
+    def lignes(self) -> Iterable[str]:
+        yield f"# HELP {self.nom} {self.aide}"
+        yield f"# TYPE {self.nom} {self.type_metrique}"
+        with self._verrou: valeurs = list(self._valeurs.items())
+        for cle, valeur in valeurs: yield f"{self.nom}{_etiquettes(cle)} {_nombre(valeur)}"
+
+class Compteur(Metrique):
+    type_metrique = 'counter'
+
+    def inc(self, valeur: float = 1, **etiquettes):
+        cle = tuple(sorted(etiquettes.items()))
+        with self._verrou: self._valeurs[cle] = self._valeurs.get(cle, 0) + valeur
+
+class Jauge(Metrique):
+    type_metrique = 'gauge'
+
+    def inc(self, valeur: float = 1, **etiquettes):
+        cle = tuple(sorted(etiquettes.items()))
+        with self._verrou: self._valeurs[cle] = self._valeurs.get(cle, 0) + valeur
+
+    def dec(self, valeur: float = 1, **etiquettes): self.inc(-valeur, **etiquettes)
+
+class Histogramme(Metrique):
+    type_metrique = 'histogram'
+
+    def __init__(self, registre: 'Registre', nom: str, aide: str, bornes: Tuple[float, ...]):
+        super().__init__(registre, nom, aide)
+        self.bornes = tuple(sorted(bornes))
+
+    def observer(self, valeur: float, **etiquettes):
+        cle = tuple(sorted(etiquettes.items()))
+        with self._verrou:
+            # [effectifs par intervalle (le dernier au-delà de la plus grande borne), somme, nombre]
+            serie = self._valeurs.get(cle) or self._valeurs.setdefault(cle, [[0] * (len(self.bornes) + 1), 0.0, 0])
+            serie[0][bisect_left(self.bornes, valeur)] += 1
+            serie[1] += valeur
+            serie[2] += 1
+
+    def lignes(self) -> Iterable[str]:
+        yield f"# HELP {self.nom} {self.aide}"
+        yield f"# TYPE {self.nom} histogram"
+        with self._verrou: series = [(cle, list(effectifs), somme, nombre) for cle, (effectifs, somme, nombre) in self._valeurs.items()]
+        for cle, effectifs, somme, nombre in series:
+            cumul = 0
+            for borne, effectif in zip(self.bornes, effectifs):
+                cumul += effectif
+                yield f"{self.nom}_bucket{_etiquettes(cle, le=_nombre(borne))} {cumul}"
+            yield f"{self.nom}_bucket{_etiquettes(cle, le='+Inf')} {nombre}"
+            yield f"{self.nom}_sum{_etiquettes(cle)} {_nombre(somme)}"
+            yield f"{self.nom}_count{_etiquettes(cle)} {nombre}"
+
+class Registre:
+    """Ensemble des métriques exposées, plus des collecteurs appelés à chaque lecture (valeurs lues ailleurs)"""
+    def __init__(self):
+        self.verrou = threading.Lock()
+        self.metriques: List[Metrique] = []
+        self.collecteurs: List[Callable[[], Iterable[str]]] = []
+
+    def compteur(self, nom: str, aide: str) -> Compteur: return Compteur(self, nom, aide)
+
+    def jauge(self, nom: str, aide: str) -> Jauge: return Jauge(self, nom, aide)
+
+    def histogramme(self, nom: str, aide: str, bornes: Tuple[float, ...]) -> Histogramme: return Histogramme(self, nom, aide, bornes)
+
+    def exposer(self) -> str:
+        lignes = [ligne for metrique in self.metriques for ligne in metrique.lignes()]
+        for collecteur in self.collecteurs: lignes.extend(collecteur())
+        return '\n'.join(lignes) + '\n'
+
+def valeurs_instantanees(valeurs: Dict[str, Tuple[str, str, float]]) -> List[str]:
+    """Lignes d'exposition de valeurs lues au moment de la collecte : nom -> (type, aide, valeur)"""
+    lignes = []
+    for nom, (type_metrique, aide, valeur) in valeurs.items():
+        if valeur is None: continue
+        lignes += [f"# HELP {nom} {aide}", f"# TYPE {nom} {type_metrique}", f"{nom} {_nombre(valeur)}"]
+    return lignes
+
+class MesureRequetesHTTP:
+    """
+    Middleware ASGI : nombre et durée des requêtes par route (modèle de chemin, ex. /proprietaires/{ehf_name},
+    pour garder un nombre borné de séries), méthode et statut. La durée court jusqu'au dernier octet envoyé.
+    """
+    def __init__(self, app, requetes: Compteur, durees: Histogramme):
+        self.app, self.requetes, self.durees = app, requetes, durees
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        debut, statut = time.perf_counter(), [500]
+        async def envoyer(message):
+            if message['type'] == 'http.response.start': statut[0] = message['status']
+            await send(message)
+        try:
+            await self.app(scope, receive, envoyer)
+        finally:
+            route = getattr(scope.get('route'), 'path', None) or 'non_trouvee'
+            self.requetes.inc(route=route, methode=scope['method'], statut=statut[0])
+            self.durees.observer(time.perf_counter() - debut, route=route, methode=scope['method'])
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Index des propriétaires actuels d'un EHF : les plages de lots ("145 à 147") sont gardées
+en intervalles par immeuble au lieu d'être dépliées lot par lot. La règle « l'acte le plus
+récent l'emporte » est appliquée par intervalle et un lot se retrouve en O(log n).
+"""
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+def cle_immeuble(commune: str, adresse: str) -> str:
+    """Clé d'un immeuble (même normalisation que les anciennes clés commune_adresse)"""
+    return f"{commune}_{adresse}".replace(' ', '_').replace('/', '_')
+
+def decouper_lots(lots: str) -> Iterator[Union[Tuple[int, int], str]]:
+    """
+    Parse un champ lots ("144", "145 à 147", "101\n103 à 106\n111") : plages (début, fin)
+    pour les numéros, chaînes pour les lots non numériques
+    """
+    for lot_group in lots.replace('\n', ',').split(','):
+        lot_group = lot_group.strip()
+        if 'à' in lot_group:
+            # Range de lots (ex: "145 à 147")
+            try:
+                debut, fin = lot_group.split('à')
+                yield int(debut.strip()), int(fin.strip())
+            except:
+                yield lot_group
+        elif lot_group.isdigit():
+            yield int(lot_group), int(lot_group)
+        elif lot_group:
+            yield lot_group
+
+class IndexProprietes:
+    """
+    Propriétaire actuel de chaque lot, par immeuble. Chaque intervalle de lots porte l'enregistrement
+    du propriétaire (partagé par tous ses lots) et l'ordre dans lequel ses lots ont été vus pour la
+    première fois, ce qui permet de redéplier lot par lot dans l'ordre de l'ancien format.
+    """
+    def __init__(self):
+        self._plages = {}   # clé immeuble -> [[début, fin, enregistrement, séquence, position du début]] triés, disjoints
+        self._autres = {}   # clé immeuble -> {lot non numérique: [enregistrement, séquence, position]}
+        self._sans_lot = {} # clé immeuble -> [enregistrement, séquence, 0]
+        self._sequence = 0
+        self._evenements = []  # (clé immeuble, plage (début, fin) / lot non numérique / None, enregistrement) dans l'ordre des actes traités
+
+    def enregistrer(self, commune: str, adresse: str, lots: Optional[str], enregistrement: Dict):
+        """
+        Ajoute l'immeuble d'une publication : `enregistrement` (propriétaire, volume, 'date_acte' en datetime...)
+        remplace le propriétaire des lots dont l'acte est strictement plus ancien
+        """
+        cle = cle_immeuble(commune, adresse)
+        self._sequence += 1
+        if not lots or lots == '-':
+            self._evenements.append((cle, None, enregistrement))
+            actuel = self._sans_lot.get(cle)
+            if actuel is None: self._sans_lot[cle] = [enregistrement, self._sequence, 0]
+            elif actuel[0]['date_acte'] < enregistrement['date_acte']: actuel[0] = enregistrement
+            return
+        position = 0
+        for groupe in decouper_lots(lots):
+            if isinstance(groupe, str) or groupe[1] >= groupe[0]: self._evenements.append((cle, groupe, enregistrement))
+            if isinstance(groupe, str):
+                actuel = self._autres.setdefault(cle, {}).get(groupe)
+                if actuel is None: self._autres[cle][groupe] = [enregistrement, self._sequence, position]
+                elif actuel[0]['date_acte'] < enregistrement['date_acte']: actuel[0] = enregistrement
+                position += 1
+            elif groupe[1] >= groupe[0]:
+                self._fusionner(self._plages.setdefault(cle, []), groupe[0], groupe[1], enregistrement, position)
+                position += groupe[1] - groupe[0] + 1
+
+    def _fusionner(self, plages: List[List], debut: int, fin: int, enregistrement: Dict, position: int):
+        """Applique l'enregistrement à [début, fin] : les trous sont comblés, les parties plus anciennes remplacées"""
+        i = j = bisect_left(plages, debut, key=lambda plage: plage[1])
+        nouvelles, curseur = [], debut
+        while j < len(plages) and plages[j][0] <= fin:
+            a, b, actuel, sequence, position_a = plages[j]
+            if a < debut:
+                nouvelles.append([a, debut - 1, actuel, sequence, position_a])
+                position_a, a = position_a + debut - a, debut
+            if curseur < a:
+                nouvelles.append([curseur, a - 1, enregistrement, self._sequence, position + curseur - debut])
+            b_commun = min(b, fin)
+            # Lots déjà vus : l'ordre de première apparition est conservé, seul le propriétaire peut changer
+            nouvelles.append([a, b_commun, enregistrement if actuel['date_acte'] < enregistrement['date_acte'] else actuel, sequence, position_a])
+            if b > fin:
+                nouvelles.append([fin + 1, b, actuel, sequence, position_a + fin + 1 - a])
+            curseur = b_commun + 1
+            j += 1
+        if curseur <= fin:
+            nouvelles.append([curseur, fin, enregistrement, self._sequence, position + curseur - debut])
+        # Recoller les intervalles contigus de même propriétaire et de même ordre d'apparition
+        fusionnees = [] if i == 0 else [plages[i - 1]]
+        for plage in nouvelles + plages[j:j + 1]:
+            precedente = fusionnees[-1] if fusionnees else None
+            if precedente and precedente[1] + 1 == plage[0] and precedente[2] is plage[2] and precedente[3] == plage[3] and precedente[4] + plage[0] - precedente[0] == plage[4]:
+                precedente[1] = plage[1]
+            else:
+                fusionnees.append(plage)
+        plages[max(i - 1, 0):j + 1] = fusionnees
+
+    def proprietaire(self, commune: str, adresse: str, lot: Union[int, str, None] = None, volume: Optional[str] = None) -> Optional[Dict]:
+        """Propriétaire actuel d'un lot (None : immeuble sans lot spécifique), filtré sur le volume s'il est fourni"""
+        cle, enregistrement = cle_immeuble(commune, adresse), None
+        if lot is None:
+            if trouve := self._sans_lot.get(cle): enregistrement = trouve[0]
+        elif isinstance(lot, int) or str(lot).strip().isdigit():
+            numero, plages = int(lot), self._plages.get(cle, [])
+            i = bisect_left(plages, numero, key=lambda plage: plage[1])
+            if i < len(plages) and plages[i][0] <= numero: enregistrement = plages[i][2]
+        elif trouve := self._autres.get(cle, {}).get(str(lot).strip()):
+            enregistrement = trouve[0]
+        if enregistrement is None or (volume is not None and enregistrement['volume'] != volume): return None
+        return dict(enregistrement, lot='Sans lot spécifique' if lot is None else str(lot).strip())
+
+    def iter_evenements(self) -> Iterator[Dict]:
+        """
+        Historique compact des actes : une entrée par plage de lots (lot_debut, lot_fin), lot non numérique (lot)
+        ou immeuble sans lot, avec sa date en ISO (date_iso), triée par immeuble puis date ; à date égale,
+        dans l'ordre de traitement des publications
+        """
+        for cle, groupe, enregistrement in sorted(self._evenements, key=lambda evenement: (evenement[0], evenement[2]['date_acte'])):
+            yield {
+                'cle': cle,
+                'lot_debut': groupe[0] if isinstance(groupe, tuple) else None,
+                'lot_fin': groupe[1] if isinstance(groupe, tuple) else None,
+                'lot': groupe if isinstance(groupe, str) else None,
+                **{champ: valeur for champ, valeur in enregistrement.items() if champ not in ('date_acte', 'date_acte_str')},
+                'date_acte': enregistrement['date_acte_str'],
+                'date_iso': enregistrement['date_acte'].date().isoformat()
+            }
+
+    def nb_intervalles(self) -> int:
+        return sum(len(plages) for plages in self._plages.values())
+
+    def iter_lots(self) -> Iterator[Tuple[str, Dict]]:
+        """Déplie l'index lot par lot, (lot, enregistrement), dans l'ordre de première apparition des lots"""
+        entrees = [((sequence, position), 'Sans lot spécifique', enregistrement) for enregistrement, sequence, position in self._sans_lot.values()]
+        entrees += [((sequence, position), lot, enregistrement) for autres in self._autres.values() for lot, (enregistrement, sequence, position) in autres.items()]
+        entrees += [((sequence, position + lot - debut), str(lot), enregistrement)
+                    for plages in self._plages.values() for debut, fin, enregistrement, sequence, position in plages for lot in range(debut, fin + 1)]
+        entrees.sort(key=lambda entree: entree[0])
+        for _, lot, enregistrement in entrees: yield lot, enregistrement
+
+def chaines_proprietaires(evenements: Iterable[Dict]) -> Dict[str, List[Tuple[str, Dict]]]:
+    """
+    Chaîne des propriétaires successifs d'un lot pour chaque immeuble, [(date ISO, événement)], à partir de ses
+    événements déjà triés par immeuble puis date (ordre de iter_evenements). À date égale, le premier acte
+    traité est gardé, comme pour les propriétaires actuels.
+    """
+    chaines = {}
+    for evenement in evenements:
+        chaine = chaines.setdefault(evenement['cle'], [])
+        if not chaine or chaine[-1][0] != evenement['date_iso']: chaine.append((evenement['date_iso'], evenement))
+    return chaines
+
+def proprietaire_a_date(chaine: List[Tuple[str, Dict]], date_iso: str) -> Optional[Dict]:
+    """Propriétaire à une date (ISO) : dernier acte de la chaîne daté de ce jour ou avant, par recherche dichotomique"""
+    i = bisect_right(chaine, date_iso, key=lambda etape: etape[0])
+    return chaine[i - 1][1] if i else None
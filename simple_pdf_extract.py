@@ -1,374 +1,708 @@
 #!/usr/bin/env python3
-import os, pdfplumber, re, json
-from typing import List, Dict
+import os, pdfplumber, re, json, sqlite3, time, zlib
+from types import SimpleNamespace
+from pdfplumber.table import Table, TableSettings
+from pdfminer.pdftypes import PDFObjRef, resolve1
+from pdfminer.psparser import LIT
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from itertools import chain, repeat
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Set, Tuple, Union
+import cache_extraction, index_ehf, instrumentation_ehf, stockage_ehf, tranches_ehf
+from proprietes_ehf import IndexProprietes
 
-def get_formalites_pages(pdf_path: str) -> List[int]:
-    patterns = [r"Relevé\s+des\s+formalités\s*-\s*(Publication|Volumétrie|Copropriété|Lotissement|Charge|Formalités en attente|rejet définitif)"]
+# Version de l'extraction par page : la changer invalide le cache disque
+VERSION_EXTRACTEUR = f"1-pdfplumber{pdfplumber.__version__}"
+
+# Export des anciens fichiers JSON en plus du stockage compact (opt-in)
+EXPORT_JSON = os.environ.get('EHF_EXPORT_JSON', '0') == '1'
+# Mode flux (EHF_FLUX=1 ou --flux) : mémoire bornée pour les documents très longs
+FLUX = os.environ.get('EHF_FLUX', '0') == '1'
+
+# Pages de tête lues entièrement pour les immeubles du flux
+NB_PAGES_FLUX = 5
+# Mode flux avec --workers : pages préchargées à la fois par processus du pool
+FENETRE_FLUX = 32
+
+# En-têtes de formalité, comparés sans espaces sur le texte brut du pré-scan
+ENTETE_FORMALITE = re.compile(r"Relevédesformalités-(Publication|Volumétrie|Copropriété|Lotissement|Charge|Formalitésenattente|rejetdéfinitif)", re.IGNORECASE)
+
+# Opérateurs de texte d'un flux de contenu : Tf (police), Tj ' " (chaîne), TJ (tableau), ET (fin de bloc)
+_OPERATEURS_TEXTE = re.compile(rb"/([^\s/\[\]()<>{}%]+)\s+[-\d.]+\s+Tf|<([0-9A-Fa-f\s]*)>\s*(?:Tj|'|\")|\(((?:\\.|[^\\)])*)\)\s*(?:Tj|'|\")|\[((?:[^\]\\]|\\.)*)\]\s*TJ|\bET\b", re.S)
+_CHAINES_TJ = re.compile(rb"<([0-9A-Fa-f\s]*)>|\(((?:\\.|[^\\)])*)\)", re.S)
+_ECHAPPEMENTS = re.compile(rb"\\([0-7]{1,3}|.)", re.S)
+
+def _chaine_litterale(brut: bytes) -> bytes:
+    return _ECHAPPEMENTS.sub(lambda m: bytes([int(m.group(1), 8) & 255]) if m.group(1)[:1].isdigit() else {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f'}.get(m.group(1), m.group(1)), brut)
+
+def texte_brut_page(pdf, page_num: int) -> Optional[str]:
+    """
+    Texte d'une page décodé directement depuis les opérateurs de texte de son flux de contenu
+    (polices ToUnicode), sans interpréter la page ni calculer sa mise en page : l'ordre et les espaces
+    ne sont pas garantis. None si la page dessine des formulaires (XObject Form) dont le texte échapperait au scan.
+    """
+    page = pdf.pages[page_num - 1].page_obj
+    ressources = resolve1(page.resources) or {}
+    if any(resolve1(xobjet).get('Subtype') is LIT('Form') for xobjet in (resolve1(ressources.get('XObject')) or {}).values()): return None
+    polices = {nom.encode() if isinstance(nom, str) else nom: pdf.rsrcmgr.get_font(spec.objid if isinstance(spec, PDFObjRef) else None, resolve1(spec)) for nom, spec in (resolve1(ressources.get('Font')) or {}).items()}
+    morceaux, police = [], None
+    def decoder(chaine: bytes):
+        for cid in police.decode(chaine):
+            try: morceaux.append(police.to_unichr(cid))
+            except Exception: pass
+    for m in _OPERATEURS_TEXTE.finditer(b''.join(flux.get_data() for flux in page.contents)):
+        if m.group(1) is not None: police = polices.get(m.group(1))
+        elif m.group(0) == b'ET': morceaux.append('\n')
+        elif police is None: continue
+        elif m.group(2) is not None: decoder(bytes.fromhex(re.sub(rb'\s', b'', m.group(2)).decode()))
+        elif m.group(3) is not None: decoder(_chaine_litterale(m.group(3)))
+        else:
+            for hexa, litterale in _CHAINES_TJ.findall(m.group(4)): decoder(bytes.fromhex(re.sub(rb'\s', b'', hexa).decode()) if hexa or not litterale else _chaine_litterale(litterale))
+    return ''.join(morceaux)
+
+def extraire_tables(page) -> List:
+    """
+    Équivalent de page.extract_tables() (mêmes réglages, même résultat) en évitant le travail inutile :
+    une page sans trait ni rectangle ne peut pas contenir de table (stratégie « lines »), et chaque table
+    n'examine que les caractères de sa zone au lieu de ceux de toute la page pour chacune de ses lignes
+    """
+    if not page.edges: return []
+    reglages = TableSettings.resolve(None)
+    tables = []
+    for table in page.find_tables(reglages):
+        x0, top, x1, bottom = table.bbox
+        # Même critère que Table.extract (milieu du caractère dans la zone), ordre des caractères conservé
+        chars = [c for c in page.chars if x0 <= (c['x0'] + c['x1']) / 2 < x1 and top <= (c['top'] + c['bottom']) / 2 < bottom]
+        tables.append(Table(SimpleNamespace(chars=chars), table.cells).extract(**(reglages.text_settings or {})))
+    return tables
+
+def liberer_page(page):
+    """
+    Libère ce que pdfplumber et pdfminer gardent d'une page lue : objets de mise en page, texte positionné
+    (get_textmap) et flux de contenu décompressés. La page ne doit plus être relue ensuite.
+    """
+    page.flush_cache()
+    if hasattr(page.get_textmap, 'cache_clear'): page.get_textmap.cache_clear()
+    objets = getattr(page.pdf.doc, '_cached_objs', {})
+    for flux in page.page_obj.contents:
+        if getattr(flux, 'objid', None) is not None: objets.pop(flux.objid, None)
+    page.page_obj.contents = []
+
+def _extraire_plage(pdf_path: str, pages: List[int]) -> Tuple[Dict[int, Dict], Dict[int, float]]:
+    """Extrait le texte et les tables d'une plage de pages (exécuté dans un processus du pool), avec la durée de chaque page"""
+    resultats, durees = {}, {}
+    with pdfplumber.open(pdf_path) as pdf:
+        for page_num in pages:
+            debut = time.perf_counter()
+            resultats[page_num] = {'texte': pdf.pages[page_num - 1].extract_text(), 'tables': extraire_tables(pdf.pages[page_num - 1])}
+            durees[page_num] = time.perf_counter() - debut
+            # Page lue une seule fois : sa mise en page ne doit pas s'accumuler dans le processus
+            liberer_page(pdf.pages[page_num - 1])
+    return resultats, durees
+
+class DocumentEHF:
+    """
+    Ouvre un PDF une seule fois et mémorise le texte et les tables de chaque page,
+    pour que toutes les étapes d'extraction lisent la même analyse de page.
+    Les pages déjà extraites d'un PDF identique sont relues depuis le cache disque.
+    Avec liberer_pages (mode flux), les objets de mise en page que pdfplumber garde sur chaque page
+    sont libérés dès que son texte et ses tables sont extraits, le cache est lu page par page
+    et les pages d'une formalité produite sont oubliées (voir `oublier`).
+    """
+    def __init__(self, pdf_path: str, cache: bool = True, progression: Optional[Callable[[int, int], None]] = None, liberer_pages: bool = False):
+        self.pdf_path = pdf_path
+        self.progression = progression  # appelée avec (pages traitées, pages totales)
+        self.liberer_pages = liberer_pages
+        self._pdf = None
+        self._nb_pages = None
+        self.pages = {}  # numéro de page (base 1) -> {'texte': ..., 'tables': ...}
+        self.cache = cache and os.environ.get('EHF_CACHE', '1') != '0'
+        self._modifiees = set()  # pages à écrire dans le cache
+        self._liberees = set()  # pages dont les flux de contenu ont été libérés (mode flux)
+        self._oubliees = {}  # mode flux : page oubliée -> nombre de ses tables (compteurs)
+        self._cache_pages = None  # mode flux : entrée du cache lue page par page
+        self._pool, self._prechargement, self._fin_fenetre = None, None, 0  # mode flux : préchargement par fenêtres
+        try: self.empreinte = cache_extraction.empreinte_pdf(pdf_path)
+        except OSError: self.empreinte = None
+        if self.cache and self.empreinte:
+            try:
+                if liberer_pages: self._cache_pages = cache_extraction.CachePages(self.empreinte, VERSION_EXTRACTEUR); self._nb_pages = self._cache_pages.nb_pages
+                elif entree := cache_extraction.charger(self.empreinte, VERSION_EXTRACTEUR): self._nb_pages, self.pages = entree['nb_pages'], entree['pages']
+            except (OSError, sqlite3.Error): pass
+        self.nb_pages_en_cache = sum(1 for page in self.pages.values() if 'texte' in page)
+        # Pages traitées : texte lu, écartées par le pré-scan ou reprises d'une autre tranche
+        self._traitees = {n for n, page in self.pages.items() if 'texte' in page or page.get('entete') is False}
+
+    @property
+    def pdf(self):
+        # Ouverture paresseuse : une erreur d'ouverture remonte dans l'étape qui lit la page
+        if self._pdf is None: self._pdf = pdfplumber.open(self.pdf_path)
+        return self._pdf
+
+    @property
+    def nb_pages(self) -> int:
+        if self._nb_pages is None: self._nb_pages = len(self.pdf.pages)
+        return self._nb_pages
+
+    def _page(self, page_num: int) -> Dict:
+        """Page mémorisée ; en mode flux, son pré-scan est lu dans le cache à la première demande"""
+        if (page := self.pages.get(page_num)) is None:
+            page = self.pages[page_num] = self._cache_pages.prescan(page_num) if self._cache_pages else {}
+            if page.get('entete') is False: self.marquer_traitees([page_num])
+        return page
+
+    def _completer(self, page_num: int) -> Dict:
+        """Page avec, en mode flux, son texte et ses tables relus du cache (une seule fois) s'ils y sont"""
+        page = self._page(page_num)
+        if self._cache_pages and page_num in self._cache_pages.contenus and page_num not in self._oubliees:
+            self._cache_pages.contenus.discard(page_num)
+            try: contenu = self._cache_pages.contenu(page_num)
+            except (sqlite3.Error, ValueError, zlib.error): contenu = {}
+            page.update(contenu)
+            if 'texte' in contenu: self.nb_pages_en_cache += 1; self.marquer_traitees([page_num])
+        return page
+
+    def texte(self, page_num: int) -> str:
+        page = self._completer(page_num)
+        if 'texte' not in page: self._lire(page_num); self._extraire_texte(page_num, page); self._liberer(page_num, page)
+        return page['texte']
+
+    def entete(self, page_num: int) -> Optional[bool]:
+        """
+        Pré-scan : la page porte-t-elle un en-tête de formalité ? None si le pré-scan ne peut pas conclure
+        ou si le texte complet est déjà connu (c'est alors lui qui fait foi)
+        """
+        page = self._page(page_num)
+        if 'texte' in page: return None
+        if 'entete' not in page: self._prescanner(page_num, page)
+        return page.get('entete')
+
+    def signature(self, page_num: int) -> Optional[Dict]:
+        """
+        Éléments d'empreinte d'une page de formalité tirés de son texte brut (tranches_ehf.signature_page),
+        None pour les autres pages ou si le texte brut est illisible
+        """
+        if not 1 <= page_num <= self.nb_pages: return None
+        page = self._page(page_num)
+        # Pré-scan absent ou d'une version antérieure (cache d'extraction) : le refaire
+        if page.get('version_signature') != tranches_ehf.VERSION_SIGNATURE: self._prescanner(page_num, page)
+        return page.get('signature')
+
+    def _prescanner(self, page_num: int, page: Dict):
+        """Décode le texte brut de la page une fois pour le pré-scan et la signature"""
+        # Flux de contenu d'une page libérée vidés : ne rien conclure plutôt que garder (et mettre en cache) un pré-scan vide
+        if page_num in self._liberees: return
+        debut = time.perf_counter()
+        try: texte = texte_brut_page(self.pdf, page_num)
+        except Exception: texte = None
+        # Sans aucun texte décodé (polices sans ToUnicode...), le pré-scan ne conclut pas
+        page['entete'] = bool(ENTETE_FORMALITE.search(re.sub(r'\s+', '', texte))) if texte and texte.strip() else None
+        page['signature'] = tranches_ehf.signature_page(texte) if page['entete'] else None
+        page['version_signature'] = tranches_ehf.VERSION_SIGNATURE
+        self._modifiees.add(page_num)
+        instrumentation_ehf.mesurer_page(page_num, 'entete', debut)
+        if page['entete'] is False: self.marquer_traitees([page_num])
+
+    def tables(self, page_num: int) -> List:
+        page = self._completer(page_num)
+        if 'tables' not in page: self._lire(page_num); self._extraire_tables(page_num, page); self._liberer(page_num, page)
+        return page['tables']
+
+    def _lire(self, page_num: int):
+        """Mode flux avec --workers : précharge la fenêtre de pages qui commence à cette page si elle n'est pas déjà couverte"""
+        if self._prechargement and page_num >= self._fin_fenetre: self._precharger_fenetre(page_num)
+
+    def _extraire_texte(self, page_num: int, page: Dict):
+        if 'texte' in page: return  # Préchargée par le pool
+        debut = time.perf_counter()
+        page['texte'] = self.pdf.pages[page_num - 1].extract_text(); self._modifiees.add(page_num)
+        instrumentation_ehf.mesurer_page(page_num, 'texte', debut)
+        self.marquer_traitees([page_num])
+
+    def _extraire_tables(self, page_num: int, page: Dict):
+        if 'tables' in page: return  # Préchargée par le pool
+        debut = time.perf_counter()
+        page['tables'] = extraire_tables(self.pdf.pages[page_num - 1]); self._modifiees.add(page_num)
+        instrumentation_ehf.mesurer_page(page_num, 'tables', debut, nb_tables=len(page['tables']))
+
+    def _liberer(self, page_num: int, page: Dict):
+        """Mode flux : extrait aussi l'autre moitié de la page tant que sa mise en page est chargée, puis la libère"""
+        if not self.liberer_pages: return
+        if 'texte' not in page: self._extraire_texte(page_num, page)
+        if 'tables' not in page: self._extraire_tables(page_num, page)
+        # Signature pour les tranches suivantes tant que les flux de contenu sont chargés
+        if page.get('version_signature') != tranches_ehf.VERSION_SIGNATURE: self._prescanner(page_num, page)
+        if self._pdf is not None:
+            liberer_page(self.pdf.pages[page_num - 1])
+            self._liberees.add(page_num)
+
+    def oublier(self, pages: Iterable[int]):
+        """
+        Mode flux : une fois une formalité produite (ou une page écartée), ne garde de ses pages que le pré-scan
+        et la signature ; leur texte et leurs tables passent dans le cache. Ces pages ne doivent plus être relues.
+        """
+        if not self.liberer_pages: return
+        pages = [n for n in pages if 'texte' in self.pages.get(n, {})]
+        self._ecrire_cache([n for n in pages if n in self._modifiees])
+        for page_num in pages:
+            page = self.pages[page_num]
+            self._oubliees[page_num] = len(page.get('tables', []))
+            for cle in ('texte', 'tables'): page.pop(cle, None)
+
+    def precharger(self, workers: int, exclues: Set[int] = frozenset()):
+        """
+        Extrait texte et tables de toutes les pages en répartissant des plages de pages
+        sur un pool de processus, chacun ouvrant le PDF de son côté (sauf les pages `exclues`, reprises d'une autre tranche).
+        En mode flux, seulement par fenêtres de FENETRE_FLUX pages par processus, au fil de la lecture.
+        """
+        if self.liberer_pages: self._prechargement = (workers, exclues); return
+        try:
+            a_extraire = [n for n in range(1, self.nb_pages + 1) if self._a_precharger(n, exclues)]
+            if not a_extraire: return
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # Plusieurs plages par processus pour équilibrer les pages lentes
+                self._extraire_dans_pool(pool, a_extraire, workers * 4)
+        except Exception: pass  # Les étapes retombent sur l'extraction page par page
+
+    def _precharger_fenetre(self, page_num: int):
+        workers, exclues = self._prechargement
+        self._fin_fenetre = min(page_num + workers * FENETRE_FLUX, self.nb_pages + 1)
+        try:
+            if a_extraire := [n for n in range(page_num, self._fin_fenetre) if self._a_precharger(n, exclues)]:
+                # Pool gardé pour toutes les fenêtres du document, une plage par processus
+                if self._pool is None: self._pool = ProcessPoolExecutor(max_workers=workers)
+                self._extraire_dans_pool(self._pool, a_extraire, workers)
+        except Exception: pass  # Les pages de la fenêtre sont extraites une à une
+
+    def _a_precharger(self, page_num: int, exclues: Set[int]) -> bool:
+        # Seules les pages absentes du cache et susceptibles d'être lues (têtes de document, pages de formalités) sont à extraire
+        return (not {'texte', 'tables'} <= self._completer(page_num).keys() and page_num not in exclues and page_num not in self._oubliees
+                and (page_num <= NB_PAGES_FLUX or self.entete(page_num) is not False))
+
+    def _extraire_dans_pool(self, pool: ProcessPoolExecutor, a_extraire: List[int], nb_plages: int):
+        taille = max(1, -(-len(a_extraire) // nb_plages))
+        plages = [a_extraire[i:i + taille] for i in range(0, len(a_extraire), taille)]
+        for resultats, durees in pool.map(_extraire_plage, repeat(self.pdf_path), plages):
+            # Garder le pré-scan et la signature déjà calculés pour ces pages
+            for page_num, resultat in resultats.items(): self._page(page_num).update(resultat)
+            self._modifiees.update(resultats)
+            self.marquer_traitees(resultats)
+            if rapport := instrumentation_ehf.rapport_courant():
+                for page_num, duree in durees.items(): rapport.page(page_num, 'extraction_pool', duree, nb_tables=len(resultats[page_num]['tables']))
+
+    def compteurs(self) -> Dict:
+        """Compteurs de pages et de tables du document pour le rapport d'instrumentation"""
+        pages_lues = sum(1 for page in self.pages.values() if 'texte' in page) + len(self._oubliees)
+        return {
+            'nb_pages': self._nb_pages,
+            'pages_lues': pages_lues,
+            'pages_extraites': pages_lues - self.nb_pages_en_cache,
+            'pages_depuis_cache': self.nb_pages_en_cache,
+            'pages_ecartees_prescan': sum(1 for n, page in self.pages.items() if page.get('entete') is False and 'texte' not in page and n not in self._oubliees),
+            'nb_tables': sum(len(page['tables']) for page in self.pages.values() if 'tables' in page) + sum(self._oubliees.values())
+        }
+
+    def marquer_traitees(self, pages: Iterable[int]):
+        """Compte des pages comme traitées et publie la progression si leur nombre a changé"""
+        nb_traitees = len(self._traitees)
+        self._traitees.update(pages)
+        if len(self._traitees) != nb_traitees: self._signaler_progression()
+
+    def _signaler_progression(self):
+        if self.progression: self.progression(len(self._traitees), self.nb_pages)
+
+    def _ecrire_cache(self, pages: List[int]):
+        if not pages or not self.cache or not self.empreinte: return
+        try:
+            if self._cache_pages: self._cache_pages.ecrire(self._nb_pages, {n: self.pages[n] for n in pages})
+            else: cache_extraction.enregistrer(self.empreinte, VERSION_EXTRACTEUR, self._nb_pages, {n: self.pages[n] for n in pages})
+        except (OSError, sqlite3.Error): pass
+        self._modifiees.difference_update(pages)
+
+    def close(self):
+        if self._pool is not None: self._pool.shutdown(); self._pool = None
+        if self._pdf is not None: self._pdf.close(); self._pdf = None
+        self._ecrire_cache(sorted(self._modifiees))
+        if self._cache_pages is not None: self._cache_pages.close(); self._cache_pages = None
+
+    def __enter__(self): return self
+
+    def __exit__(self, *exc): self.close()
+
+@contextmanager
+def ouvrir_document(source: Union[str, DocumentEHF]):
+    """Réutilise un DocumentEHF déjà ouvert, ou en ouvre un le temps d'une étape à partir d'un chemin"""
+    if isinstance(source, DocumentEHF): yield source
+    else:
+        with DocumentEHF(source) as document: yield document
+
+@instrumentation_ehf.etape
+def get_formalites_pages(pdf_path: Union[str, DocumentEHF]) -> List[int]:
     formalites_pages = []
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages):
-                if page_text := page.extract_text():
-                    if any(re.search(p, re.sub(r'\s+', ' ', page_text), re.IGNORECASE) for p in patterns):
-                        formalites_pages.append(page_num + 1)
+        with ouvrir_document(pdf_path) as document:
+            for page_num in range(1, document.nb_pages + 1):
+                if _page_de_formalite(document, page_num): formalites_pages.append(page_num)
     except: pass
     return formalites_pages
 
-def extraire_immeubles_flux(pdf_path: str, nb_pages_max: int = 5) -> List[Dict]:
+def _page_de_formalite(document: DocumentEHF, page_num: int) -> bool:
+    patterns = [r"Relevé\s+des\s+formalités\s*-\s*(Publication|Volumétrie|Copropriété|Lotissement|Charge|Formalités en attente|rejet définitif)"]
+    # Le pré-scan écarte sans mise en page les pages sans en-tête de formalité
+    if document.entete(page_num) is False: return False
+    page_text = document.texte(page_num)
+    return bool(page_text) and any(re.search(p, re.sub(r'\s+', ' ', page_text), re.IGNORECASE) for p in patterns)
+
+@instrumentation_ehf.etape
+def extraire_immeubles_flux(pdf_path: Union[str, DocumentEHF], nb_pages_max: int = NB_PAGES_FLUX) -> List[Dict]:
     immeubles_data = []
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page_num in range(min(nb_pages_max, len(pdf.pages))):
-                if (page_text := pdf.pages[page_num].extract_text()) and "Immeubles issus de la demande - formalités du flux" in page_text:
-                    for j, table in enumerate(pdf.pages[page_num].extract_tables() or []):
+        with ouvrir_document(pdf_path) as document:
+            for page_num in range(min(nb_pages_max, document.nb_pages)):
+                if (page_text := document.texte(page_num + 1)) and "Immeubles issus de la demande - formalités du flux" in page_text:
+                    for j, table in enumerate(document.tables(page_num + 1)):
                         immeubles_data.append({'page': page_num + 1, 'table_numero': j + 1, 'donnees': table, 'nb_lignes': len(table), 'nb_colonnes': len(table[0]) if table else 0, 'type': 'immeubles_flux'})
     except: pass
     return immeubles_data
 
 
-def get_formalites_completes(pdf_path: str, formalites_pages: List[int]) -> List[Dict]:
-    if not formalites_pages: return []
-    formalites, used_pages = [], set()
+@instrumentation_ehf.etape
+def get_formalites_completes(pdf_path: Union[str, DocumentEHF], formalites_pages: List[int]) -> List[Dict]:
+    return list(iter_formalites_completes(pdf_path, formalites_pages))
+
+def iter_formalites_completes(pdf_path: Union[str, DocumentEHF], formalites_pages: List[int]) -> Iterator[Dict]:
+    """Produit les formalités une à une, dans l'ordre des pages (une erreur de lecture arrête la production)"""
+    if not formalites_pages: return
+    used_pages = set()
     try:
-        with pdfplumber.open(pdf_path) as pdf:
+        with ouvrir_document(pdf_path) as document:
             for start_page in formalites_pages:
                 if start_page in used_pages: continue
-                if not (page_text := pdf.pages[start_page - 1].extract_text()): continue
-                
-                categorie = (re.search(r"Relevé\s+des\s+formalités\s*-\s*([^\n\r]+?)(?:\s+PAGE|\n|\r|$)", page_text, re.IGNORECASE) or type('', (), {'group': lambda x: "Non classée"})).group(1).strip()
-                end_page = start_page
-                for pattern in [r"PAGE\s+(\d+)\s+[ÀAà]\s+PAGE\s+(\d+)"]:
-                    if match := re.search(pattern, page_text, re.IGNORECASE):
-                        if int(match.group(1)) == start_page: end_page = int(match.group(2)); break
-                
-                texte_complet, tables_formalite = "", []
-                for page_num in range(start_page, end_page + 1):
-                    if page_num <= len(pdf.pages):
-                        page = pdf.pages[page_num - 1]
-                        if page_content := page.extract_text(): texte_complet += f"\n=== Page {page_num} ===\n{page_content}\n"
-                        for j, table in enumerate(page.extract_tables() or []): tables_formalite.append({'page': page_num, 'table_numero': j + 1, 'donnees': table, 'nb_lignes': len(table), 'nb_colonnes': len(table[0]) if table else 0})
-                
-                formalite = {'page_debut': start_page, 'page_fin': end_page, 'categorie': categorie, 'texte': texte_complet.strip(), 'tables': tables_formalite, 'nb_tables': len(tables_formalite)}
-                if categorie.lower() == 'publication': formalite['proprietaires'] = extraire_proprietaires_publication(formalite)
-                formalites.append(formalite)
-                used_pages.update(range(start_page, end_page + 1))
+                if formalite := _extraire_formalite(document, start_page):
+                    used_pages.update(range(start_page, formalite['page_fin'] + 1))
+                    yield formalite
     except: pass
-    return formalites
 
+def _extraire_formalite(document: DocumentEHF, start_page: int) -> Optional[Dict]:
+    """Formalité commençant à start_page, jusqu'à la page de fin annoncée dans son titre"""
+    if not (page_text := document.texte(start_page)): return None
+    
+    categorie = (re.search(r"Relevé\s+des\s+formalités\s*-\s*([^\n\r]+?)(?:\s+PAGE|\n|\r|$)", page_text, re.IGNORECASE) or type('', (), {'group': lambda x: "Non classée"})).group(1).strip()
+    end_page = start_page
+    for pattern in [r"PAGE\s+(\d+)\s+[ÀAà]\s+PAGE\s+(\d+)"]:
+        if match := re.search(pattern, page_text, re.IGNORECASE):
+            if int(match.group(1)) == start_page: end_page = int(match.group(2)); break
+    
+    texte_complet, tables_formalite = "", []
+    for page_num in range(start_page, end_page + 1):
+        if page_num <= document.nb_pages:
+            if page_content := document.texte(page_num): texte_complet += f"\n=== Page {page_num} ===\n{page_content}\n"
+            for j, table in enumerate(document.tables(page_num)): tables_formalite.append({'page': page_num, 'table_numero': j + 1, 'donnees': table, 'nb_lignes': len(table), 'nb_colonnes': len(table[0]) if table else 0})
+    
+    formalite = {'page_debut': start_page, 'page_fin': end_page, 'categorie': categorie, 'texte': texte_complet.strip(), 'tables': tables_formalite, 'nb_tables': len(tables_formalite)}
+    if categorie.lower() == 'publication': formalite['proprietaires'] = extraire_proprietaires_publication(formalite)
+    return formalite
+
+@instrumentation_ehf.etape
+def get_formalites_tranche(document: DocumentEHF, tranche: tranches_ehf.IngestionTranche) -> List[Dict]:
+    return list(iter_formalites_tranche(document, tranche))
+
+def iter_formalites_tranche(document: DocumentEHF, tranche: tranches_ehf.IngestionTranche) -> Iterator[Dict]:
+    """
+    Formalités du document en un seul parcours des pages : celles planifiées par `tranche` sont reprises
+    du stockage de la tranche précédente sans lire leurs pages, les autres extraites ; puis, si ce document
+    en a au moins une, les formalités de la tranche précédente qui n'y figurent plus (union des tranches).
+    Sans tranche précédente, même résultat que get_formalites_pages puis iter_formalites_completes.
+    """
+    used_pages = set()
+    try:
+        for page_num in range(1, document.nb_pages + 1):
+            if page_num in used_pages: continue
+            if not (formalite := tranche.reprendre(page_num)):
+                if not _page_de_formalite(document, page_num) or not (formalite := _extraire_formalite(document, page_num)):
+                    document.oublier([page_num]); continue
+                tranche.extraite(formalite)
+            used_pages.update(range(page_num, formalite['page_fin'] + 1))
+            yield formalite
+            # Mode flux : les pages d'une formalité produite ne sont plus relues
+            document.oublier(range(page_num, formalite['page_fin'] + 1))
+    except Exception: pass  # Une erreur de lecture arrête l'extraction de ce document
+    if tranche.empreintes: yield from tranche.anterieures()
+
+# Motifs des tables de publication, appliqués aux cellules déjà passées en minuscules
+_DATE_ACTE = re.compile(r'date de l\'acte\s*:\s*(\d{2}/\d{2}/\d{4})')
+_DATE_DEPOT = re.compile(r'date de dépôt\s*:\s*(\d{2}/\d{2}/\d{4})')
+_NUMERO_BENEFICIAIRE = re.compile(r'bénéficiaire\s*:\s*(\d+)')
+_PRIX = re.compile(r'prix[^:]*:\s*([\d\s,\.]+)\s*eur')
+# Motifs appliqués aux valeurs d'origine
+_REFERENCE_CADASTRALE = re.compile(r'^[A-Z]{2,3}\s+\d+$')
+_DATE_NAISSANCE = re.compile(r'\d{2}/\d{2}/\d{4}')
+_NUMERO_IDENTITE = re.compile(r'^\d{3}\s*\d{3}\s*\d{3}$|^\d{9,}$')
+_FAUX_DISPOSANTS = ('disposant', 'donateur', 'numéro', 'bénéficiaire')
+_FAUX_BENEFICIAIRES = ('bénéficiaire', 'donataire', 'date', 'disposant', 'paris', 'transfert', 'page', 'numéro')
+
+def _classer_table(donnees: List[List], dates: List[Dict], dates_acte: set) -> Dict:
+    """
+    Parcourt une fois les cellules d'une table (chacune mise en minuscules une seule fois) :
+    relève les dates d'acte et de dépôt et détermine le rôle de la table (disposants, bénéficiaires,
+    immeubles) ainsi que les colonnes Volume et Lot
+    """
+    classe = {'disposants': False, 'beneficiaires': False, 'immeubles': False, 'volume_col': None, 'lot_col': None}
+    colonnes_trouvees = False
+    for row in donnees:
+        for j, cell in enumerate(row):
+            if not cell: continue
+            cell_str = str(cell).lower()
+            if 'date de l\'acte' in cell_str and (match := _DATE_ACTE.search(cell_str)) and match.group(1) not in dates_acte:
+                dates_acte.add(match.group(1))
+                dates.append({'date_acte': match.group(1)})
+            if 'date de dépôt' in cell_str and (match := _DATE_DEPOT.search(cell_str)):
+                for date_entry in dates:
+                    if 'date_depot' not in date_entry:
+                        date_entry['date_depot'] = match.group(1)
+                        break
+                else:
+                    dates.append({'date_depot': match.group(1)})
+            if 'disposant' in cell_str or 'donateur' in cell_str: classe['disposants'] = True
+            if 'bénéficiaire, donataire' in cell_str: classe['beneficiaires'] = True
+            if 'immeuble' in cell_str: classe['immeubles'] = True
+            # Colonnes Volume et Lot : première ligne à partir de laquelle les deux sont connues
+            if not colonnes_trouvees:
+                if (cell_strip := cell_str.strip()) == 'volume': classe['volume_col'] = j
+                elif cell_strip == 'lot': classe['lot_col'] = j
+        if classe['volume_col'] is not None and classe['lot_col'] is not None: colonnes_trouvees = True
+    return classe
+
+@instrumentation_ehf.etape
 def extraire_proprietaires_publication(formalite: Dict) -> Dict:
     if formalite['categorie'].lower() != 'publication': return {}
     
     result = {'disposants': [], 'beneficiaires': [], 'immeubles': [], 'dates': [], 'prix': None}
+    dates_acte, noms_disposants, noms_beneficiaires = set(), set(), set()
     
     for table in formalite['tables']:
         donnees = table['donnees']
         if not donnees: continue
         
-        # Extraire toutes les dates (peut y en avoir plusieurs)
-        for row in donnees:
-            for cell in row:
-                if cell:
-                    cell_str = str(cell).lower()
-                    if 'date de l\'acte' in cell_str:
-                        if match := re.search(r'date de l\'acte\s*:\s*(\d{2}/\d{2}/\d{4})', cell_str):
-                            if match.group(1) not in [d.get('date_acte') for d in result['dates']]:
-                                result['dates'].append({'date_acte': match.group(1)})
-                    if 'date de dépôt' in cell_str:
-                        if match := re.search(r'date de dépôt\s*:\s*(\d{2}/\d{2}/\d{4})', cell_str):
-                            for date_entry in result['dates']:
-                                if 'date_depot' not in date_entry:
-                                    date_entry['date_depot'] = match.group(1)
-                                    break
-                            else:
-                                result['dates'].append({'date_depot': match.group(1)})
+        # Un seul passage sur les cellules : dates (peut y en avoir plusieurs) et rôle de la table
+        classe = _classer_table(donnees, result['dates'], dates_acte)
+        volume_col, lot_col = classe['volume_col'], classe['lot_col']
         
-        # Extraire Disposants (peut y en avoir plusieurs)
-        if any('disposant' in str(cell).lower() or 'donateur' in str(cell).lower() for row in donnees for cell in row if cell):
-            for row in donnees[1:]:
-                if len(row) >= 2 and row[1] and str(row[1]).strip():
-                    nom = str(row[1]).strip()
-                    if not any(x in nom.lower() for x in ['disposant', 'donateur', 'numéro', 'bénéficiaire']):
-                        numero_id = str(row[2]).strip() if len(row) > 2 and row[2] and str(row[2]).strip() != '-' else None
-                        if not any(d['nom'] == nom for d in result['disposants']):
-                            result['disposants'].append({'nom': nom, 'numero_id': numero_id})
-        
-        # Extraire Bénéficiaires (seulement dans les tables avec en-tête exact "Bénéficiaire, Donataire")
-        # Vérifier que c'est bien une table de bénéficiaires et pas une table d'immeubles
-        is_beneficiaire_table = False
-        for row in donnees:
-            if any(cell and 'bénéficiaire, donataire' in str(cell).lower() for cell in row):
-                is_beneficiaire_table = True
-                break
-        
-        if is_beneficiaire_table:
-            for row in donnees[1:]:
-                if len(row) >= 2 and row[1] and str(row[1]).strip():
-                    nom = str(row[1]).strip()
-                    # Filtrer les faux positifs
-                    if (not any(x in nom.lower() for x in ['bénéficiaire', 'donataire', 'date', 'disposant', 'paris', 'transfert', 'page', 'numéro']) 
-                        and len(nom) > 2 and not re.match(r'^[A-Z]{2,3}\s+\d+$', nom)):  # Éviter "BD 10", etc.
-                        date_naissance = str(row[2]).strip() if len(row) > 2 and row[2] and str(row[2]).strip() != '-' else None
-                        # Vérifier que la date de naissance est valide
-                        if date_naissance and not re.match(r'\d{2}/\d{2}/\d{4}', date_naissance):
-                            date_naissance = None
-                        
-                        # Extraire le numéro d'identité (colonne 3 ou suivante)
-                        numero_identite = None
-                        for col_idx in range(3, len(row)):
-                            if row[col_idx] and str(row[col_idx]).strip() and str(row[col_idx]).strip() != '-':
-                                cell_value = str(row[col_idx]).strip()
-                                # Vérifier si c'est un numéro d'identité (format numérique)
-                                if re.match(r'^\d{3}\s*\d{3}\s*\d{3}$|^\d{9,}$', cell_value.replace(' ', '')):
-                                    numero_identite = cell_value
-                                    break
-                        
-                        if not any(b['nom'] == nom for b in result['beneficiaires']):
-                            result['beneficiaires'].append({'nom': nom, 'date_naissance': date_naissance, 'numero_identite': numero_identite})
-        
-        # Extraire Immeubles (gérer les tableaux fragmentés entre pages)
-        if any('immeuble' in str(cell).lower() for row in donnees for cell in row if cell):
-            # Trouver les positions des colonnes Volume et Lot dans l'en-tête
-            volume_col, lot_col = None, None
-            for i, row in enumerate(donnees):
-                for j, cell in enumerate(row):
-                    if cell and str(cell).strip().lower() == 'volume':
-                        volume_col = j
-                    elif cell and str(cell).strip().lower() == 'lot':
-                        lot_col = j
-                if volume_col is not None and lot_col is not None:
-                    break
+        for row_idx, row in enumerate(donnees):
+            nom = str(row[1]).strip() if row_idx and len(row) >= 2 and row[1] else ''
             
-            for row in donnees:
-                if len(row) >= 1 and row[0]:
-                    cell0 = str(row[0]).strip()
+            # Disposants (peut y en avoir plusieurs)
+            if classe['disposants'] and nom:
+                nom_lower = nom.lower()
+                if not any(x in nom_lower for x in _FAUX_DISPOSANTS) and nom not in noms_disposants:
+                    numero_id = str(row[2]).strip() if len(row) > 2 and row[2] and str(row[2]).strip() != '-' else None
+                    noms_disposants.add(nom)
+                    result['disposants'].append({'nom': nom, 'numero_id': numero_id})
+            
+            # Bénéficiaires (seulement dans les tables avec en-tête exact "Bénéficiaire, Donataire",
+            # pour ne pas les confondre avec une table d'immeubles)
+            if classe['beneficiaires'] and nom:
+                nom_lower = nom.lower()
+                # Filtrer les faux positifs, dont les références type "BD 10"
+                if not any(x in nom_lower for x in _FAUX_BENEFICIAIRES) and len(nom) > 2 and not _REFERENCE_CADASTRALE.match(nom) and nom not in noms_beneficiaires:
+                    date_naissance = str(row[2]).strip() if len(row) > 2 and row[2] and str(row[2]).strip() != '-' else None
+                    # Vérifier que la date de naissance est valide
+                    if date_naissance and not _DATE_NAISSANCE.match(date_naissance):
+                        date_naissance = None
+                    
+                    # Extraire le numéro d'identité (colonne 3 ou suivante, format numérique)
+                    numero_identite = None
+                    for col_idx in range(3, len(row)):
+                        if row[col_idx] and (cell_value := str(row[col_idx]).strip()) and cell_value != '-':
+                            if _NUMERO_IDENTITE.match(cell_value.replace(' ', '')):
+                                numero_identite = cell_value
+                                break
+                    
+                    noms_beneficiaires.add(nom)
+                    result['beneficiaires'].append({'nom': nom, 'date_naissance': date_naissance, 'numero_identite': numero_identite})
+            
+            # Immeubles (gérer les tableaux fragmentés entre pages)
+            if classe['immeubles'] and len(row) >= 1 and row[0]:
+                cell0 = str(row[0]).strip()
+                cell0_lower = cell0.lower()
+                
+                # Ligne avec bénéficiaire et immeubles
+                if 'bénéficiaire' in cell0_lower and (':' in cell0):
+                    # Extraire le type de droit (toute propriété, usufruit, etc.)
+                    type_droit = cell0.split('-', 1)[1].strip() if '-' in cell0 else "Non spécifié"
+                    beneficiaire_num = _NUMERO_BENEFICIAIRE.search(cell0_lower)
+                    beneficiaire_ref = beneficiaire_num.group(1) if beneficiaire_num else "1"
                     
-                    # Ligne avec bénéficiaire et immeubles
-                    if 'bénéficiaire' in cell0.lower() and (':' in cell0):
-                        # Extraire le type de droit (toute propriété, usufruit, etc.)
-                        type_droit = cell0.split('-', 1)[1].strip() if '-' in cell0 else "Non spécifié"
-                        beneficiaire_num = re.search(r'bénéficiaire\s*:\s*(\d+)', cell0.lower())
-                        beneficiaire_ref = beneficiaire_num.group(1) if beneficiaire_num else "1"
-                        
-                        # Extraire volume et lots selon les colonnes identifiées
-                        volume = str(row[volume_col]).strip() if volume_col and len(row) > volume_col and row[volume_col] else None
-                        lots = str(row[lot_col]).strip() if lot_col and len(row) > lot_col and row[lot_col] else None
-                        
-                        # Concaténer toutes les colonnes non-nulles entre la colonne 1 et la colonne Volume pour former l'adresse
-                        adresse_parts = []
-                        start_col = 1  # Commencer après la colonne bénéficiaire
-                        end_col = volume_col if volume_col else len(row)
-                        
-                        for i in range(start_col, end_col):
-                            if i < len(row) and row[i] and str(row[i]).strip():
-                                adresse_parts.append(str(row[i]).strip())
-                        
-                        # Approche universelle : premier élément = commune, reste = adresse
-                        commune, adresse = None, None
-                        if adresse_parts:
-                            if len(adresse_parts) >= 2:
-                                commune = adresse_parts[0]
-                                adresse = ' '.join(adresse_parts[1:])
-                            elif len(adresse_parts) == 1:
-                                commune = adresse_parts[0]
-                                adresse = None
-                        
-                        immeuble = {
-                            'beneficiaire_ref': beneficiaire_ref,
-                            'type_droit': type_droit,
-                            'commune': commune,
-                            'adresse': adresse,
-                            'volume': volume,
-                            'lots': lots,
-                            'page': table.get('page')
-                        }
-                        result['immeubles'].append(immeuble)
+                    # Extraire volume et lots selon les colonnes identifiées
+                    volume = str(row[volume_col]).strip() if volume_col and len(row) > volume_col and row[volume_col] else None
+                    lots = str(row[lot_col]).strip() if lot_col and len(row) > lot_col and row[lot_col] else None
                     
-                    # Ligne avec prix
-                    elif 'prix' in cell0.lower() and 'eur' in cell0.lower():
-                        if match := re.search(r'prix[^:]*:\s*([\d\s,\.]+)\s*eur', cell0.lower()):
-                            result['prix'] = match.group(1).strip()
+                    # Concaténer toutes les colonnes non-nulles entre la colonne 1 et la colonne Volume pour former l'adresse
+                    end_col = volume_col if volume_col else len(row)
+                    adresse_parts = [str(row[i]).strip() for i in range(1, min(end_col, len(row))) if row[i] and str(row[i]).strip()]
+                    
+                    # Approche universelle : premier élément = commune, reste = adresse
+                    commune = adresse_parts[0] if adresse_parts else None
+                    adresse = ' '.join(adresse_parts[1:]) if len(adresse_parts) >= 2 else None
+                    
+                    result['immeubles'].append({
+                        'beneficiaire_ref': beneficiaire_ref,
+                        'type_droit': type_droit,
+                        'commune': commune,
+                        'adresse': adresse,
+                        'volume': volume,
+                        'lots': lots,
+                        'page': table.get('page')
+                    })
+                
+                # Ligne avec prix
+                elif 'prix' in cell0_lower and 'eur' in cell0_lower:
+                    if match := _PRIX.search(cell0_lower):
+                        result['prix'] = match.group(1).strip()
     
     return result
 
-def determiner_proprietaires_actuels(formalites: List[Dict]) -> Dict:
+def construire_index_proprietes(formalites: List[Dict]) -> IndexProprietes:
     """
-    Détermine le propriétaire actuel de chaque lot/volume basé sur la date d'acte la plus récente
+    Construit l'index des propriétaires actuels (plages de lots en intervalles) à partir des publications
+    """
+    index = IndexProprietes()
+    for formalite in formalites: indexer_publication(index, formalite)
+    return index
+
+def indexer_publication(index: IndexProprietes, formalite: Dict):
+    """
+    Ajoute à l'index les immeubles d'une formalité de type Publication (ignore les autres formalités)
     """
     from datetime import datetime
     
-    # Dictionnaire pour stocker les propriétaires par immeuble
-    proprietaires_actuels = {}
+    if formalite.get('categorie', '').lower() != 'publication' or 'proprietaires' not in formalite:
+        return
+        
+    proprietaires = formalite['proprietaires']
     
-    # Parcourir toutes les formalités de type Publication
-    for formalite in formalites:
-        if formalite.get('categorie', '').lower() != 'publication' or 'proprietaires' not in formalite:
-            continue
-            
-        proprietaires = formalite['proprietaires']
+    # Vérifier qu'il y a bien des changements de propriété (disposant requis)
+    if not proprietaires.get('disposants'):
+        return
         
-        # Vérifier qu'il y a bien des changements de propriété (disposant requis)
-        if not proprietaires.get('disposants'):
-            continue
-            
-        # Si pas de bénéficiaires extraits automatiquement, essayer de les extraire manuellement
-        beneficiaires = proprietaires.get('beneficiaires', [])
-        if not beneficiaires:
-            # Chercher dans les tables pour extraire les bénéficiaires manuellement
-            for table in formalite.get('tables', []):
-                donnees = table.get('donnees', [])
-                # Chercher une table avec "Bénéficiaires, Donataires"
-                for i, row in enumerate(donnees):
-                    if any(cell and 'bénéficiaires, donataires' in str(cell).lower() for cell in row):
-                        # Extraire les bénéficiaires des lignes suivantes
-                        for j in range(i + 1, len(donnees)):
-                            beneficiaire_row = donnees[j]
-                            if len(beneficiaire_row) >= 2 and beneficiaire_row[1]:
-                                nom = str(beneficiaire_row[1]).strip()
-                                if nom and not any(x in nom.lower() for x in ['bénéficiaire', 'donataire']):
-                                    date_naissance = str(beneficiaire_row[2]).strip() if len(beneficiaire_row) > 2 and beneficiaire_row[2] else None
-                                    
-                                    # Extraire le numéro d'identité
-                                    numero_identite = None
-                                    for col_idx in range(3, len(beneficiaire_row)):
-                                        if beneficiaire_row[col_idx] and str(beneficiaire_row[col_idx]).strip() != '-':
-                                            cell_value = str(beneficiaire_row[col_idx]).strip()
-                                            if re.match(r'^\d{3}\s*\d{3}\s*\d{3}$|^\d{9,}$', cell_value.replace(' ', '')):
-                                                numero_identite = cell_value
-                                                break
-                                    
-                                    beneficiaires.append({'nom': nom, 'date_naissance': date_naissance, 'numero_identite': numero_identite})
-                        break
+    # Si pas de bénéficiaires extraits automatiquement, essayer de les extraire manuellement
+    beneficiaires = proprietaires.get('beneficiaires', [])
+    if not beneficiaires:
+        # Chercher dans les tables pour extraire les bénéficiaires manuellement
+        for table in formalite.get('tables', []):
+            donnees = table.get('donnees', [])
+            # Chercher une table avec "Bénéficiaires, Donataires"
+            for i, row in enumerate(donnees):
+                if any(cell and 'bénéficiaires, donataires' in str(cell).lower() for cell in row):
+                    # Extraire les bénéficiaires des lignes suivantes
+                    for j in range(i + 1, len(donnees)):
+                        beneficiaire_row = donnees[j]
+                        if len(beneficiaire_row) >= 2 and beneficiaire_row[1]:
+                            nom = str(beneficiaire_row[1]).strip()
+                            if nom and not any(x in nom.lower() for x in ['bénéficiaire', 'donataire']):
+                                date_naissance = str(beneficiaire_row[2]).strip() if len(beneficiaire_row) > 2 and beneficiaire_row[2] else None
+                                
+                                # Extraire le numéro d'identité
+                                numero_identite = None
+                                for col_idx in range(3, len(beneficiaire_row)):
+                                    if beneficiaire_row[col_idx] and str(beneficiaire_row[col_idx]).strip() != '-':
+                                        cell_value = str(beneficiaire_row[col_idx]).strip()
+                                        if re.match(r'^\d{3}\s*\d{3}\s*\d{3}$|^\d{9,}$', cell_value.replace(' ', '')):
+                                            numero_identite = cell_value
+                                            break
+                                
+                                beneficiaires.append({'nom': nom, 'date_naissance': date_naissance, 'numero_identite': numero_identite})
+                    break
+    
+    # Si toujours pas de bénéficiaires, continuer (peut-être une radiation ou autre)
+    if not beneficiaires:
+        return
         
-        # Si toujours pas de bénéficiaires, continuer (peut-être une radiation ou autre)
-        if not beneficiaires:
-            continue
-            
-        # Récupérer la date d'acte la plus récente de cette formalité
-        dates = proprietaires.get('dates', [])
-        if not dates:
-            continue
-            
-        date_acte_str = None
-        for date_entry in dates:
-            if 'date_acte' in date_entry:
-                date_acte_str = date_entry['date_acte']
-                break
-                
-        if not date_acte_str:
-            continue
+    # Récupérer la date d'acte la plus récente de cette formalité
+    dates = proprietaires.get('dates', [])
+    if not dates:
+        return
+        
+    date_acte_str = None
+    for date_entry in dates:
+        if 'date_acte' in date_entry:
+            date_acte_str = date_entry['date_acte']
+            break
             
+    if not date_acte_str:
+        return
+        
+    try:
+        date_acte = datetime.strptime(date_acte_str, '%d/%m/%Y')
+    except:
+        return
+        
+    # Traiter chaque immeuble de cette formalité
+    for immeuble in proprietaires.get('immeubles', []):
+        commune = immeuble.get('commune', '')
+        adresse = immeuble.get('adresse', '')
+        lots = immeuble.get('lots', '')
+        volume = immeuble.get('volume', '')
+        type_droit = immeuble.get('type_droit', '')
+        beneficiaire_ref = immeuble.get('beneficiaire_ref', '1')
+        
+        # Trouver le nom, la date de naissance et le numéro d'identité du bénéficiaire
+        beneficiaire_nom = None
+        beneficiaire_date_naissance = None
+        beneficiaire_numero_identite = None
         try:
-            date_acte = datetime.strptime(date_acte_str, '%d/%m/%Y')
+            beneficiaire_num = int(beneficiaire_ref)
+            # Si on a des bénéficiaires, essayer de trouver le bon
+            if beneficiaires:
+                # Si le numéro correspond à un index valide (en base 1)
+                if beneficiaire_num <= len(beneficiaires):
+                    beneficiaire_data = beneficiaires[beneficiaire_num - 1]
+                    beneficiaire_nom = beneficiaire_data['nom']
+                    beneficiaire_date_naissance = beneficiaire_data.get('date_naissance')
+                    beneficiaire_numero_identite = beneficiaire_data.get('numero_identite')
+                else:
+                    # Si le numéro est trop grand, prendre le dernier
+                    beneficiaire_data = beneficiaires[-1]
+                    beneficiaire_nom = beneficiaire_data['nom']
+                    beneficiaire_date_naissance = beneficiaire_data.get('date_naissance')
+                    beneficiaire_numero_identite = beneficiaire_data.get('numero_identite')
         except:
-            continue
-            
-        # Traiter chaque immeuble de cette formalité
-        for immeuble in proprietaires.get('immeubles', []):
-            commune = immeuble.get('commune', '')
-            adresse = immeuble.get('adresse', '')
-            lots = immeuble.get('lots', '')
-            volume = immeuble.get('volume', '')
-            type_droit = immeuble.get('type_droit', '')
-            beneficiaire_ref = immeuble.get('beneficiaire_ref', '1')
-            
-            # Trouver le nom, la date de naissance et le numéro d'identité du bénéficiaire
-            beneficiaire_nom = None
-            beneficiaire_date_naissance = None
-            beneficiaire_numero_identite = None
-            try:
-                beneficiaire_num = int(beneficiaire_ref)
-                # Si on a des bénéficiaires, essayer de trouver le bon
-                if beneficiaires:
-                    # Si le numéro correspond à un index valide (en base 1)
-                    if beneficiaire_num <= len(beneficiaires):
-                        beneficiaire_data = beneficiaires[beneficiaire_num - 1]
-                        beneficiaire_nom = beneficiaire_data['nom']
-                        beneficiaire_date_naissance = beneficiaire_data.get('date_naissance')
-                        beneficiaire_numero_identite = beneficiaire_data.get('numero_identite')
-                    else:
-                        # Si le numéro est trop grand, prendre le dernier
-                        beneficiaire_data = beneficiaires[-1]
-                        beneficiaire_nom = beneficiaire_data['nom']
-                        beneficiaire_date_naissance = beneficiaire_data.get('date_naissance')
-                        beneficiaire_numero_identite = beneficiaire_data.get('numero_identite')
-            except:
-                pass
-            
-            # Si pas trouvé, prendre le premier bénéficiaire disponible
-            if not beneficiaire_nom and beneficiaires:
-                beneficiaire_data = beneficiaires[0]
-                beneficiaire_nom = beneficiaire_data['nom']
-                beneficiaire_date_naissance = beneficiaire_data.get('date_naissance')
-                beneficiaire_numero_identite = beneficiaire_data.get('numero_identite')
-                    
-            if not beneficiaire_nom:
-                continue
+            pass
+        
+        # Si pas trouvé, prendre le premier bénéficiaire disponible
+        if not beneficiaire_nom and beneficiaires:
+            beneficiaire_data = beneficiaires[0]
+            beneficiaire_nom = beneficiaire_data['nom']
+            beneficiaire_date_naissance = beneficiaire_data.get('date_naissance')
+            beneficiaire_numero_identite = beneficiaire_data.get('numero_identite')
                 
-            # Créer une clé unique pour l'immeuble
-            immeuble_key = f"{commune}_{adresse}".replace(' ', '_').replace('/', '_')
+        if not beneficiaire_nom:
+            continue
             
-            # Traiter chaque lot individuellement
-            if lots and lots != '-':
-                lots_individuels = []
-                
-                # Parser les lots (format: "144", "145 à 147", "101\n103 à 106\n111")
-                for lot_group in lots.replace('\n', ',').split(','):
-                    lot_group = lot_group.strip()
-                    if 'à' in lot_group:
-                        # Range de lots (ex: "145 à 147")
-                        try:
-                            debut, fin = lot_group.split('à')
-                            debut = int(debut.strip())
-                            fin = int(fin.strip())
-                            lots_individuels.extend(range(debut, fin + 1))
-                        except:
-                            lots_individuels.append(lot_group)
-                    elif lot_group.isdigit():
-                        lots_individuels.append(int(lot_group))
-                    elif lot_group:
-                        lots_individuels.append(lot_group)
-                        
-                # Enregistrer chaque lot
-                for lot in lots_individuels:
-                    lot_key = f"{immeuble_key}_lot_{lot}"
-                    
-                    # Vérifier si on a déjà un propriétaire pour ce lot
-                    if lot_key not in proprietaires_actuels or proprietaires_actuels[lot_key]['date_acte'] < date_acte:
-                        proprietaires_actuels[lot_key] = {
-                            'commune': commune,
-                            'adresse': adresse,
-                            'lot': str(lot),
-                            'volume': volume,
-                            'proprietaire': beneficiaire_nom,
-                            'date_naissance': beneficiaire_date_naissance,
-                            'numero_identite': beneficiaire_numero_identite,
-                            'type_droit': type_droit,
-                            'date_acte': date_acte,
-                            'date_acte_str': date_acte_str,
-                            'formalite_pages': f"{formalite['page_debut']}-{formalite['page_fin']}"
-                        }
-            else:
-                # Immeuble sans lots spécifiques
-                immeuble_key_complet = f"{immeuble_key}_sans_lot"
-                
-                if immeuble_key_complet not in proprietaires_actuels or proprietaires_actuels[immeuble_key_complet]['date_acte'] < date_acte:
-                    proprietaires_actuels[immeuble_key_complet] = {
-                        'commune': commune,
-                        'adresse': adresse,
-                        'lot': 'Sans lot spécifique',
-                        'volume': volume,
-                        'proprietaire': beneficiaire_nom,
-                        'date_naissance': beneficiaire_date_naissance,
-                        'numero_identite': beneficiaire_numero_identite,
-                        'type_droit': type_droit,
-                        'date_acte': date_acte,
-                        'date_acte_str': date_acte_str,
-                        'formalite_pages': f"{formalite['page_debut']}-{formalite['page_fin']}"
-                    }
+        # Les plages de lots restent des intervalles dans l'index (l'acte le plus récent l'emporte)
+        index.enregistrer(commune, adresse, lots, {
+            'commune': commune,
+            'adresse': adresse,
+            'volume': volume,
+            'proprietaire': beneficiaire_nom,
+            'date_naissance': beneficiaire_date_naissance,
+            'numero_identite': beneficiaire_numero_identite,
+            'type_droit': type_droit,
+            'date_acte': date_acte,
+            'date_acte_str': date_acte_str,
+            'formalite_pages': f"{formalite['page_debut']}-{formalite['page_fin']}"
+        })
+
+@instrumentation_ehf.etape
+def determiner_proprietaires_actuels(formalites: List[Dict], index: IndexProprietes = None) -> Dict:
+    """
+    Détermine le propriétaire actuel de chaque lot/volume basé sur la date d'acte la plus récente
+    """
+    if index is None: index = construire_index_proprietes(formalites)
     
     # Convertir en format plus lisible
     result = {}
-    for key, data in proprietaires_actuels.items():
+    for lot, data in index.iter_lots():
         # Grouper par immeuble
         immeuble_id = f"{data['commune']} {data['adresse']}"
         if immeuble_id not in result:
@@ -379,7 +713,7 @@ def determiner_proprietaires_actuels(formalites: List[Dict]) -> Dict:
             }
             
         result[immeuble_id]['lots'].append({
-            'lot': data['lot'],
+            'lot': lot,
             'volume': data['volume'],
             'proprietaire': data['proprietaire'],
             'date_naissance': data['date_naissance'],
@@ -395,95 +729,124 @@ def determiner_proprietaires_actuels(formalites: List[Dict]) -> Dict:
     
     return result
 
+def date_limite_charge(sous_formalites: List[Dict]) -> Optional[str]:
+    """
+    Date d'extrême exigibilité ou d'effet la plus tardive d'une charge, au format ISO.
+    None si la charge n'a aucune date ou si l'une d'elles est illisible (elle ne peut alors pas être considérée expirée).
+    """
+    from datetime import datetime
+    
+    dates = [d for sf in sous_formalites for d in sf.get('dates_exigibilite', []) + sf.get('dates_effet', [])]
+    try:
+        return max(datetime.strptime(d, '%d/%m/%Y').date() for d in dates).isoformat() if dates else None
+    except ValueError:
+        return None
+
+# Sous-formalité d'une charge : "Formalité N ... : description" (la description s'arrête aux caractères \\, n et N)
+_SOUS_FORMALITE = re.compile(r'Formalité\s+(\d+)[^:]*:([^\\n]+)', re.IGNORECASE)
+_DEBUT_FORMALITE = re.compile(r'Formalité\s+\d+', re.IGNORECASE)
+# Dates d'extrême exigibilité / d'effet et montants principaux, relevés en un seul balayage
+_ELEMENTS_CHARGE = re.compile(r'date d\'extrême (exigibilité|effet)\s*:\s*(\d{2}/\d{2}/\d{4})|montant\s+principal\s*:\s*([\d\s,\.]+)\s*eur', re.IGNORECASE)
+
+def decouper_sous_formalites(texte: str) -> List[Dict]:
+    """
+    Découpe le texte d'une charge en sous-formalités, chacune avec les dates et montants de sa zone
+    (du ':' de sa description jusqu'au "Formalité N" suivant). Chaque motif parcourt le texte une seule fois,
+    les zones étant ordonnées : temps linéaire quel que soit le nombre de sous-formalités.
+    """
+    debuts = [m.start() for m in _DEBUT_FORMALITE.finditer(texte)]
+    elements = list(_ELEMENTS_CHARGE.finditer(texte))
+    sous_formalites = []
+    i_debut = i_element = 0
+    
+    for match in _SOUS_FORMALITE.finditer(texte):
+        # Zone de texte après cette formalité (jusqu'à la suivante ou fin)
+        start_pos = match.end()
+        while i_debut < len(debuts) and debuts[i_debut] < start_pos: i_debut += 1
+        end_pos = debuts[i_debut] if i_debut < len(debuts) else len(texte)
+        
+        sous_formalite = {'numero': match.group(1), 'description': match.group(2).strip(), 'dates_exigibilite': [], 'dates_effet': [], 'montants': []}
+        while i_element < len(elements) and elements[i_element].start() < start_pos: i_element += 1
+        while i_element < len(elements) and elements[i_element].start() < end_pos:
+            element = elements[i_element]
+            i_element += 1
+            if element.end() > end_pos: continue
+            if element.group(3) is not None: sous_formalite['montants'].append({'type': 'principal', 'montant': element.group(3).strip()})
+            elif element.group(1).lower() == 'effet': sous_formalite['dates_effet'].append(element.group(2))
+            else: sous_formalite['dates_exigibilite'].append(element.group(2))
+        sous_formalites.append(sous_formalite)
+    
+    return sous_formalites
+
+@instrumentation_ehf.etape
 def extraire_charges_actives(formalites: List[Dict]) -> Dict:
     """
     Extrait les charges, privilèges et hypothèques actives des formalités de type 'Charge'.
     Une formalité = une charge. Elle est radiée si on détecte 'radiation totale' ou 'radiation simplifiée totale'.
     """
-    charges_actives = []
-    charges_radiees = []
-    
-    for formalite in formalites:
-        if formalite.get('categorie', '').lower() != 'charge':
-            continue
-            
-        texte_complet = formalite.get('texte', '')
-        
-        # Détecter radiation totale ou radiation simplifiée totale (insensible à la casse)
-        a_radiation_totale = bool(re.search(r'radiation\s+(totale|simplifi[eé]e\s+totale)', texte_complet, re.IGNORECASE))
+    return classer_charges(charge for formalite in formalites if (charge := extraire_charge(formalite)))
+
+def extraire_charge(formalite: Dict) -> Optional[Dict]:
+    """
+    Charge décrite par une formalité de type 'Charge' (None pour les autres formalités)
+    """
+    if formalite.get('categorie', '').lower() != 'charge':
+        return None
         
-        # Extraire le titre principal depuis les tables (format: "TITRE PAGE X À PAGE Y")
-        titre = None
-        for table in formalite.get('tables', []):
-            donnees = table.get('donnees', [])
-            for row in donnees:
-                for cell in row:
-                    if cell and isinstance(cell, str) and 'PAGE' in cell.upper() and 'À PAGE' in cell.upper():
-                        # Extraire le titre tel qu'il est, sans filtrage
-                        titre = cell.strip()
-                        break
-                if titre:
+    texte_complet = formalite.get('texte', '')
+    
+    # Détecter radiation totale ou radiation simplifiée totale (insensible à la casse)
+    a_radiation_totale = bool(re.search(r'radiation\s+(totale|simplifi[eé]e\s+totale)', texte_complet, re.IGNORECASE))
+    
+    # Extraire le titre principal depuis les tables (format: "TITRE PAGE X À PAGE Y")
+    titre = None
+    for table in formalite.get('tables', []):
+        donnees = table.get('donnees', [])
+        for row in donnees:
+            for cell in row:
+                if cell and isinstance(cell, str) and 'PAGE' in cell.upper() and 'À PAGE' in cell.upper():
+                    # Extraire le titre tel qu'il est, sans filtrage
+                    titre = cell.strip()
                     break
             if titre:
                 break
-        
-        # Si pas trouvé dans les tables, chercher dans le texte
-        if not titre:
-            lignes = texte_complet.split('\n')
-            for ligne in lignes:
-                if 'PAGE' in ligne.upper() and 'À PAGE' in ligne.upper():
-                    titre = ligne.strip()
-                    break
-        
-        # Extraire les sous-formalités avec leurs dates et montants
-        sous_formalites = []
-        for match in re.finditer(r'Formalité\s+(\d+)[^:]*:([^\\n]+)', texte_complet, re.IGNORECASE):
-            numero = match.group(1)
-            description = match.group(2).strip()
-            
-            # Chercher les dates d'exigibilité et d'effet pour cette sous-formalité
-            dates_exigibilite = []
-            dates_effet = []
-            montants = []
-            
-            # Zone de texte après cette formalité (jusqu'à la suivante ou fin)
-            start_pos = match.end()
-            next_match = re.search(r'Formalité\s+\d+', texte_complet[start_pos:], re.IGNORECASE)
-            end_pos = start_pos + next_match.start() if next_match else len(texte_complet)
-            zone_formalite = texte_complet[start_pos:end_pos]
-            
-            # Extraire dates d'extrême exigibilité
-            for date_match in re.finditer(r'date d\'extrême exigibilité\s*:\s*(\d{2}/\d{2}/\d{4})', zone_formalite, re.IGNORECASE):
-                dates_exigibilite.append(date_match.group(1))
-            
-            # Extraire dates d'extrême effet
-            for date_match in re.finditer(r'date d\'extrême effet\s*:\s*(\d{2}/\d{2}/\d{4})', zone_formalite, re.IGNORECASE):
-                dates_effet.append(date_match.group(1))
-            
-            # Extraire montants
-            for montant_match in re.finditer(r'montant\s+principal\s*:\s*([\d\s,\.]+)\s*eur', zone_formalite, re.IGNORECASE):
-                montants.append({'type': 'principal', 'montant': montant_match.group(1).strip()})
-            
-            sous_formalites.append({
-                'numero': numero,
-                'description': description,
-                'dates_exigibilite': dates_exigibilite,
-                'dates_effet': dates_effet,
-                'montants': montants
-            })
-        
-        # Créer la charge simplifiée
-        charge = {
-            'page_debut': formalite.get('page_debut'),
-            'page_fin': formalite.get('page_fin'),
-            'titre': titre,
-            'sous_formalites': sous_formalites,
-            'a_radiation_totale': a_radiation_totale,
-            'statut': 'RADIEE' if a_radiation_totale else 'ACTIVE'
-        }
-        
+        if titre:
+            break
+    
+    # Si pas trouvé dans les tables, chercher dans le texte
+    if not titre:
+        lignes = texte_complet.split('\n')
+        for ligne in lignes:
+            if 'PAGE' in ligne.upper() and 'À PAGE' in ligne.upper():
+                titre = ligne.strip()
+                break
+    
+    # Extraire les sous-formalités avec leurs dates et montants
+    sous_formalites = decouper_sous_formalites(texte_complet)
+    
+    # Créer la charge simplifiée
+    charge = {
+        'page_debut': formalite.get('page_debut'),
+        'page_fin': formalite.get('page_fin'),
+        'titre': titre,
+        'sous_formalites': sous_formalites,
+        'a_radiation_totale': a_radiation_totale,
+        'statut': 'RADIEE' if a_radiation_totale else 'ACTIVE',
+        'date_limite': date_limite_charge(sous_formalites)
+    }
+    
+    return charge
+
+def classer_charges(charges: Iterable[Dict]) -> Dict:
+    """
+    Répartit des charges entre actives et radiées
+    """
+    charges_actives = []
+    charges_radiees = []
+    
+    for charge in charges:
         # Ajouter à la liste appropriée
-        if a_radiation_totale:
+        if charge['a_radiation_totale']:
             charges_radiees.append(charge)
         else:
             charges_actives.append(charge)
@@ -540,20 +903,28 @@ def grouper_par_proprietaire(proprietaires_actuels: Dict) -> Dict:
     
     return proprietaires_biens
 
-def sauvegarder_formalites_json(formalites: List[Dict], pdf_name: str, immeubles_flux: List[Dict] = None):
-    # Créer un dossier spécifique pour cet EHF
-    output_folder = os.path.join("formalites_json", pdf_name)
-    os.makedirs(output_folder, exist_ok=True)
+def analyser_formalites(formalites: List[Dict], immeubles_flux: List[Dict] = None) -> Dict:
+    """
+    Calcule les données dérivées (propriétaires actuels, charges) et le résumé d'un EHF
+    """
+    # Calculer les propriétaires actuels (l'index garde aussi l'historique des actes par lot)
+    index = construire_index_proprietes(formalites)
     
-    # Calculer les propriétaires actuels
-    proprietaires_actuels = determiner_proprietaires_actuels(formalites)
+    # Extraire les charges, privilèges et hypothèques actives
+    charges_data = extraire_charges_actives(formalites)
+    
+    return assembler_analyse(index, charges_data, immeubles_flux, formalites, len(formalites), sum(f.get('nb_tables', 0) for f in formalites))
+
+def assembler_analyse(index: IndexProprietes, charges_data: Dict, immeubles_flux: Optional[List[Dict]], formalites: Optional[List[Dict]], nb_formalites: int, nb_tables_formalites: int) -> Dict:
+    """
+    Données dérivées d'un EHF à partir de l'index des propriétés et des charges
+    (sans clé 'formalites' si elles ne sont pas gardées en mémoire, en mode flux)
+    """
+    proprietaires_actuels = determiner_proprietaires_actuels(formalites or [], index)
     
     # Créer le groupement par propriétaire
     proprietaires_biens = grouper_par_proprietaire(proprietaires_actuels)
     
-    # Extraire les charges, privilèges et hypothèques actives
-    charges_data = extraire_charges_actives(formalites)
-    
     data = {
         'immeubles_flux': immeubles_flux or [], 
         'formalites': formalites, 
@@ -563,17 +934,93 @@ def sauvegarder_formalites_json(formalites: List[Dict], pdf_name: str, immeubles
         'charges_radiees': charges_data['charges_radiees'],
         'resume': {
             'nb_immeubles_tables': len(immeubles_flux or []), 
-            'nb_formalites': len(formalites), 
-            'nb_total_tables': sum(f.get('nb_tables', 0) for f in formalites) + len(immeubles_flux or []), 
+            'nb_formalites': nb_formalites, 
+            'nb_total_tables': nb_tables_formalites + len(immeubles_flux or []), 
             'nb_immeubles_avec_proprietaires': len(proprietaires_actuels), 
             'nb_proprietaires_uniques': len(proprietaires_biens),
             'nb_charges_totales': charges_data['resume']['nb_charges_totales'],
             'nb_charges_actives': charges_data['resume']['nb_charges_actives'],
             'nb_charges_radiees': charges_data['resume']['nb_charges_radiees']
-        }
+        },
+        'historique': list(index.iter_evenements())
     }
+    if formalites is None: del data['formalites']
+    return data
+
+class AnalyseEnFlux:
+    """
+    Données dérivées calculées au fil des formalités (mode flux) : seuls l'index des propriétés,
+    les charges et des compteurs sont gardés, pas les formalités elles-mêmes
+    """
+    def __init__(self):
+        self.index, self.charges = IndexProprietes(), []
+        self.nb_formalites = self.nb_tables = self.avec_proprietaires = 0
+        self.data = None
+
+    def ajouter(self, formalite: Dict):
+        indexer_publication(self.index, formalite)
+        if charge := extraire_charge(formalite): self.charges.append(charge)
+        self.nb_formalites += 1
+        self.nb_tables += formalite.get('nb_tables', 0)
+        if formalite.get('proprietaires', {}).get('disposants') and formalite.get('proprietaires', {}).get('beneficiaires'): self.avec_proprietaires += 1
+
+    def donnees(self, immeubles_flux: List[Dict]) -> Dict:
+        self.data = assembler_analyse(self.index, classer_charges(self.charges), immeubles_flux, None, self.nb_formalites, self.nb_tables)
+        return self.data
+
+@instrumentation_ehf.etape
+def sauvegarder_formalites_json(formalites: List[Dict], pdf_name: str, immeubles_flux: List[Dict] = None, data: Dict = None, export_json: bool = None, documents_tranche: Dict = None):
+    # Créer un dossier spécifique pour cet EHF
+    output_folder = os.path.join("formalites_json", pdf_name)
+    os.makedirs(output_folder, exist_ok=True)
+    
+    if data is None: data = analyser_formalites(formalites, immeubles_flux)
+    
+    # Stockage compact : chaque formalité une seule fois, accessible par index
+    chemin_stockage = stockage_ehf.ecrire_ehf(pdf_name, formalites, _documents_stockage(data, immeubles_flux, documents_tranche))
+    _indexer(pdf_name, data)
+    
+    if not (EXPORT_JSON if export_json is None else export_json): return chemin_stockage
+    
     json_file = os.path.join(output_folder, f"{pdf_name}_complet.json")
-    with open(json_file, 'w', encoding='utf-8') as f: json.dump(data, f, ensure_ascii=False, indent=2)
+    # L'historique des actes n'est consultable que depuis le stockage (format d'export inchangé)
+    with open(json_file, 'w', encoding='utf-8') as f: json.dump({cle: valeur for cle, valeur in data.items() if cle != 'historique'}, f, ensure_ascii=False, indent=2)
+    
+    _exporter_derives(output_folder, pdf_name, data, immeubles_flux)
+    for i, formalite in enumerate(formalites):
+        with open(os.path.join(output_folder, f"{pdf_name}_formalite_{i+1}.json"), 'w', encoding='utf-8') as f: json.dump(formalite, f, ensure_ascii=False, indent=2)
+    return json_file
+
+def _charges_data(data: Dict) -> Dict:
+    return {
+        'charges_actives': data['charges_actives'],
+        'charges_radiees': data['charges_radiees'],
+        'resume': {k: data['resume'][k] for k in ('nb_charges_totales', 'nb_charges_actives', 'nb_charges_radiees')}
+    }
+
+def _documents_stockage(data: Dict, immeubles_flux: List[Dict], documents_tranche: Dict = None) -> Dict:
+    """
+    Documents dérivés écrits dans le stockage SQLite à côté des formalités
+    (plus les empreintes des formalités et leur origine, voir tranches_ehf)
+    """
+    return {
+        'immeubles_flux': immeubles_flux or [],
+        'proprietaires_actuels': data['proprietaires_actuels'],
+        'proprietaires_biens': data['proprietaires_biens'],
+        'charges': _charges_data(data),
+        'resume': data['resume'],
+        'historique': data['historique'],
+        **(documents_tranche or {})
+    }
+
+def _indexer(pdf_name: str, data: Dict):
+    # Mettre à jour l'index transverse (recherche par propriétaire / par bien)
+    try: index_ehf.indexer_ehf(pdf_name, data['proprietaires_biens'], _charges_data(data))
+    except Exception as e: print(f"⚠️  Index non mis à jour pour {pdf_name}: {e}")
+
+def _exporter_derives(output_folder: str, pdf_name: str, data: Dict, immeubles_flux: List[Dict]):
+    """Fichiers JSON des données dérivées (propriétaires, charges, immeubles flux)"""
+    proprietaires_actuels, proprietaires_biens, charges_data = data['proprietaires_actuels'], data['proprietaires_biens'], _charges_data(data)
     
     # Sauvegarder les propriétaires actuels dans un fichier séparé (format original)
     proprietaires_file = os.path.join(output_folder, f"{pdf_name}_proprietaires_actuels.json")
@@ -589,40 +1036,290 @@ def sauvegarder_formalites_json(formalites: List[Dict], pdf_name: str, immeubles
     
     if immeubles_flux:
         with open(os.path.join(output_folder, f"{pdf_name}_immeubles_flux.json"), 'w', encoding='utf-8') as f: json.dump(immeubles_flux, f, ensure_ascii=False, indent=2)
-    for i, formalite in enumerate(formalites):
-        with open(os.path.join(output_folder, f"{pdf_name}_formalite_{i+1}.json"), 'w', encoding='utf-8') as f: json.dump(formalite, f, ensure_ascii=False, indent=2)
-    return json_file
+
+def _json_indente(valeur, niveau: int) -> str:
+    """json.dump(indent=2) d'une valeur imbriquée à `niveau` : même texte que dans le json.dump du document entier"""
+    return json.dumps(valeur, ensure_ascii=False, indent=2).replace('\n', '\n' + '  ' * niveau)
+
+@instrumentation_ehf.etape
+def sauvegarder_formalites_en_flux(formalites: Iterable[Dict], pdf_name: str, immeubles_flux: List[Dict] = None, export_json: bool = None, tranche: tranches_ehf.IngestionTranche = None) -> Tuple[str, AnalyseEnFlux]:
+    """
+    Mode flux : chaque formalité est écrite (stockage, _formalite_N.json, _complet.json) dès qu'elle est produite
+    puis oubliée, seules les données dérivées étant accumulées. Mêmes fichiers que sauvegarder_formalites_json.
+    Les empreintes de `tranche`, complétées pendant le parcours, sont stockées à la fin.
+    """
+    output_folder = os.path.join("formalites_json", pdf_name)
+    os.makedirs(output_folder, exist_ok=True)
+    exporter, analyse = EXPORT_JSON if export_json is None else export_json, AnalyseEnFlux()
+    json_file = os.path.join(output_folder, f"{pdf_name}_complet.json")
+    with stockage_ehf.EcritureEHF(pdf_name) as ecriture, (open(json_file, 'w', encoding='utf-8') if exporter else nullcontext()) as complet:
+        if complet: complet.write('{\n  "immeubles_flux": ' + _json_indente(immeubles_flux or [], 1) + ',\n  "formalites": [')
+        for formalite in formalites:
+            analyse.ajouter(formalite)
+            ecriture.ajouter_formalite(formalite)
+            if complet:
+                complet.write((',' if analyse.nb_formalites > 1 else '') + '\n    ' + _json_indente(formalite, 2))
+                with open(os.path.join(output_folder, f"{pdf_name}_formalite_{analyse.nb_formalites}.json"), 'w', encoding='utf-8') as f: json.dump(formalite, f, ensure_ascii=False, indent=2)
+        data = analyse.donnees(immeubles_flux)
+        if complet:
+            # Fin du document : mêmes clés et même ordre que le json.dump de sauvegarder_formalites_json
+            complet.write(('\n  ]' if analyse.nb_formalites else ']') + ''.join(f',\n  {json.dumps(cle, ensure_ascii=False)}: {_json_indente(valeur, 1)}' for cle, valeur in data.items() if cle not in ('immeubles_flux', 'historique')) + '\n}')
+        chemin_stockage = ecriture.terminer(_documents_stockage(data, immeubles_flux, tranche.documents() if tranche else None))
+    _indexer(pdf_name, data)
+    if not exporter: return chemin_stockage, analyse
+    _exporter_derives(output_folder, pdf_name, data, immeubles_flux)
+    return json_file, analyse
+
+
+def traiter_ehf(pdf_path: str, workers: int = 1, cache: bool = True, progression: Optional[Callable[[int, int], None]] = None, export_json: bool = None, rapport: bool = None, flux: bool = None, precedente: Optional[str] = None) -> Dict:
+    """
+    Extrait et sauvegarde un EHF, et retourne son résumé calculé en mémoire
+    (avec le chemin du rapport d'instrumentation s'il est demandé).
+    Avec une tranche précédente (`precedente`, ou <EHF> déjà extrait pour un fichier <EHF>_t<N>.pdf),
+    seules les formalités nouvelles sont extraites et l'analyse porte sur l'union des tranches.
+    """
+    ehf_file = os.path.basename(pdf_path)
+    ehf_name = ehf_file.replace('.pdf', '')
+    if (precedente := precedente or tranches_ehf.tranche_precedente(ehf_name)) == ehf_name: precedente = None
+    with instrumentation_ehf.rapport_document(ehf_name, pdf_path, rapport) as mesures:
+        if FLUX if flux is None else flux: resume = _traiter_ehf_en_flux(pdf_path, workers, cache, progression, export_json, mesures, precedente)
+        else: resume = _traiter_ehf(pdf_path, workers, cache, progression, export_json, mesures, precedente)
+    if mesures: resume['rapport'] = getattr(mesures, 'chemin', None)
+    return resume
+
+def _ingestion_tranche(document: DocumentEHF, precedente: Optional[str], workers: int) -> tranches_ehf.IngestionTranche:
+    """
+    Suivi des empreintes du document ; avec une tranche précédente, repère les formalités à reprendre
+    puis précharge dans le pool les seules pages restant à extraire
+    """
+    if precedente and not os.path.exists(stockage_ehf.chemin_stockage(precedente)):
+        print(f"⚠️  Tranche précédente {precedente} non trouvée : extraction complète")
+        precedente = None
+    tranche = tranches_ehf.IngestionTranche(document.signature, precedente)
+    if precedente and not tranche.empreintes_disponibles:
+        print(f"⚠️  {precedente} a été extrait sans empreintes de formalités : relancer son extraction pour en reprendre les formalités")
+        tranche = tranches_ehf.IngestionTranche(document.signature)
+    if tranche.precedente:
+        try: tranche.planifier(document.nb_pages)
+        except Exception: pass  # Rien de planifié : tout est extrait
+        # Les pages reprises ne seront pas lues : elles comptent dès maintenant dans la progression
+        document.marquer_traitees(tranche.pages_reprises())
+    if workers > 1: document.precharger(workers, tranche.pages_reprises())
+    return tranche
+
+def _traiter_ehf_en_flux(pdf_path: str, workers: int, cache: bool, progression: Optional[Callable[[int, int], None]], export_json: bool, mesures, precedente: Optional[str] = None) -> Dict:
+    """
+    Mode flux (documents très longs) : les formalités sont écrites au fur et à mesure de leur extraction
+    et la mise en page de chaque page est libérée dès sa lecture, son texte et ses tables dès que sa formalité est écrite :
+    la mémoire ne croît pas avec la longueur du document
+    """
+    ehf_file = os.path.basename(pdf_path)
+    resume = {'fichier': ehf_file, 'ehf_name': ehf_file.replace('.pdf', ''), 'sauvegarde': False}
+    with DocumentEHF(pdf_path, cache, progression, liberer_pages=True) as document:
+        tranche = _ingestion_tranche(document, precedente, workers)
+        immeubles_flux = extraire_immeubles_flux(document)
+        formalites = None
+        # Un seul parcours des pages (sans tranche précédente, rien n'est repris) : chaque page est oubliée dès qu'elle est traitée.
+        # Sauvegarder seulement si le document a au moins une formalité
+        if (premiere := next(formalites_tranche := iter_formalites_tranche(document, tranche), None)) is not None: formalites = chain([premiere], formalites_tranche)
+        if formalites is not None:
+            _, analyse = sauvegarder_formalites_en_flux(formalites, resume['ehf_name'], immeubles_flux, export_json, tranche)
+            resume['sauvegarde'] = True
+            resume.update(_resumer_analyse([], immeubles_flux, analyse.data), nb_formalites=analyse.nb_formalites, formalites_avec_proprietaires=analyse.avec_proprietaires, **tranche.resume())
+        try: resume['nb_pages'] = document.nb_pages
+        except Exception: resume['nb_pages'] = 0
+    if resume['sauvegarde'] and document.empreinte: cache_extraction.enregistrer_empreinte(document.empreinte, resume['ehf_name'])
+    if mesures: mesures.compter(**document.compteurs(), nb_formalites=resume.get('nb_formalites', 0), nb_immeubles_flux=len(immeubles_flux), **tranche.resume())
+    return resume
+
+def _noter_empreintes(formalites: Iterable[Dict], tranche: tranches_ehf.IngestionTranche) -> Iterator[Dict]:
+    for formalite in formalites:
+        tranche.extraite(formalite)
+        yield formalite
+
+def _traiter_ehf(pdf_path: str, workers: int, cache: bool, progression: Optional[Callable[[int, int], None]], export_json: bool, mesures, precedente: Optional[str] = None) -> Dict:
+    with DocumentEHF(pdf_path, cache, progression) as document:
+        tranche = _ingestion_tranche(document, precedente, workers)
+        immeubles_flux = extraire_immeubles_flux(document)
+        if tranche.precedente:
+            formalites = get_formalites_tranche(document, tranche)
+            sauvegarde = bool(formalites)
+        else:
+            formalites_pages = get_formalites_pages(document)
+            formalites = list(_noter_empreintes(get_formalites_completes(document, formalites_pages), tranche)) if formalites_pages else []
+            sauvegarde = bool(formalites_pages)
+        try: nb_pages = document.nb_pages
+        except Exception: nb_pages = 0
+    if mesures: mesures.compter(**document.compteurs(), nb_formalites=len(formalites), nb_immeubles_flux=len(immeubles_flux), **tranche.resume())
+    
+    ehf_file = os.path.basename(pdf_path)
+    resume = {'fichier': ehf_file, 'ehf_name': ehf_file.replace('.pdf', ''), 'nb_pages': nb_pages, 'sauvegarde': sauvegarde}
+    if sauvegarde:
+        data = analyser_formalites(formalites, immeubles_flux)
+        sauvegarder_formalites_json(formalites, resume['ehf_name'], immeubles_flux, data=data, export_json=export_json, documents_tranche=tranche.documents())
+        if document.empreinte: cache_extraction.enregistrer_empreinte(document.empreinte, resume['ehf_name'])
+        resume.update(_resumer_analyse(formalites, immeubles_flux, data), **tranche.resume())
+    return resume
+
+def _resumer_analyse(formalites: List[Dict], immeubles_flux: List[Dict], data: Dict) -> Dict:
+    return {
+        'nb_formalites': len(formalites),
+        'formalites_avec_proprietaires': sum(1 for f in formalites if f.get('proprietaires', {}).get('disposants') and f.get('proprietaires', {}).get('beneficiaires')),
+        'nb_proprietaires': sum(len(immeuble['lots']) for immeuble in data['proprietaires_actuels'].values()),
+        'nb_immeubles_flux': len(immeubles_flux),
+        'nb_charges_actives': len(data['charges_actives']),
+        'nb_charges_radiees': len(data['charges_radiees'])
+    }
+
+def charger_formalites_extraites(ehf_name: str) -> Optional[Tuple[List[Dict], List[Dict]]]:
+    """
+    Relit les formalités et immeubles flux déjà extraits d'un EHF, sans pdfplumber :
+    stockage SQLite, sinon _complet.json, sinon les fichiers _formalite_N.json. None si rien n'est trouvé.
+    """
+    dossier = os.path.join("formalites_json", ehf_name)
+    if os.path.exists(stockage_ehf.chemin_stockage(ehf_name)):
+        formalites = list(stockage_ehf.iter_formalites(ehf_name))
+        immeubles_flux, = stockage_ehf.lire_documents(ehf_name, 'immeubles_flux')
+        return formalites, immeubles_flux or []
+    if os.path.exists(fichier_complet := os.path.join(dossier, f"{ehf_name}_complet.json")):
+        with open(fichier_complet, 'r', encoding='utf-8') as f: complet = json.load(f)
+        return complet.get('formalites', []), complet.get('immeubles_flux', [])
+    if not os.path.isdir(dossier): return None
+    numeros = sorted(int(m.group(1)) for nom in os.listdir(dossier) if (m := re.fullmatch(re.escape(ehf_name) + r"_formalite_(\d+)\.json", nom)))
+    if not numeros: return None
+    formalites = []
+    for numero in numeros:
+        with open(os.path.join(dossier, f"{ehf_name}_formalite_{numero}.json"), 'r', encoding='utf-8') as f: formalites.append(json.load(f))
+    immeubles_flux = []
+    if os.path.exists(fichier_flux := os.path.join(dossier, f"{ehf_name}_immeubles_flux.json")):
+        with open(fichier_flux, 'r', encoding='utf-8') as f: immeubles_flux = json.load(f)
+    return formalites, immeubles_flux
+
+def reconstruire_derives(ehf_name: str, export_json: bool = None) -> Dict:
+    """
+    Recalcule uniquement les étapes dérivées d'un EHF déjà extrait (propriétaires des publications,
+    propriétaires actuels, charges) à partir des formalités stockées, puis réécrit ses résultats
+    """
+    resume = {'fichier': ehf_name, 'ehf_name': ehf_name, 'sauvegarde': False}
+    if not (extraites := charger_formalites_extraites(ehf_name)) or not extraites[0]: return resume
+    formalites, immeubles_flux = extraites
+    # Les propriétaires d'une publication ne dépendent que de son texte : ils suivent aussi les règles courantes
+    for formalite in formalites:
+        if formalite.get('categorie', '').lower() == 'publication': formalite['proprietaires'] = extraire_proprietaires_publication(formalite)
+    data = analyser_formalites(formalites, immeubles_flux)
+    # Les empreintes ne dépendent que des pages du PDF : elles sont conservées telles quelles
+    documents_tranche = {}
+    if os.path.exists(stockage_ehf.chemin_stockage(ehf_name)):
+        documents_tranche = {nom: valeur for nom, valeur in zip(('empreintes_formalites', 'tranche'), stockage_ehf.lire_documents(ehf_name, 'empreintes_formalites', 'tranche')) if valeur is not None}
+    sauvegarder_formalites_json(formalites, ehf_name, immeubles_flux, data=data, export_json=export_json, documents_tranche=documents_tranche)
+    resume['sauvegarde'] = True
+    resume.update(_resumer_analyse(formalites, immeubles_flux, data))
+    return resume
+
+def traiter_lot_ehf(pdf_paths: List[str], jobs: int = 1, workers: int = 1, cache: bool = True, export_json: bool = None, rapport: bool = None, flux: bool = None):
+    """
+    Traite plusieurs EHF, jusqu'à `jobs` documents en parallèle, et produit leurs résumés dans l'ordre
+    """
+    if jobs <= 1:
+        for pdf_path in pdf_paths: yield traiter_ehf(pdf_path, workers, cache, export_json=export_json, rapport=rapport, flux=flux)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from pool.map(traiter_ehf, pdf_paths, repeat(workers), repeat(cache), repeat(None), repeat(export_json), repeat(rapport), repeat(flux))
+
+def reconstruire_tout(fichier: str = None, export_json: bool = None):
+    """Mode --rebuild-derived : un EHF (nom ou PDF) ou tous ceux présents dans formalites_json/"""
+    if fichier:
+        ehf_names = [os.path.splitext(os.path.basename(fichier))[0]]
+    else:
+        ehf_names = sorted(nom for nom in os.listdir("formalites_json") if not nom.startswith('_') and os.path.isdir(os.path.join("formalites_json", nom))) if os.path.isdir("formalites_json") else []
+    if not ehf_names:
+        print("❌ Aucun EHF extrait dans formalites_json/")
+        return
+    
+    print(f"♻️  Recalcul des données dérivées de {len(ehf_names)} EHF")
+    debut = time.time()
+    for ehf_name in ehf_names:
+        resume = reconstruire_derives(ehf_name, export_json)
+        if resume['sauvegarde']:
+            print(f"✅ {ehf_name}: {resume['nb_formalites']} formalités, {resume['nb_proprietaires']} propriétaires actuels, "
+                  f"{resume['nb_charges_actives']} charges actives, {resume['nb_charges_radiees']} radiées")
+        else:
+            print(f"❌ Aucune formalité extraite trouvée pour {ehf_name}")
+    print(f"⏱️  {time.time() - debut:.1f}s")
 
 
 def main():
-    import sys
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Extraction des formalités des EHF")
+    parser.add_argument('fichier', nargs='?', help="PDF à traiter (par défaut : tous les EHFs/EHF*.pdf)")
+    parser.add_argument('--workers', type=int, default=1, help="Nombre de processus se partageant les pages d'un document")
+    parser.add_argument('--jobs', type=int, default=1, help="Nombre de documents traités en parallèle (mode dossier)")
+    parser.add_argument('--sans-cache', action='store_true', help="Ignorer le cache d'extraction (cache_extraction/)")
+    parser.add_argument('--export-json', action='store_true', default=None, help="Écrire aussi les fichiers JSON (_complet.json, _formalite_N.json...)")
+    parser.add_argument('--rapport', action='store_true', default=None, help="Écrire un rapport d'instrumentation par document (formalites_json/_rapports/)")
+    parser.add_argument('--flux', action='store_true', default=None, help="Mode flux pour les très longs documents : formalités écrites au fil de l'extraction, mémoire bornée")
+    parser.add_argument('--rebuild-derived', action='store_true', help="Recalculer propriétaires et charges depuis les formalités déjà extraites, sans relire les PDF")
+    parser.add_argument('--tranche-de', metavar='EHF', help="Tranche précédente déjà extraite (par défaut <EHF> pour un fichier <EHF>_t<N>.pdf) : seules les formalités nouvelles sont extraites")
+    args = parser.parse_args()
+    
+    if args.rebuild_derived:
+        reconstruire_tout(args.fichier, args.export_json)
+        return
     
     # Si un fichier spécifique est passé en argument
-    if len(sys.argv) > 1:
-        file_path = sys.argv[1]
+    if args.fichier:
+        file_path = args.fichier
         if os.path.exists(file_path):
             print(f"🔄 Traitement de {os.path.basename(file_path)}...")
             
-            # Extraire les pages de formalités
-            formalites_pages = get_formalites_pages(file_path)
-            
-            # Extraire les formalités complètes
-            formalites = get_formalites_completes(file_path, formalites_pages)
+            # Générer le nom EHF à partir du nom de fichier
+            ehf_name = os.path.splitext(os.path.basename(file_path))[0]
+            precedente = args.tranche_de or tranches_ehf.tranche_precedente(ehf_name)
             
-            # Extraire les immeubles flux
-            immeubles_flux = extraire_immeubles_flux(file_path)
+            if (FLUX if args.flux is None else args.flux) or precedente:
+                # Mode flux (formalités écrites au fil de l'extraction) ou tranche suivante d'un EHF déjà extrait
+                resume = traiter_ehf(file_path, args.workers, not args.sans_cache, export_json=args.export_json, rapport=args.rapport, flux=args.flux, precedente=precedente)
+                if resume['sauvegarde']:
+                    print(f"✅ {resume['fichier']} traité avec succès ({resume['nb_formalites']} formalités)")
+                    if resume.get('tranche_precedente'):
+                        print(f"♻️  Tranche suivante de {resume['tranche_precedente']} : {resume['nb_formalites_reprises']} formalités reprises, "
+                              f"{resume['nb_formalites_extraites']} extraites, {resume['nb_formalites_anterieures']} seulement dans la tranche précédente")
+                    print(f"💾 Résultats sauvegardés dans formalites_json/{resume['ehf_name']}/")
+                else:
+                    print(f"❌ Aucune formalité trouvée dans {resume['fichier']}")
+                if resume.get('rapport'): print(f"📈 Rapport d'instrumentation : {resume['rapport']}")
+                return
             
-            if formalites:
-                # Générer le nom EHF à partir du nom de fichier
-                ehf_name = os.path.splitext(os.path.basename(file_path))[0]
-                
-                # Sauvegarder les résultats
-                json_file = sauvegarder_formalites_json(formalites, ehf_name, immeubles_flux)
+            with instrumentation_ehf.rapport_document(ehf_name, file_path, args.rapport) as mesures:
+                # Ouvrir le PDF une seule fois pour toutes les étapes
+                with DocumentEHF(file_path, not args.sans_cache) as document:
+                    if args.workers > 1: document.precharger(args.workers)
+                    
+                    # Extraire les pages de formalités
+                    formalites_pages = get_formalites_pages(document)
+                    
+                    # Extraire les formalités complètes
+                    formalites = get_formalites_completes(document, formalites_pages)
+                    
+                    # Extraire les immeubles flux
+                    immeubles_flux = extraire_immeubles_flux(document)
+                    
+                    # Empreintes des formalités, pour reprendre celles-ci dans une tranche suivante
+                    tranche = tranches_ehf.IngestionTranche(document.signature)
+                    for formalite in formalites: tranche.extraite(formalite)
+                if mesures: mesures.compter(**document.compteurs(), nb_formalites=len(formalites), nb_immeubles_flux=len(immeubles_flux))
                 
-                print(f"✅ {os.path.basename(file_path)} traité avec succès")
-                print(f"💾 Résultats sauvegardés dans formalites_json/{ehf_name}/")
-            else:
-                print(f"❌ Aucune formalité trouvée dans {os.path.basename(file_path)}")
+                if formalites:
+                    # Sauvegarder les résultats
+                    json_file = sauvegarder_formalites_json(formalites, ehf_name, immeubles_flux, export_json=args.export_json, documents_tranche=tranche.documents())
+                    if document.empreinte: cache_extraction.enregistrer_empreinte(document.empreinte, ehf_name)
+                    
+                    print(f"✅ {os.path.basename(file_path)} traité avec succès")
+                    print(f"💾 Résultats sauvegardés dans formalites_json/{ehf_name}/")
+                else:
+                    print(f"❌ Aucune formalité trouvée dans {os.path.basename(file_path)}")
+            if mesures: print(f"📈 Rapport d'instrumentation : {getattr(mesures, 'chemin', '-')}")
         else:
             print(f"❌ Fichier non trouvé: {file_path}")
         return
@@ -642,59 +1339,37 @@ def main():
     
     print(f"📁 {len(ehf_files)} fichiers EHF trouvés: {', '.join(ehf_files)}")
     
+    debut = time.time()
     total_formalites = 0
     total_proprietaires = 0
-    for ehf_file in ehf_files:
-        pdf_path = os.path.join(ehfs_folder, ehf_file)
+    total_pages = 0
+    for resume in traiter_lot_ehf([os.path.join(ehfs_folder, f) for f in ehf_files], args.jobs, args.workers, not args.sans_cache, args.export_json, args.rapport, args.flux):
+        ehf_file = resume['fichier']
         print(f"\n🔄 Traitement de {ehf_file}...")
+        total_pages += resume['nb_pages']
         
-        immeubles_flux = extraire_immeubles_flux(pdf_path)
-        formalites_pages = get_formalites_pages(pdf_path)
-        
-        if formalites_pages:
-            formalites = get_formalites_completes(pdf_path, formalites_pages)
-            ehf_name = ehf_file.replace('.pdf', '')
-            sauvegarder_formalites_json(formalites, ehf_name, immeubles_flux)
-            
-            # Compter les formalités avec propriétaires
-            formalites_avec_proprietaires = sum(1 for f in formalites if f.get('proprietaires', {}).get('disposants') and f.get('proprietaires', {}).get('beneficiaires'))
-            
-            # Compter les propriétaires actuels
-            proprietaires_file = f"formalites_json/{ehf_name}/{ehf_name}_proprietaires_actuels.json"
-            nb_proprietaires = 0
-            if os.path.exists(proprietaires_file):
-                with open(proprietaires_file, 'r', encoding='utf-8') as f:
-                    proprietaires_data = json.load(f)
-                    nb_proprietaires = sum(len(immeuble['lots']) for immeuble in proprietaires_data.values())
-            
-            # Compter les charges actives
-            charges_file = f"formalites_json/{ehf_name}/{ehf_name}_charges_actives.json"
-            nb_charges_actives = 0
-            nb_charges_radiees = 0
-            if os.path.exists(charges_file):
-                with open(charges_file, 'r', encoding='utf-8') as f:
-                    charges_data = json.load(f)
-                    nb_charges_actives = len(charges_data.get('charges_actives', []))
-                    nb_charges_radiees = len(charges_data.get('charges_radiees', []))
-            
+        if resume['sauvegarde']:
             print(f"✅ {ehf_file} traité:")
-            print(f"   📋 {len(formalites)} formalités totales")
-            print(f"   🏠 {formalites_avec_proprietaires} avec changements de propriété")
-            print(f"   👤 {nb_proprietaires} propriétaires actuels identifiés")
-            print(f"   🏢 {len(immeubles_flux)} tables immeubles flux")
-            print(f"   ⚖️  {nb_charges_actives} charges/privilèges/hypothèques actives")
-            print(f"   ❌ {nb_charges_radiees} charges radiées")
+            print(f"   📋 {resume['nb_formalites']} formalités totales")
+            print(f"   🏠 {resume['formalites_avec_proprietaires']} avec changements de propriété")
+            print(f"   👤 {resume['nb_proprietaires']} propriétaires actuels identifiés")
+            print(f"   🏢 {resume['nb_immeubles_flux']} tables immeubles flux")
+            print(f"   ⚖️  {resume['nb_charges_actives']} charges/privilèges/hypothèques actives")
+            print(f"   ❌ {resume['nb_charges_radiees']} charges radiées")
             
-            total_formalites += len(formalites)
-            total_proprietaires += nb_proprietaires
+            total_formalites += resume['nb_formalites']
+            total_proprietaires += resume['nb_proprietaires']
         else:
             print(f"❌ Aucune formalité trouvée dans {ehf_file}")
+        if resume.get('rapport'): print(f"   📈 Rapport d'instrumentation : {resume['rapport']}")
+    duree = max(time.time() - debut, 1e-6)
     
     print(f"\n🎯 RÉSUMÉ FINAL:")
     print(f"   📊 {len(ehf_files)} EHF traités")
     print(f"   📋 {total_formalites} formalités totales extraites")
     print(f"   👤 {total_proprietaires} propriétaires actuels identifiés")
     print(f"   💾 Fichiers sauvegardés dans formalites_json/")
+    print(f"   ⏱️  {duree:.1f}s : {len(ehf_files) / duree:.2f} docs/s, {total_pages / duree:.1f} pages/s")
 
 if __name__ == "__main__": 
     main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Stockage compact des données extraites d'un EHF : un fichier SQLite par EHF,
+chaque formalité stockée une seule fois (JSON compressé zlib) et accessible par index.
+Les propriétaires et les charges sont stockés ligne par ligne pour pouvoir être relus un à un.
+"""
+import json, os, sqlite3, zlib
+from contextlib import closing
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Documents stockés ligne par ligne plutôt qu'en un seul blob
+DOCUMENTS_EN_LIGNES = ('proprietaires_biens', 'charges', 'historique')
+
+# Champs des biens indexés pour le filtrage des propriétaires
+CHAMPS_FILTRE_BIENS = ('commune', 'lot', 'volume', 'type_droit')
+
+def chemin_stockage(ehf_name: str) -> str:
+    return os.path.join("formalites_json", ehf_name, f"{ehf_name}.sqlite")
+
+def _compresser(valeur: Any) -> bytes:
+    return zlib.compress(json.dumps(valeur, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+def _decompresser(blob: bytes) -> Any:
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+def _ouvrir(ehf_name: str) -> sqlite3.Connection:
+    chemin = chemin_stockage(ehf_name)
+    if not os.path.exists(chemin): raise FileNotFoundError(chemin)
+    # Lecture seule : la connexion peut être parcourue depuis plusieurs threads (réponses en streaming)
+    return sqlite3.connect(f"file:{chemin}?mode=ro", uri=True, check_same_thread=False)
+
+class EcritureEHF:
+    """
+    Écriture progressive du stockage d'un EHF : les formalités sont ajoutées une à une au fil de l'extraction,
+    les documents dérivés à la fin. Le fichier est construit à côté puis remplacé d'un coup :
+    les lecteurs ne voient jamais d'état partiel.
+    """
+    def __init__(self, ehf_name: str):
+        self.chemin = chemin_stockage(ehf_name)
+        os.makedirs(os.path.dirname(self.chemin), exist_ok=True)
+        self.temporaire = f"{self.chemin}.{os.getpid()}.tmp"
+        if os.path.exists(self.temporaire): os.remove(self.temporaire)
+        self.connexion = sqlite3.connect(self.temporaire)
+        self.nb_formalites = 0
+        self.connexion.execute("CREATE TABLE formalites (idx INTEGER PRIMARY KEY, donnees BLOB NOT NULL)")
+
+    def ajouter_formalite(self, formalite: Dict):
+        self.nb_formalites += 1
+        self.connexion.execute("INSERT INTO formalites VALUES (?, ?)", (self.nb_formalites, _compresser(formalite)))
+
+    def terminer(self, documents: Dict[str, Any]) -> str:
+        """Écrit les documents dérivés (propriétaires, charges, résumé...) et publie le fichier"""
+        connexion = self.connexion
+        try:
+            connexion.execute("CREATE TABLE documents (nom TEXT PRIMARY KEY, donnees BLOB NOT NULL)")
+            connexion.execute("CREATE TABLE proprietaires (idx INTEGER PRIMARY KEY, nom TEXT NOT NULL, donnees BLOB NOT NULL)")
+            connexion.execute("CREATE TABLE charges (idx INTEGER PRIMARY KEY, liste TEXT NOT NULL, date_limite TEXT, donnees BLOB NOT NULL)")
+            # Index des biens pour filtrer les propriétaires sans décompresser leurs lignes
+            connexion.execute("CREATE TABLE biens (proprietaire_idx INTEGER NOT NULL, commune TEXT, lot TEXT, volume TEXT, type_droit TEXT)")
+            connexion.executemany("INSERT INTO documents VALUES (?, ?)", ((nom, _compresser(valeur)) for nom, valeur in documents.items() if nom not in DOCUMENTS_EN_LIGNES))
+            for idx, (nom, data) in enumerate(documents.get('proprietaires_biens', {}).items(), 1):
+                connexion.execute("INSERT INTO proprietaires VALUES (?, ?, ?)", (idx, nom, _compresser(data)))
+                connexion.executemany("INSERT INTO biens VALUES (?, ?, ?, ?, ?)", ((idx, *(_normaliser(bien.get(champ)) for champ in CHAMPS_FILTRE_BIENS)) for bien in data.get('biens', [])))
+            connexion.execute("CREATE INDEX idx_biens_commune ON biens (commune, lot, volume)")
+            connexion.execute("CREATE INDEX idx_biens_lot ON biens (lot, volume)")
+            connexion.execute("CREATE INDEX idx_biens_proprietaire ON biens (proprietaire_idx)")
+            charges_data = documents.get('charges', {})
+            connexion.executemany("INSERT INTO charges (liste, date_limite, donnees) VALUES (?, ?, ?)", ((liste, charge.get('date_limite'), _compresser(charge)) for liste in ('charges_actives', 'charges_radiees') for charge in charges_data.get(liste, [])))
+            connexion.execute("CREATE INDEX idx_charges_liste ON charges (liste, date_limite)")
+            connexion.execute("INSERT INTO charges (liste, donnees) VALUES ('resume', ?)", (_compresser(charges_data.get('resume', {})),))
+            # Historique des actes par plage de lots, déjà trié par immeuble puis date : l'ordre des lignes est celui des chaînes
+            connexion.execute("CREATE TABLE historique (ordre INTEGER PRIMARY KEY, lot_debut INTEGER, lot_fin INTEGER, lot TEXT, volume TEXT, date_iso TEXT NOT NULL, donnees BLOB NOT NULL)")
+            connexion.executemany("INSERT INTO historique (lot_debut, lot_fin, lot, volume, date_iso, donnees) VALUES (?, ?, ?, ?, ?, ?)",
+                                  ((e['lot_debut'], e['lot_fin'], e['lot'], e.get('volume'), e['date_iso'], _compresser(e)) for e in documents.get('historique', [])))
+            connexion.execute("CREATE INDEX idx_historique_plage ON historique (lot_debut, lot_fin)")
+            # Étendue de la plus longue plage : borne basse de lot_debut pour la recherche d'un lot
+            connexion.execute("CREATE INDEX idx_historique_etendue ON historique (lot_fin - lot_debut)")
+            connexion.execute("CREATE INDEX idx_historique_lot ON historique (lot)")
+            connexion.commit()
+        finally:
+            connexion.close()
+        os.replace(self.temporaire, self.chemin)
+        return self.chemin
+
+    def abandonner(self):
+        self.connexion.close()
+        if os.path.exists(self.temporaire): os.remove(self.temporaire)
+
+    def __enter__(self): return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is not None: self.abandonner()
+
+def ecrire_ehf(ehf_name: str, formalites: List[Dict], documents: Dict[str, Any]) -> str:
+    """
+    Écrit les formalités et les documents dérivés (propriétaires, charges, résumé...) d'un EHF
+    """
+    with EcritureEHF(ehf_name) as ecriture:
+        for formalite in formalites: ecriture.ajouter_formalite(formalite)
+        return ecriture.terminer(documents)
+
+def nb_formalites(ehf_name: str) -> int:
+    with closing(_ouvrir(ehf_name)) as connexion:
+        return connexion.execute("SELECT COUNT(*) FROM formalites").fetchone()[0]
+
+def lire_formalite(ehf_name: str, idx: int) -> Optional[Dict]:
+    """Lit la formalité n° idx (base 1, comme les fichiers _formalite_{i}.json)"""
+    with closing(_ouvrir(ehf_name)) as connexion:
+        row = connexion.execute("SELECT donnees FROM formalites WHERE idx = ?", (idx,)).fetchone()
+    return _decompresser(row[0]) if row else None
+
+def iter_formalites(ehf_name: str) -> Iterator[Dict]:
+    """Parcourt les formalités dans l'ordre, une à la fois"""
+    connexion = _ouvrir(ehf_name)
+    try:
+        for (blob,) in connexion.execute("SELECT donnees FROM formalites ORDER BY idx"): yield _decompresser(blob)
+    finally:
+        connexion.close()
+
+def _a_table(connexion: sqlite3.Connection, table: str) -> bool:
+    return connexion.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+def _lignes_disponibles(connexion: sqlite3.Connection) -> bool:
+    # Les fichiers écrits avant le stockage ligne par ligne n'ont que la table documents
+    return _a_table(connexion, 'proprietaires')
+
+def _normaliser(valeur: Optional[str]) -> Optional[str]:
+    return valeur.strip().lower() if isinstance(valeur, str) else valeur
+
+def bien_correspond(bien: Dict, filtres: Dict[str, str]) -> bool:
+    """Vérifie qu'un bien satisfait les filtres (commune, lot, volume, type_droit ; insensibles à la casse)"""
+    return all(_normaliser(bien.get(champ)) == _normaliser(valeur) for champ, valeur in filtres.items())
+
+def index_filtres_disponible(ehf_name: str) -> bool:
+    """Le stockage de cet EHF a-t-il les index de filtrage et de pagination"""
+    with closing(_ouvrir(ehf_name)) as connexion:
+        return _a_table(connexion, 'biens')
+
+def page_proprietaires(ehf_name: str, filtres: Dict[str, str], apres: int = 0, limite: Optional[int] = None) -> List[Tuple[int, str, Dict]]:
+    """
+    Propriétaires (idx, nom, données) d'index > `apres` ayant au moins un bien correspondant aux filtres.
+    Seules les lignes de la page sont décompressées.
+    """
+    conditions = ' AND '.join(f"b.{champ} = ?" for champ in filtres)
+    requete = "SELECT p.idx, p.nom, p.donnees FROM proprietaires p WHERE p.idx > ?"
+    if filtres: requete += f" AND EXISTS (SELECT 1 FROM biens b WHERE b.proprietaire_idx = p.idx AND {conditions})"
+    requete += " ORDER BY p.idx" + (" LIMIT ?" if limite is not None else "")
+    parametres = (apres, *(_normaliser(v) for v in filtres.values()), *((limite,) if limite is not None else ()))
+    with closing(_ouvrir(ehf_name)) as connexion:
+        return [(idx, nom, _decompresser(blob)) for idx, nom, blob in connexion.execute(requete, parametres)]
+
+def page_charges(ehf_name: str, aujourd_hui: str, statut: Optional[str] = None, apres: int = 0, limite: Optional[int] = None) -> List[Tuple[int, Dict]]:
+    """
+    Charges non radiées (idx, charge) d'index > `apres`, filtrées sur leur statut à la date `aujourd_hui`
+    ('active' ou 'expiree') grâce à la date limite indexée
+    """
+    requete = "SELECT idx, donnees FROM charges WHERE liste = 'charges_actives' AND idx > ?"
+    if statut == 'expiree': requete += " AND date_limite IS NOT NULL AND date_limite <= ?"
+    elif statut == 'active': requete += " AND (date_limite IS NULL OR date_limite > ?)"
+    requete += " ORDER BY idx" + (" LIMIT ?" if limite is not None else "")
+    parametres = (apres, *((aujourd_hui,) if statut else ()), *((limite,) if limite is not None else ()))
+    with closing(_ouvrir(ehf_name)) as connexion:
+        return [(idx, _decompresser(blob)) for idx, blob in connexion.execute(requete, parametres)]
+
+def compter_charges(ehf_name: str, aujourd_hui: str) -> Dict[str, int]:
+    """Nombre de charges non radiées actives et expirées à la date `aujourd_hui`"""
+    with closing(_ouvrir(ehf_name)) as connexion:
+        nb_expirees, nb_total = connexion.execute("SELECT COUNT(CASE WHEN date_limite IS NOT NULL AND date_limite <= ? THEN 1 END), COUNT(*) FROM charges WHERE liste = 'charges_actives'", (aujourd_hui,)).fetchone()
+    return {"nb_actives": nb_total - nb_expirees, "nb_expirees": nb_expirees}
+
+def historique_disponible(ehf_name: str) -> bool:
+    """Le stockage de cet EHF contient-il l'historique des actes, daté et trié (écrit depuis son introduction)"""
+    with closing(_ouvrir(ehf_name)) as connexion:
+        return connexion.execute("SELECT 1 FROM pragma_table_info('historique') WHERE name = 'date_iso'").fetchone() is not None
+
+def evenements_lot(ehf_name: str, lot: Optional[str] = None, volume: Optional[str] = None) -> List[Dict]:
+    """
+    Actes portant sur un lot (numéro, lot non numérique, ou None pour les immeubles sans lot), filtrés
+    sur le volume s'il est fourni, triés par immeuble puis date
+    """
+    if lot is None: requete, parametres = "lot_debut IS NULL AND lot IS NULL", ()
+    # Plage bornée des deux côtés : lot_debut ne peut pas être plus bas que le lot moins la plus longue étendue
+    elif lot.strip().isdigit(): requete, parametres = "lot_debut BETWEEN ? - (SELECT MAX(lot_fin - lot_debut) FROM historique) AND ? AND lot_fin >= ?", (int(lot),) * 3
+    else: requete, parametres = "lot = ?", (lot.strip(),)
+    if volume is not None: requete, parametres = f"{requete} AND volume = ?", (*parametres, volume)
+    with closing(_ouvrir(ehf_name)) as connexion:
+        return [_decompresser(blob) for (blob,) in connexion.execute(f"SELECT donnees FROM historique WHERE {requete} ORDER BY ordre", parametres)]
+
+def iter_proprietaires(ehf_name: str) -> Iterator[Tuple[str, Dict]]:
+    """Parcourt les propriétaires (nom, {'date_naissance', 'numero_identite', 'biens'}) un à un"""
+    connexion = _ouvrir(ehf_name)
+    try:
+        if not _lignes_disponibles(connexion):
+            yield from (lire_documents(ehf_name, 'proprietaires_biens')[0] or {}).items()
+            return
+        for nom, blob in connexion.execute("SELECT nom, donnees FROM proprietaires ORDER BY idx"): yield nom, _decompresser(blob)
+    finally:
+        connexion.close()
+
+def iter_charges(ehf_name: str) -> Iterator[Tuple[str, Dict]]:
+    """Parcourt les charges une à une : (liste, charge), liste valant 'charges_actives' ou 'charges_radiees'"""
+    connexion = _ouvrir(ehf_name)
+    try:
+        if not _lignes_disponibles(connexion):
+            charges_data = lire_documents(ehf_name, 'charges')[0] or {}
+            yield from ((liste, charge) for liste in ('charges_actives', 'charges_radiees') for charge in charges_data.get(liste, []))
+            return
+        for liste, blob in connexion.execute("SELECT liste, donnees FROM charges WHERE liste != 'resume' ORDER BY idx"): yield liste, _decompresser(blob)
+    finally:
+        connexion.close()
+
+def lire_documents(ehf_name: str, *noms: str) -> List[Any]:
+    """Lit un ou plusieurs documents dérivés ('proprietaires_biens', 'charges', ...), None si absent"""
+    with closing(_ouvrir(ehf_name)) as connexion:
+        trouves = {nom: _decompresser(blob) for nom, blob in connexion.execute(f"SELECT nom, donnees FROM documents WHERE nom IN ({', '.join('?' * len(noms))})", noms)}
+        # Reconstituer les documents stockés ligne par ligne
+        lignes = _lignes_disponibles(connexion)
+        if lignes and 'proprietaires_biens' in noms:
+            trouves['proprietaires_biens'] = {nom: _decompresser(blob) for nom, blob in connexion.execute("SELECT nom, donnees FROM proprietaires ORDER BY idx")}
+        if lignes and 'charges' in noms:
+            charges_data = {'charges_actives': [], 'charges_radiees': [], 'resume': {}}
+            for liste, blob in connexion.execute("SELECT liste, donnees FROM charges ORDER BY idx"):
+                if liste == 'resume': charges_data['resume'] = _decompresser(blob)
+                else: charges_data[liste].append(_decompresser(blob))
+            trouves['charges'] = charges_data
+    return [trouves.get(nom) for nom in noms]
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Implémentations d'origine, conservées telles quelles comme références des tests d'équivalence :
+extraire_proprietaires_publication avant le balayage unique des tables (user-016) et
+determiner_proprietaires_actuels avant l'index par intervalles de lots (user-018).
+Le découpage des charges d'origine est benchmark_charges.decouper_reference.
+"""
+import re
+from typing import Dict, List
+
+def extraire_proprietaires_publication(formalite: Dict) -> Dict:
+    if formalite['categorie'].lower() != 'publication': return {}
+    
+    result = {'disposants': [], 'beneficiaires': [], 'immeubles': [], 'dates': [], 'prix': None}
+    
+    for table in formalite['tables']:
+        donnees = table['donnees']
+        if not donnees: continue
+        
+        # Extraire toutes les dates (peut y en avoir plusieurs)
+        for row in donnees:
+            for cell in row:
+                if cell:
+                    cell_str = str(cell).lower()
+                    if 'date de l\'acte' in cell_str:
+                        if match := re.search(r'date de l\'acte\s*:\s*(\d{2}/\d{2}/\d{4})', cell_str):
+                            if match.group(1) not in [d.get('date_acte') for d in result['dates']]:
+                                result['dates'].append({'date_acte': match.group(1)})
+                    if 'date de dépôt' in cell_str:
+                        if match := re.search(r'date de dépôt\s*:\s*(\d{2}/\d{2}/\d{4})', cell_str):
+                            for date_entry in result['dates']:
+                                if 'date_depot' not in date_entry:
+                                    date_entry['date_depot'] = match.group(1)
+                                    break
+                            else:
+                                result['dates'].append({'date_depot': match.group(1)})
+        
+        # Extraire Disposants (peut y en avoir plusieurs)
+        if any('disposant' in str(cell).lower() or 'donateur' in str(cell).lower() for row in donnees for cell in row if cell):
+            for row in donnees[1:]:
+                if len(row) >= 2 and row[1] and str(row[1]).strip():
+                    nom = str(row[1]).strip()
+                    if not any(x in nom.lower() for x in ['disposant', 'donateur', 'numéro', 'bénéficiaire']):
+                        numero_id = str(row[2]).strip() if len(row) > 2 and row[2] and str(row[2]).strip() != '-' else None
+                        if not any(d['nom'] == nom for d in result['disposants']):
+                            result['disposants'].append({'nom': nom, 'numero_id': numero_id})
+        
+        # Extraire Bénéficiaires (seulement dans les tables avec en-tête exact "Bénéficiaire, Donataire")
+        # Vérifier que c'est bien une table de bénéficiaires et pas une table d'immeubles
+        is_beneficiaire_table = False
+        for row in donnees:
+            if any(cell and 'bénéficiaire, donataire' in str(cell).lower() for cell in row):
+                is_beneficiaire_table = True
+                break
+        
+        if is_beneficiaire_table:
+            for row in donnees[1:]:
+                if len(row) >= 2 and row[1] and str(row[1]).strip():
+                    nom = str(row[1]).strip()
+                    # Filtrer les faux positifs
+                    if (not any(x in nom.lower() for x in ['bénéficiaire', 'donataire', 'date', 'disposant', 'paris', 'transfert', 'page', 'numéro']) 
+                        and len(nom) > 2 and not re.match(r'^[A-Z]{2,3}\s+\d+$', nom)):  # Éviter "BD 10", etc.
+                        date_naissance = str(row[2]).strip() if len(row) > 2 and row[2] and str(row[2]).strip() != '-' else None
+                        # Vérifier que la date de naissance est valide
+                        if date_naissance and not re.match(r'\d{2}/\d{2}/\d{4}', date_naissance):
+                            date_naissance = None
+                        
+                        # Extraire le numéro d'identité (colonne 3 ou suivante)
+                        numero_identite = None
+                        for col_idx in range(3, len(row)):
+                            if row[col_idx] and str(row[col_idx]).strip() and str(row[col_idx]).strip() != '-':
+                                cell_value = str(row[col_idx]).strip()
+                                # Vérifier si c'est un numéro d'identité (format numérique)
+                                if re.match(r'^\d{3}\s*\d{3}\s*\d{3}$|^\d{9,}$', cell_value.replace(' ', '')):
+                                    numero_identite = cell_value
+                                    break
+                        
+                        if not any(b['nom'] == nom for b in result['beneficiaires']):
+                            result['beneficiaires'].append({'nom': nom, 'date_naissance': date_naissance, 'numero_identite': numero_identite})
+        
+        # Extraire Immeubles (gérer les tableaux fragmentés entre pages)
+        if any('immeuble' in str(cell).lower() for row in donnees for cell in row if cell):
+            # Trouver les positions des colonnes Volume et Lot dans l'en-tête
+            volume_col, lot_col = None, None
+            for i, row in enumerate(donnees):
+                for j, cell in enumerate(row):
+                    if cell and str(cell).strip().lower() == 'volume':
+                        volume_col = j
+                    elif cell and str(cell).strip().lower() == 'lot':
+                        lot_col = j
+                if volume_col is not None and lot_col is not None:
+                    break
+            
+            for row in donnees:
+                if len(row) >= 1 and row[0]:
+                    cell0 = str(row[0]).strip()
+                    
+                    # Ligne avec bénéficiaire et immeubles
+                    if 'bénéficiaire' in cell0.lower() and (':' in cell0):
+                        # Extraire le type de droit (toute propriété, usufruit, etc.)
+                        type_droit = cell0.split('-', 1)[1].strip() if '-' in cell0 else "Non spécifié"
+                        beneficiaire_num = re.search(r'bénéficiaire\s*:\s*(\d+)', cell0.lower())
+                        beneficiaire_ref = beneficiaire_num.group(1) if beneficiaire_num else "1"
+                        
+                        # Extraire volume et lots selon les colonnes identifiées
+                        volume = str(row[volume_col]).strip() if volume_col and len(row) > volume_col and row[volume_col] else None
+                        lots = str(row[lot_col]).strip() if lot_col and len(row) > lot_col and row[lot_col] else None
+                        
+                        # Concaténer toutes les colonnes non-nulles entre la colonne 1 et la colonne Volume pour former l'adresse
+                        adresse_parts = []
+                        start_col = 1  # Commencer après la colonne bénéficiaire
+                        end_col = volume_col if volume_col else len(row)
+                        
+                        for i in range(start_col, end_col):
+                            if i < len(row) and row[i] and str(row[i]).strip():
+                                adresse_parts.append(str(row[i]).strip())
+                        
+                        # Approche universelle : premier élément = commune, reste = adresse
+                        commune, adresse = None, None
+                        if adresse_parts:
+                            if len(adresse_parts) >= 2:
+                                commune = adresse_parts[0]
+                                adresse = ' '.join(adresse_parts[1:])
+                            elif len(adresse_parts) == 1:
+                                commune = adresse_parts[0]
+                                adresse = None
+                        
+                        immeuble = {
+                            'beneficiaire_ref': beneficiaire_ref,
+                            'type_droit': type_droit,
+                            'commune': commune,
+                            'adresse': adresse,
+                            'volume': volume,
+                            'lots': lots,
+                            'page': table.get('page')
+                        }
+                        result['immeubles'].append(immeuble)
+                    
+                    # Ligne avec prix
+                    elif 'prix' in cell0.lower() and 'eur' in cell0.lower():
+                        if match := re.search(r'prix[^:]*:\s*([\d\s,\.]+)\s*eur', cell0.lower()):
+                            result['prix'] = match.group(1).strip()
+    
+    return result
+
+def determiner_proprietaires_actuels(formalites: List[Dict]) -> Dict:
+    """
+    Détermine le propriétaire actuel de chaque lot/volume basé sur la date d'acte la plus récente
+    """
+    from datetime import datetime
+    
+    # Dictionnaire pour stocker les propriétaires par immeuble
+    proprietaires_actuels = {}
+    
+    # Parcourir toutes les formalités de type Publication
+    for formalite in formalites:
+        if formalite.get('categorie', '').lower() != 'publication' or 'proprietaires' not in formalite:
+            continue
+            
+        proprietaires = formalite['proprietaires']
+        
+        # Vérifier qu'il y a bien des changements de propriété (disposant requis)
+        if not proprietaires.get('disposants'):
+            continue
+            
+        # Si pas de bénéficiaires extraits automatiquement, essayer de les extraire manuellement
+        beneficiaires = proprietaires.get('beneficiaires', [])
+        if not beneficiaires:
+            # Chercher dans les tables pour extraire les bénéficiaires manuellement
+            for table in formalite.get('tables', []):
+                donnees = table.get('donnees', [])
+                # Chercher une table avec "Bénéficiaires, Donataires"
+                for i, row in enumerate(donnees):
+                    if any(cell and 'bénéficiaires, donataires' in str(cell).lower() for cell in row):
+                        # Extraire les bénéficiaires des lignes suivantes
+                        for j in range(i + 1, len(donnees)):
+                            beneficiaire_row = donnees[j]
+                            if len(beneficiaire_row) >= 2 and beneficiaire_row[1]:
+                                nom = str(beneficiaire_row[1]).strip()
+                                if nom and not any(x in nom.lower() for x in ['bénéficiaire', 'donataire']):
+                                    date_naissance = str(beneficiaire_row[2]).strip() if len(beneficiaire_row) > 2 and beneficiaire_row[2] else None
+                                    
+                                    # Extraire le numéro d'identité
+                                    numero_identite = None
+                                    for col_idx in range(3, len(beneficiaire_row)):
+                                        if beneficiaire_row[col_idx] and str(beneficiaire_row[col_idx]).strip() != '-':
+                                            cell_value = str(beneficiaire_row[col_idx]).strip()
+                                            if re.match(r'^\d{3}\s*\d{3}\s*\d{3}$|^\d{9,}$', cell_value.replace(' ', '')):
+                                                numero_identite = cell_value
+                                                break
+                                    
+                                    beneficiaires.append({'nom': nom, 'date_naissance': date_naissance, 'numero_identite': numero_identite})
+                        break
+        
+        # Si toujours pas de bénéficiaires, continuer (peut-être une radiation ou autre)
+        if not beneficiaires:
+            continue
+            
+        # Récupérer la date d'acte la plus récente de cette formalité
+        dates = proprietaires.get('dates', [])
+        if not dates:
+            continue
+            
+        date_acte_str = None
+        for date_entry in dates:
+            if 'date_acte' in date_entry:
+                date_acte_str = date_entry['date_acte']
+                break
+                
+        if not date_acte_str:
+            continue
+            
+        try:
+            date_acte = datetime.strptime(date_acte_str, '%d/%m/%Y')
+        except:
+            continue
+            
+        # Traiter chaque immeuble de cette formalité
+        for immeuble in proprietaires.get('immeubles', []):
+            commune = immeuble.get('commune', '')
+            adresse = immeuble.get('adresse', '')
+            lots = immeuble.get('lots', '')
+            volume = immeuble.get('volume', '')
+            type_droit = immeuble.get('type_droit', '')
+            beneficiaire_ref = immeuble.get('beneficiaire_ref', '1')
+            
+            # Trouver le nom, la date de naissance et le numéro d'identité du bénéficiaire
+            beneficiaire_nom = None
+            beneficiaire_date_naissance = None
+            beneficiaire_numero_identite = None
+            try:
+                beneficiaire_num = int(beneficiaire_ref)
+                # Si on a des bénéficiaires, essayer de trouver le bon
+                if beneficiaires:
+                    # Si le numéro correspond à un index valide (en base 1)
+                    if beneficiaire_num <= len(beneficiaires):
+                        beneficiaire_data = beneficiaires[beneficiaire_num - 1]
+                        beneficiaire_nom = beneficiaire_data['nom']
+                        beneficiaire_date_naissance = beneficiaire_data.get('date_naissance')
+                        beneficiaire_numero_identite = beneficiaire_data.get('numero_identite')
+                    else:
+                        # Si le numéro est trop grand, prendre le dernier
+                        beneficiaire_data = beneficiaires[-1]
+                        beneficiaire_nom = beneficiaire_data['nom']
+                        beneficiaire_date_naissance = beneficiaire_data.get('date_naissance')
+                        beneficiaire_numero_identite = beneficiaire_data.get('numero_identite')
+            except:
+                pass
+            
+            # Si pas trouvé, prendre le premier bénéficiaire disponible
+            if not beneficiaire_nom and beneficiaires:
+                beneficiaire_data = beneficiaires[0]
+                beneficiaire_nom = beneficiaire_data['nom']
+                beneficiaire_date_naissance = beneficiaire_data.get('date_naissance')
+                beneficiaire_numero_identite = beneficiaire_data.get('numero_identite')
+                    
+            if not beneficiaire_nom:
+                continue
+                
+            # Créer une clé unique pour l'immeuble
+            immeuble_key = f"{commune}_{adresse}".replace(' ', '_').replace('/', '_')
+            
+            # Traiter chaque lot individuellement
+            if lots and lots != '-':
+                lots_individuels = []
+                
+                # Parser les lots (format: "144", "145 à 147", "101\n103 à 106\n111")
+                for lot_group in lots.replace('\n', ',').split(','):
+                    lot_group = lot_group.strip()
+                    if 'à' in lot_group:
+                        # Range de lots (ex: "145 à 147")
+                        try:
+                            debut, fin = lot_group.split('à')
+                            debut = int(debut.strip())
+                            fin = int(fin.strip())
+                            lots_individuels.extend(range(debut, fin + 1))
+                        except:
+                            lots_individuels.append(lot_group)
+                    elif lot_group.isdigit():
+                        lots_individuels.append(int(lot_group))
+                    elif lot_group:
+                        lots_individuels.append(lot_group)
+                        
+                # Enregistrer chaque lot
+                for lot in lots_individuels:
+                    lot_key = f"{immeuble_key}_lot_{lot}"
+                    
+                    # Vérifier si on a déjà un propriétaire pour ce lot
+                    if lot_key not in proprietaires_actuels or proprietaires_actuels[lot_key]['date_acte'] < date_acte:
+                        proprietaires_actuels[lot_key] = {
+                            'commune': commune,
+                            'adresse': adresse,
+                            'lot': str(lot),
+                            'volume': volume,
+                            'proprietaire': beneficiaire_nom,
+                            'date_naissance': beneficiaire_date_naissance,
+                            'numero_identite': beneficiaire_numero_identite,
+                            'type_droit': type_droit,
+                            'date_acte': date_acte,
+                            'date_acte_str': date_acte_str,
+                            'formalite_pages': f"{formalite['page_debut']}-{formalite['page_fin']}"
+                        }
+            else:
+                # Immeuble sans lots spécifiques
+                immeuble_key_complet = f"{immeuble_key}_sans_lot"
+                
+                if immeuble_key_complet not in proprietaires_actuels or proprietaires_actuels[immeuble_key_complet]['date_acte'] < date_acte:
+                    proprietaires_actuels[immeuble_key_complet] = {
+                        'commune': commune,
+                        'adresse': adresse,
+                        'lot': 'Sans lot spécifique',
+                        'volume': volume,
+                        'proprietaire': beneficiaire_nom,
+                        'date_naissance': beneficiaire_date_naissance,
+                        'numero_identite': beneficiaire_numero_identite,
+                        'type_droit': type_droit,
+                        'date_acte': date_acte,
+                        'date_acte_str': date_acte_str,
+                        'formalite_pages': f"{formalite['page_debut']}-{formalite['page_fin']}"
+                    }
+    
+    # Convertir en format plus lisible
+    result = {}
+    for key, data in proprietaires_actuels.items():
+        # Grouper par immeuble
+        immeuble_id = f"{data['commune']} {data['adresse']}"
+        if immeuble_id not in result:
+            result[immeuble_id] = {
+                'commune': data['commune'],
+                'adresse': data['adresse'],
+                'lots': []
+            }
+            
+        result[immeuble_id]['lots'].append({
+            'lot': data['lot'],
+            'volume': data['volume'],
+            'proprietaire': data['proprietaire'],
+            'date_naissance': data['date_naissance'],
+            'numero_identite': data['numero_identite'],
+            'type_droit': data['type_droit'],
+            'date_acte': data['date_acte_str'],
+            'formalite_pages': data['formalite_pages']
+        })
+    
+    # Trier les lots par numéro
+    for immeuble in result.values():
+        immeuble['lots'].sort(key=lambda x: int(x['lot']) if str(x['lot']).isdigit() else 999999)
+    
+    return result
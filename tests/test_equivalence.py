@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Équivalence des implémentations optimisées avec celles d'origine (tests/references.py), sur des
+entrées aléatoires construites à partir des libellés des relevés et de cas limites :
+tables de publication (user-016), découpage des charges (user-017), propriétaires actuels (user-018).
+Les graines sont fixes : un échec se rejoue à l'identique.
+"""
+import copy, random, unittest
+import simple_pdf_extract as spe
+from benchmark_charges import decouper_reference
+from tests import references
+
+# Cellules des tables de publication : en-têtes, faux positifs filtrés, valeurs des colonnes
+_CELLULES = [
+    None, '', '-', ' ', 'Disposant, Donateur', 'Disposants, Donateurs', 'Bénéficiaire, Donataire', 'Bénéficiaires, Donataires',
+    'Immeubles', 'Immeuble', 'Volume', 'Lot', ' volume ', 'LOT', 'Numéro', 'Date de naissance', 'PARIS 07', 'PARIS 15', 'BD 10', 'AB 123',
+    "Date de l'acte : 12/03/2015", "Date de l'acte : 01/07/2019", "date de l'acte: 12/03/2015", 'Date de dépôt : 02/04/2015',
+    'Date de dépôt : 15/09/2019', "Date de l'acte : 05/05/2010 Date de dépôt : 06/06/2010", 'Bénéficiaire : 1 - Toute propriété',
+    'Bénéficiaire : 2 - Usufruit', 'Bénéficiaire : 3 - Nue-propriété', 'Bénéficiaire :1', 'Bénéficiaire - sans numéro',
+    'Prix : 250 000,00 EUR', 'Prix de vente : 1 200 000 eur', 'prix sans montant EUR', 'Transfert de propriété', 'Page 3',
+    'DUPONT JEAN', 'MARTIN MARIE', 'SCI DES LILAS', 'DU', 'DURAND PAUL', '12/05/1960', '1960', '123 456 789', '123456789012', '12 34',
+    '144', '145 à 147', '101\n103 à 106\n111', 'A', '3', '12 rue de la Paix', 'Avenue Foch',
+]
+_CATEGORIES = ['Publication', 'publication', 'Charge', 'Copropriété']
+
+def _table(aleatoire: random.Random) -> dict:
+    largeur = aleatoire.randint(1, 7)
+    lignes = [[aleatoire.choice(_CELLULES) for _ in range(aleatoire.choice([largeur, largeur, aleatoire.randint(1, 7)]))]
+              for _ in range(aleatoire.randint(0, 8))]
+    return {'page': aleatoire.randint(1, 60), 'donnees': lignes}
+
+def _formalite_publication(aleatoire: random.Random) -> dict:
+    return {'categorie': aleatoire.choice(_CATEGORIES), 'tables': [_table(aleatoire) for _ in range(aleatoire.randint(1, 4))]}
+
+# Fragments des textes de charge, y compris ceux qui coupent une sous-formalité ou une date
+_FRAGMENTS_CHARGE = [
+    'Formalité 1 - Dépôt n° 12 : Hypothèque conventionnelle', 'Formalité 2 : Privilège de prêteur de deniers', 'FORMALITÉ 10 du 01/01/2001 : Prorogation',
+    'Formalité 3', 'Formalité', 'Formalité x :', ' : ', ':', '\n', '\n\n', ' ', '\\n', 'n', "Date d'extrême exigibilité : 01/02/2030",
+    "date d'extrême effet: 12/12/2040", "Date d'extrême effet : 31/12/1999", "date d'extrême exigibilité :", '01/02/2030',
+    'Montant principal : 150 000,00 EUR', 'montant  principal:5 eur', 'Montant principal : EUR', 'Montant principal : 12.5 EURO',
+    'Créancier : BANQUE', 'Radiation partielle', 'Relevé des formalités - Charge', 'PAGE 12 À PAGE 40',
+]
+
+def _texte_charge(aleatoire: random.Random) -> str:
+    return ''.join(aleatoire.choice(_FRAGMENTS_CHARGE) + aleatoire.choice(['', ' ', '\n']) for _ in range(aleatoire.randint(0, 40)))
+
+# Lots et adresses des immeubles : plages, listes, lots non numériques, plages mal formées
+_LOTS = [None, '', '-', '1', '2', '7', '144', '1 à 5', '3 à 9', '4\n6 à 8', '1, 2, 3', '10 à 2', 'A', 'B à C', '2 à x', ' 5 ', '1 à 5\n7', '0']
+_COMMUNES = [None, '', 'PARIS 07', 'PARIS 15', 'LYON']
+_ADRESSES = [None, '', '12 rue de la Paix', 'Avenue Foch', '12 rue/de la Paix']
+_NOMS = ['DUPONT JEAN', 'MARTIN MARIE', 'SCI DES LILAS', 'DURAND PAUL', 'BERNARD LUC']
+_DATES_ACTE = ['12/03/2015', '01/07/2019', '01/07/2019', '31/12/2000', '29/02/2016', '32/01/2015', 'inconnue']
+
+def _formalite_proprietes(aleatoire: random.Random, numero: int) -> dict:
+    beneficiaires = [{'nom': aleatoire.choice(_NOMS), 'date_naissance': aleatoire.choice([None, '12/05/1960']),
+                      'numero_identite': aleatoire.choice([None, '123 456 789'])} for _ in range(aleatoire.choice([0, 0, 1, 1, 2, 3]))]
+    dates = aleatoire.choice([[], [{'date_depot': '02/04/2015'}], [{'date_acte': aleatoire.choice(_DATES_ACTE)}],
+                              [{'date_depot': '02/04/2015'}, {'date_acte': aleatoire.choice(_DATES_ACTE), 'date_depot': '03/04/2015'}]])
+    immeubles = [{'beneficiaire_ref': aleatoire.choice(['1', '2', '3', '9', 'x']), 'type_droit': aleatoire.choice(['Toute propriété', 'Usufruit']),
+                  'commune': aleatoire.choice(_COMMUNES), 'adresse': aleatoire.choice(_ADRESSES), 'volume': aleatoire.choice([None, '-', '3']),
+                  'lots': aleatoire.choice(_LOTS), 'page': numero} for _ in range(aleatoire.randint(0, 4))]
+    # Table de repli lue quand aucun bénéficiaire n'a été extrait
+    tables = [{'page': numero, 'donnees': [['Bénéficiaires, Donataires', 'Nom', 'Date'], ['1', aleatoire.choice(_NOMS + ['Bénéficiaire']), '01/01/1970', '987654321']]}] \
+        if aleatoire.random() < 0.3 else []
+    return {'categorie': aleatoire.choice(['Publication', 'Publication', 'Charge']), 'page_debut': numero, 'page_fin': numero + aleatoire.randint(0, 2),
+            'tables': tables, 'proprietaires': {'disposants': aleatoire.choice([[], [{'nom': 'VENDEUR', 'numero_id': None}], [{'nom': 'VENDEUR', 'numero_id': '123456789'}]]),
+                                                'beneficiaires': beneficiaires, 'dates': dates, 'immeubles': immeubles}}
+
+class TestEquivalence(unittest.TestCase):
+    def test_proprietaires_publication(self):
+        """20 000 tables aléatoires : balayage unique identique à l'extraction d'origine"""
+        aleatoire, nb_tables = random.Random(16), 0
+        while nb_tables < 20000:
+            formalite = _formalite_publication(aleatoire)
+            nb_tables += len(formalite['tables'])
+            attendu = references.extraire_proprietaires_publication(copy.deepcopy(formalite))
+            self.assertEqual(spe.extraire_proprietaires_publication(formalite), attendu, formalite)
+
+    def test_sous_formalites(self):
+        """20 000 textes de charge aléatoires : découpage linéaire identique à l'ancienne boucle"""
+        aleatoire = random.Random(17)
+        for _ in range(20000):
+            texte = _texte_charge(aleatoire)
+            self.assertEqual(spe.decouper_sous_formalites(texte), decouper_reference(texte), texte)
+
+    def test_proprietaires_actuels(self):
+        """3 000 ensembles de publications aléatoires : index par intervalles identique au dictionnaire par lot, ordre compris"""
+        aleatoire = random.Random(18)
+        for _ in range(3000):
+            formalites = [_formalite_proprietes(aleatoire, numero) for numero in range(1, aleatoire.randint(1, 8) * 3, 3)]
+            attendu = references.determiner_proprietaires_actuels(copy.deepcopy(formalites))
+            obtenu = spe.determiner_proprietaires_actuels(formalites)
+            self.assertEqual(list(obtenu), list(attendu))
+            self.assertEqual(obtenu, attendu, formalites)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Non-régression des sorties sur le corpus EHFs/ : chaque PDF est extrait sans cache dans un dossier
+temporaire et les empreintes de ses fichiers JSON exportés sont comparées à benchmark_golden.json
+(réenregistrées par `python benchmark_pipeline.py --enregistrer` après un changement voulu des sorties).
+Environ 1 min 30 sur le corpus complet.
+"""
+import glob, json, os, subprocess, sys, tempfile, unittest
+from benchmark_pipeline import GOLDEN_EMPREINTES, comparer_sorties, empreintes_sorties, sorties_json
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _pdfs_corpus():
+    return sorted(glob.glob(os.path.join(RACINE, "EHFs", "*.pdf"))) + sorted(glob.glob(os.path.join(RACINE, "EHFs", "t2", "*.pdf")))
+
+@unittest.skipUnless(_pdfs_corpus(), "corpus EHFs/ absent")
+class TestSortiesCorpus(unittest.TestCase):
+    def test_empreintes_des_sorties(self):
+        with open(os.path.join(RACINE, GOLDEN_EMPREINTES), 'r', encoding='utf-8') as f: attendues = json.load(f)
+        for pdf_path in _pdfs_corpus():
+            nom = os.path.splitext(os.path.basename(pdf_path))[0]
+            with self.subTest(ehf=nom), tempfile.TemporaryDirectory(prefix="golden_ehf_") as dossier:
+                # Un dossier par document : pas de tranche précédente ni d'index partagés entre documents
+                subprocess.run([sys.executable, os.path.join(RACINE, "simple_pdf_extract.py"), pdf_path, "--sans-cache", "--export-json"],
+                               cwd=dossier, check=True, capture_output=True)
+                self.assertIn(nom, attendues, f"{nom} absent de {GOLDEN_EMPREINTES}")
+                obtenues = empreintes_sorties(sorties_json(os.path.join(dossier, "formalites_json"), nom))
+                self.assertEqual(comparer_sorties(obtenues, attendues[nom]), [])
+
+if __name__ == "__main__":
+    unittest.main()
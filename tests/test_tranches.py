@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Ingestion par tranches (tranches_ehf) sur EHF4 découpé avec PyPDF2 : 40 premières pages puis document complet,
+et l'inverse. Les formalités inchangées sont reprises de la tranche précédente sans relire leurs pages, et les
+fichiers JSON exportés de la seconde tranche sont ceux d'une extraction complète (benchmark_golden.json),
+en mode normal comme en mode flux.
+"""
+import json, os, tempfile, unittest
+from contextlib import contextmanager
+import simple_pdf_extract as spe
+from benchmark_pipeline import GOLDEN_EMPREINTES, comparer_sorties, empreintes_sorties, sorties_json
+
+try: from PyPDF2 import PdfReader, PdfWriter
+except ImportError: PdfReader = PdfWriter = None
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EHF4 = os.path.join(RACINE, "EHFs", "EHF4.pdf")
+
+def _ecrire_pages(destination: str, nb_pages: int = None):
+    """Copie les nb_pages premières pages de EHF4 (toutes par défaut)"""
+    ecrivain = PdfWriter()
+    for page in PdfReader(EHF4).pages[:nb_pages]: ecrivain.add_page(page)
+    with open(destination, 'wb') as f: ecrivain.write(f)
+
+@contextmanager
+def _dossier_temporaire():
+    # Stockage, index et empreintes sont relatifs au dossier courant
+    repertoire = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="tranches_ehf_") as dossier:
+        os.chdir(dossier)
+        try: yield dossier
+        finally: os.chdir(repertoire)
+
+@unittest.skipUnless(PdfReader and os.path.exists(EHF4), "PyPDF2 ou EHFs/EHF4.pdf absent")
+class TestTranchesEHF4(unittest.TestCase):
+    def _ingerer(self, pages_tranche_1: int, pages_tranche_2: int, flux: bool) -> dict:
+        """Extrait EHF4 puis EHF4_t2 (tranche précédente détectée : EHF4) et vérifie les sorties de EHF4_t2"""
+        _ecrire_pages("EHF4.pdf", pages_tranche_1)
+        _ecrire_pages("EHF4_t2.pdf", pages_tranche_2)
+        spe.traiter_ehf("EHF4.pdf", cache=False, export_json=True, rapport=False, flux=flux)
+        resume = spe.traiter_ehf("EHF4_t2.pdf", cache=False, export_json=True, rapport=False, flux=flux)
+        with open(os.path.join(RACINE, GOLDEN_EMPREINTES), 'r', encoding='utf-8') as f: attendues = json.load(f)["EHF4"]
+        obtenues = {nom.replace("EHF4_t2", "EHF4", 1): empreinte for nom, empreinte in empreintes_sorties(sorties_json("formalites_json", "EHF4_t2")).items()}
+        self.assertEqual(comparer_sorties(obtenues, attendues), [])
+        return resume
+
+    def test_tranche_complete_apres_premieres_pages(self):
+        """Les 17 formalités des 40 premières pages sont reprises, les 17 suivantes extraites"""
+        for flux in (False, True):
+            with self.subTest(flux=flux), _dossier_temporaire():
+                resume = self._ingerer(40, None, flux)
+                self.assertEqual((resume['tranche_precedente'], resume['nb_formalites_reprises'], resume['nb_formalites_extraites'], resume['nb_formalites_anterieures']), ("EHF4", 17, 17, 0))
+
+    def test_premieres_pages_apres_tranche_complete(self):
+        """Rien n'est extrait : 17 formalités reprises, les 17 absentes de la nouvelle tranche gardées de la précédente"""
+        for flux in (False, True):
+            with self.subTest(flux=flux), _dossier_temporaire():
+                resume = self._ingerer(None, 40, flux)
+                self.assertEqual((resume['tranche_precedente'], resume['nb_formalites_reprises'], resume['nb_formalites_extraites'], resume['nb_formalites_anterieures']), ("EHF4", 17, 0, 17))
+
+if __name__ == "__main__":
+    unittest.main()
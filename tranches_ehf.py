@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Ingestion différentielle des tranches successives d'un même EHF (EHFs/EHF4.pdf, puis EHFs/t2/EHF4_t2.pdf...).
+Chaque formalité a une empreinte (catégorie, titre, référence d'enliassement, dates de dépôt et d'acte,
+hash du texte de ses pages) calculée sur le texte brut du pré-scan, sans mise en page : les formalités
+d'une nouvelle tranche déjà extraites dans la précédente sont reprises de son stockage au lieu d'être relues.
+"""
+import hashlib, json, os, re
+from collections import Counter
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import stockage_ehf
+
+# Motifs appliqués au texte brut d'une page (ordre du flux de contenu, espaces non garantis) comme au texte extrait
+_PLAGE_PAGES = re.compile(r'PAGE\s*(\d+)\s*[ÀAà]\s*PAGE\s*(\d+)', re.IGNORECASE)
+_ENTETE = re.compile(r'Relevé\s*des\s*formalités\s*-\s*([^\n]*)\n(.{0,200}?)PAGE\s*\d+\s*[ÀAà]\s*PAGE', re.IGNORECASE | re.S)
+_REFERENCE = re.compile(r"Référence\s*d(?:.enliassement|e\s*dépôt)\s*:\s*(\d{4}\s*[A-Z]{1,2}\s*\d+)", re.IGNORECASE)
+_DATE_DEPOT = re.compile(r'Date\s*de\s*dépôt\s*:\s*(\d{2}/\d{2}/\d{4})', re.IGNORECASE)
+_DATE_ACTE = re.compile(r"Date\s*de\s*l.acte\s*:\s*(\d{2}/\d{2}/\d{4})", re.IGNORECASE)
+# Pied de page propre à chaque état (dossier ANF, « n sur N ») : exclu du hash comme la plage de pages
+_PIED_DE_PAGE = re.compile(r'ANF_\d{4}_\d+\s*\d+\s*sur\s*\d+', re.IGNORECASE)
+_MARQUEUR_PAGE = re.compile(r'^=== Page (\d+) ===$', re.MULTILINE)
+_SUFFIXE_TRANCHE = re.compile(r'(.+)_t(\d+)')
+
+# Version des signatures de page gardées dans le cache d'extraction (clé 'version_signature' de chaque page) :
+# la changer les fait recalculer
+VERSION_SIGNATURE = 2
+
+# Champs de l'empreinte qui identifient une formalité indépendamment de son texte
+CHAMPS_IDENTITE = ('categorie', 'titre', 'reference', 'date_depot', 'date_acte')
+
+def _espaces(texte: Optional[str]) -> Optional[str]:
+    return re.sub(r'\s+', ' ', texte).strip() if texte is not None else None
+
+def _groupe(motif: re.Pattern, texte: str) -> Optional[str]:
+    return _espaces(m.group(1)) if (m := motif.search(texte)) else None
+
+def signature_page(texte_brut: str) -> Dict:
+    """Éléments d'empreinte d'une page de formalité, tirés de son texte brut"""
+    entete, plage = _ENTETE.search(texte_brut), _PLAGE_PAGES.search(texte_brut)
+    normalise = re.sub(r'\s+', '', _PIED_DE_PAGE.sub('', _PLAGE_PAGES.sub('', texte_brut)))
+    return {
+        'categorie': _espaces(entete.group(1)) if entete else None,
+        'titre': _espaces(entete.group(2)) if entete else None,
+        'plage': [int(plage.group(1)), int(plage.group(2))] if plage else None,
+        'reference': _groupe(_REFERENCE, texte_brut),
+        'date_depot': _groupe(_DATE_DEPOT, texte_brut),
+        'date_acte': _groupe(_DATE_ACTE, texte_brut),
+        'hash': hashlib.sha256(normalise.encode('utf-8')).hexdigest()[:24]
+    }
+
+def empreinte_formalite(signatures: List[Optional[Dict]]) -> Optional[Dict]:
+    """Empreinte d'une formalité à partir des signatures de ses pages (None si l'une d'elles manque)"""
+    if not signatures or any(signature is None for signature in signatures): return None
+    premiere = signatures[0]
+    return dict({champ: premiere[champ] for champ in CHAMPS_IDENTITE}, nb_pages=len(signatures),
+                texte=hashlib.sha256('|'.join(signature['hash'] for signature in signatures).encode()).hexdigest()[:24])
+
+def cle_empreinte(empreinte: Dict) -> str:
+    return json.dumps(empreinte, sort_keys=True, ensure_ascii=False)
+
+def identite_formalite(formalite: Dict) -> Optional[Tuple]:
+    """
+    Identité d'une formalité d'une tranche à l'autre (catégorie, titre, référence, dates), lue dans son texte extrait :
+    disponible aussi pour les formalités sans empreinte. None si ni référence ni date ne la distinguent.
+    """
+    texte = formalite.get('texte', '')
+    entete = _ENTETE.search(texte)
+    identite = (formalite.get('categorie'), _espaces(entete.group(2)) if entete else None, _groupe(_REFERENCE, texte), _groupe(_DATE_DEPOT, texte), _groupe(_DATE_ACTE, texte))
+    return identite if any(identite[2:]) else None
+
+def deplacer_formalite(formalite: Dict, page_debut: int) -> Dict:
+    """Renumérote les pages d'une formalité reprise d'une autre tranche pour qu'elle commence à page_debut"""
+    if not (decalage := page_debut - formalite['page_debut']): return formalite
+    formalite['page_debut'] += decalage
+    formalite['page_fin'] += decalage
+    formalite['texte'] = _MARQUEUR_PAGE.sub(lambda m: f"=== Page {int(m.group(1)) + decalage} ===", formalite['texte'])
+    for table in formalite.get('tables', []): table['page'] += decalage
+    for immeuble in formalite.get('proprietaires', {}).get('immeubles', []):
+        if isinstance(immeuble.get('page'), int): immeuble['page'] += decalage
+    return formalite
+
+def tranche_precedente(ehf_name: str) -> Optional[str]:
+    """
+    Dernière tranche déjà extraite d'un EHF nommé <EHF>_t<N> : <EHF>_t<N-1>, ..., <EHF>_t2, sinon <EHF>.
+    None pour un nom sans suffixe de tranche ou si aucune tranche précédente n'est stockée.
+    """
+    if not (m := _SUFFIXE_TRANCHE.fullmatch(ehf_name)): return None
+    base, numero = m.group(1), int(m.group(2))
+    for nom in [f"{base}_t{n}" for n in range(numero - 1, 1, -1)] + [base]:
+        if os.path.exists(stockage_ehf.chemin_stockage(nom)): return nom
+    return None
+
+class IngestionTranche:
+    """
+    Empreintes des formalités produites pour un document et, avec une tranche précédente,
+    reprise de ses formalités déjà extraites. `signature(page_num)` donne la signature d'une page
+    (None hors des pages de formalités).
+    """
+    def __init__(self, signature: Callable[[int], Optional[Dict]], precedente: Optional[str] = None):
+        self.signature, self.precedente = signature, precedente
+        self.empreintes: List[Optional[Dict]] = []
+        self.nb_reprises = self.nb_extraites = self.nb_anterieures = 0
+        self.plan = {}         # page de début dans ce document -> (page de fin, idx dans la tranche précédente)
+        self._reprises = set()
+        self._identites = Counter()  # identités des formalités de ce document (une formalité antérieure écartée par occurrence)
+        self._empreintes_precedentes, self._par_cle = [], {}
+        if precedente:
+            empreintes, = stockage_ehf.lire_documents(precedente, 'empreintes_formalites')
+            self._empreintes_precedentes = empreintes or [None] * stockage_ehf.nb_formalites(precedente)
+            for idx, empreinte in enumerate(self._empreintes_precedentes, 1):
+                if empreinte: self._par_cle.setdefault(cle_empreinte(empreinte), []).append(idx)
+
+    @property
+    def empreintes_disponibles(self) -> bool:
+        """La tranche précédente a-t-elle des empreintes (stockage écrit avant les tranches : à réextraire)"""
+        return bool(self._par_cle)
+
+    def empreinte(self, page_debut: int, page_fin: int) -> Optional[Dict]:
+        return empreinte_formalite([self.signature(n) for n in range(page_debut, page_fin + 1)])
+
+    def planifier(self, nb_pages: int) -> Dict[int, Tuple[int, int]]:
+        """Repère, d'après les seules signatures, les formalités de ce document déjà extraites dans la tranche précédente"""
+        disponibles = {cle: list(idxs) for cle, idxs in self._par_cle.items()}
+        page_num = 1
+        while page_num <= nb_pages:
+            signature = self.signature(page_num)
+            if disponibles and signature and signature['plage'] and signature['plage'][0] == page_num and page_num <= signature['plage'][1] <= nb_pages:
+                page_fin = signature['plage'][1]
+                if (empreinte := self.empreinte(page_num, page_fin)) and (idxs := disponibles.get(cle_empreinte(empreinte))):
+                    self.plan[page_num] = (page_fin, idxs.pop(0))
+                    page_num = page_fin + 1
+                    continue
+            page_num += 1
+        return self.plan
+
+    def pages_reprises(self) -> set:
+        return {n for page_debut, (page_fin, _) in self.plan.items() for n in range(page_debut, page_fin + 1)}
+
+    def reprendre(self, page_num: int) -> Optional[Dict]:
+        """Formalité de la tranche précédente prévue à cette page, renumérotée (None si elle est à extraire)"""
+        if page_num not in self.plan: return None
+        page_fin, idx = self.plan[page_num]
+        formalite = stockage_ehf.lire_formalite(self.precedente, idx)
+        if not formalite or formalite['page_fin'] - formalite['page_debut'] != page_fin - page_num: return None
+        self._reprises.add(idx)
+        self.nb_reprises += 1
+        self._noter(formalite, self._empreintes_precedentes[idx - 1])
+        return deplacer_formalite(formalite, page_num)
+
+    def extraite(self, formalite: Dict):
+        """Enregistre l'empreinte d'une formalité extraite de ce document"""
+        self.nb_extraites += 1
+        self._noter(formalite, self.empreinte(formalite['page_debut'], formalite['page_fin']))
+
+    def _noter(self, formalite: Dict, empreinte: Optional[Dict]):
+        self.empreintes.append(empreinte)
+        if self.precedente and (identite := identite_formalite(formalite)): self._identites[identite] += 1
+
+    def anterieures(self) -> Iterator[Dict]:
+        """
+        Formalités de la tranche précédente absentes de ce document (ni reprises, ni réextraites sous la même identité),
+        pages inchangées : elles complètent l'union des tranches
+        """
+        if not self.precedente: return
+        for idx, formalite in enumerate(stockage_ehf.iter_formalites(self.precedente), 1):
+            if idx in self._reprises: continue
+            if self._identites[identite := identite_formalite(formalite)] > 0:
+                self._identites[identite] -= 1
+                continue
+            self.nb_anterieures += 1
+            self.empreintes.append(self._empreintes_precedentes[idx - 1] if idx <= len(self._empreintes_precedentes) else None)
+            yield formalite
+
+    def resume(self) -> Dict:
+        if not self.precedente: return {}
+        return {'tranche_precedente': self.precedente, 'nb_formalites_reprises': self.nb_reprises,
+                'nb_formalites_extraites': self.nb_extraites, 'nb_formalites_anterieures': self.nb_anterieures}
+
+    def documents(self) -> Dict:
+        """Documents écrits dans le stockage : empreintes (pour la tranche suivante) et origine des formalités"""
+        documents = {'empreintes_formalites': self.empreintes}
+        if self.precedente: documents['tranche'] = self.resume()
+        return documents